@@ -8,11 +8,11 @@ from bot.features.deep_link.deep_link_entity_keyboards import (
 )
 from bot.utils.strings import get_string
 from bot.shared.main_commad_handlers import get_menu_keyboard
-from database.models_db import UserDB, EntityDB, UserEntityDB
+from database import repository
 from models.factories import build_entity_from_db
 from bot.formater.message_formater import format_entity_details
 from bot.states.fsm_states import MainMenuStates, DeepLinkStates
-from aiogram.exceptions import TelegramBadRequest
+from bot.shared.message_view import render_text, render_entity_card
 from models.enum_classes import StatusType
 from bot.utils.strings import get_status_string
 
@@ -28,8 +28,8 @@ async def show_dl_entity(
 ) -> bool:
     state_data = await state.get_data()
     lang = state_data.get("lang")
-    user = UserDB.get_or_none(tg_id=msg.chat.id)
-    entity = EntityDB.get_by_id(entity_id)
+    user = await repository.get_user_by_tg_id(msg.chat.id)
+    entity = await repository.get_entity_by_id(entity_id, with_ratings=True)
 
     if entity is None:
         await msg.edit_text(get_string("error_getting_entity", lang))
@@ -42,36 +42,14 @@ async def show_dl_entity(
 
     already_added = False
     if user:
-        already_added = (
-            UserEntityDB.select()
-            .join(EntityDB)
-            .where(
-                (UserEntityDB.user_id == user)
-                & (
-                    (UserEntityDB.entity == entity)
-                    | (
-                        (EntityDB.src_id == entity.src_id)
-                        & (EntityDB.src_id.is_null(False))
-                    )
-                )
-            )
-            .exists()
-        )
+        already_added = await repository.is_entity_in_user_list(user, entity)
     keyboard = get_deep_link_keyboard(
         entity_id=entity_full.id,
         lang=lang,
         already_added=already_added,
     )
-    if entity_full.poster_url and entity_full.poster_url != "N/A":
-        await msg.delete()  # удаляем сообщение с языком только сейчас!
-        try:
-            await msg.answer_photo(
-                entity_full.poster_url, caption=message, reply_markup=keyboard
-            )
-        except TelegramBadRequest:
-            await msg.answer(message, reply_markup=keyboard)
-    else:
-        await msg.edit_text(message, reply_markup=keyboard)
+    # Сообщение выбора языка превращается в карточку entity
+    await render_entity_card(msg, entity, message, keyboard)
     await state.set_state(DeepLinkStates.waiting_for_dl_action_entity)
     return True
 
@@ -104,37 +82,20 @@ async def handle_dl_action_entity(callback: CallbackQuery, state: FSMContext):
             return
 
         # Получаем название сущности для отображения
-        try:
-            entity = EntityDB.get_by_id(entity_id)
-            entity_name = entity.title
-        except:
-            entity_name = "Entity Name"
-
-        # Проверяем, есть ли фото в сообщении
-        has_photo = getattr(callback.message, "photo", None) is not None
+        entity = await repository.get_entity_by_id(entity_id)
+        entity_name = entity.title if entity else "Entity Name"
 
         keyboard = get_dl_add_to_list_keyboard(
             entity_id=entity_id,
             lang=lang,
         )
-        # Показываем меню выбора статуса
-        if has_photo:
-            # Если сообщение с фото, нужно удалить его и отправить новое
-            await callback.message.delete()
-            await callback.message.answer(
-                get_string("select_status_type_for", lang).format(
-                    entity_name=entity_name
-                ),
-                reply_markup=keyboard,
-            )
-        else:
-            # Если обычное текстовое сообщение, можно просто отредактировать его
-            await callback.message.edit_text(
-                get_string("select_status_type_for", lang).format(
-                    entity_name=entity_name
-                ),
-                reply_markup=keyboard,
-            )
+        # Меню выбора статуса заменяет подпись карточки
+        await render_text(
+            callback.message,
+            get_string("select_status_type_for", lang).format(entity_name=entity_name),
+            keyboard,
+            as_caption=True,
+        )
 
         # Переходим в состояние ожидания выбора статуса
         await state.set_state(DeepLinkStates.waiting_for_dl_add_to_list)
@@ -147,7 +108,7 @@ async def handle_dl_add_to_list_(callback: CallbackQuery, state: FSMContext):
     state_data = await state.get_data()
     lang = state_data.get("lang")
     data = callback.data
-    user = UserDB.get_or_none(tg_id=callback.from_user.id)
+    user = await repository.get_user_by_tg_id(callback.from_user.id)
 
     if data.startswith("dl_back:"):
         try:
@@ -178,16 +139,14 @@ async def handle_dl_add_to_list_(callback: CallbackQuery, state: FSMContext):
             return
 
         try:
-            entity = EntityDB.get_by_id(entity_id)
+            entity = await repository.get_entity_by_id(entity_id)
+            if entity is None:
+                raise ValueError(f"Entity {entity_id} not found")
 
-            user_entity, created = UserEntityDB.get_or_create(
-                user=user, entity=entity, defaults={"status": status}
+            user_entity, created = await repository.add_entity_to_user_list(
+                user, entity, status
             )
 
-            if not created:
-                user_entity.status = status
-                user_entity.save()
-
             # Показываем сообщение об успехе
             success_message = get_string("entity_added_to_list", lang).format(
                 entity_title=entity.title,
@@ -3,7 +3,7 @@ from aiogram.fsm.context import FSMContext
 from aiogram import Router
 from aiogram import types
 from bot.utils.strings import get_string, get_profile_commands
-from database.models_db import UserDB
+from database import repository
 from bot.features.profile.user_profile_keyboards import get_profile_keyboard
 from bot.states.fsm_states import ProfileStates, MainMenuStates
 from aiogram.types import CallbackQuery
@@ -20,16 +20,15 @@ async def handle_profile_actions(callback: CallbackQuery, state: FSMContext):
     state_data = await state.get_data()
     lang = state_data.get("lang")
     data = callback.data
-    user = UserDB.get_or_none(tg_id=callback.from_user.id)
+    user = await repository.get_user_by_tg_id(callback.from_user.id)
     if data == "profile_change_language":
         new_lang = "ru" if lang == "en" else "en"
-        user.language = new_lang
-        user.save()
+        user = await repository.update_user_language(user, new_lang)
         await state.update_data(lang=new_lang)
         await callback.message.edit_text(
             text=get_string("profile_message", new_lang).format(
                 user_name=user.name,
-                entities_count=user.user_entities.count(),
+                entities_count=await repository.count_user_entities(user),
             ),
             reply_markup=get_profile_keyboard(new_lang),
         )
@@ -0,0 +1,125 @@
+"""
+Федеративный поиск: один запрос одновременно уходит в KP и OMDb.
+
+Ответы ждут общий дедлайн, поэтому задержка равна самому медленному
+источнику, а не сумме. Источник, не успевший ответить, пропускается.
+Совпадающие результаты объединяются по IMDb ID, а если его нет - по
+названию и году.
+"""
+
+import asyncio
+import logging
+import re
+from typing import Awaitable, Callable
+
+from models.enum_classes import SourceApi
+
+logger = logging.getLogger(__name__)
+
+SearchFetch = Callable[[SourceApi, str, int], Awaitable[tuple[list, int, bool]]]
+
+_YEAR_RE = re.compile(r"\d{4}")
+
+
+def _parse_year(value) -> int | None:
+    if isinstance(value, int):
+        return value
+    match = _YEAR_RE.search(str(value or ""))
+    return int(match.group()) if match else None
+
+
+def normalize_hit(source_api: SourceApi, item: dict) -> dict:
+    """Приводит результат поиска KP или OMDb к общему виду"""
+    if source_api == SourceApi.KP:
+        titles = [item.get("name"), item.get("alternativeName"), item.get("enName")]
+        external = item.get("externalId") or {}
+        return {
+            "source": SourceApi.KP,
+            "api_id": str(item.get("id")),
+            "title": item.get("name") or item.get("alternativeName") or "No title",
+            "titles": [t for t in titles if t],
+            "year": _parse_year(item.get("year")),
+            "type": "series" if item.get("isSeries") else "movie",
+            "imdb_id": external.get("imdb"),
+        }
+    return {
+        "source": SourceApi.OMDB,
+        "api_id": item.get("imdbID"),
+        "title": item.get("Title") or "No title",
+        "titles": [item.get("Title")] if item.get("Title") else [],
+        "year": _parse_year(item.get("Year")),
+        "type": item.get("Type") or "movie",
+        "imdb_id": item.get("imdbID"),
+    }
+
+
+def _hit_keys(hit: dict) -> set:
+    keys = {("imdb", hit["imdb_id"])} if hit["imdb_id"] else set()
+    for title in hit["titles"]:
+        keys.add(("title", " ".join(title.lower().split()), hit["year"]))
+    return keys
+
+
+def merge_hits(*hit_lists: list[dict]) -> list[dict]:
+    """
+    Объединяет списки результатов в порядке приоритета источников.
+    Дубликат из менее приоритетного источника отбрасывается.
+    """
+    merged = []
+    seen = set()
+    for hits in hit_lists:
+        for hit in hits:
+            if not hit["api_id"]:
+                continue
+            keys = _hit_keys(hit)
+            if keys & seen:
+                continue
+            seen |= keys
+            merged.append(hit)
+    return merged
+
+
+async def search_federated(
+    fetch: SearchFetch,
+    query: str,
+    page: int,
+    primary: SourceApi,
+    deadline: float,
+) -> tuple[list[dict], int, bool]:
+    """
+    Ищет одновременно во всех источниках и объединяет ответы, пришедшие
+    до дедлайна.
+    :param fetch: функция поиска одного источника (get_api_search_list)
+    :param primary: источник, результаты которого идут первыми
+    :return: (результаты в общем виде, всего у самого полного источника, успех)
+    """
+    sources = [primary] + [s for s in (SourceApi.KP, SourceApi.OMDB) if s != primary]
+    tasks = {
+        asyncio.ensure_future(fetch(source, query, page)): source for source in sources
+    }
+    done, pending = await asyncio.wait(tasks, timeout=deadline)
+    for task in pending:
+        # Отменяется только ожидание: запрос к API продолжается в single-flight
+        # задаче и сохраняет страницу в кэш для следующего показа
+        logger.warning(f"Federated search: {tasks[task].value} missed the deadline")
+        task.cancel()
+
+    hits_by_source = {}
+    totals = []
+    for task in done:
+        source = tasks[task]
+        try:
+            results, total, success = task.result()
+        except Exception as e:
+            logger.error(f"Federated search: {source.value} failed: {e}")
+            continue
+        if not success:
+            continue
+        hits_by_source[source] = [normalize_hit(source, item) for item in results]
+        totals.append(total)
+
+    if not hits_by_source:
+        return [], 0, False
+    merged = merge_hits(*(hits_by_source.get(source, []) for source in sources))
+    # Количество страниц определяет источник с наибольшим числом результатов
+    return merged, max(totals), True
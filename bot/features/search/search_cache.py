@@ -0,0 +1,130 @@
+import logging
+from typing import Protocol, Any
+from bot.shared.cache import TTLCache
+from bot.shared.disk_cache import SQLiteCache
+from config.config import load_config
+from database.repository import normalize_title_query
+from models.enum_classes import SourceApi
+
+logger = logging.getLogger(__name__)
+
+config = load_config()
+
+
+class PersistentCacheTier(Protocol):
+    """Необязательный второй уровень кэша, переживающий перезапуски"""
+
+    async def get(self, key: str) -> Any: ...
+
+    async def set(self, key: str, value: Any, ttl: float) -> None: ...
+
+    async def compact(self) -> None: ...
+
+    async def hottest(self, limit: int) -> list[tuple[str, Any, float]]: ...
+
+    async def close(self) -> None: ...
+
+    def stats(self) -> dict: ...
+
+
+class SearchPageCache:
+    """
+    Кэш страниц результатов внешнего поиска по ключу
+    (источник, нормализованный запрос, страница).
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttls: dict[SourceApi, float],
+        persistent: PersistentCacheTier | None = None,
+    ):
+        self.ttls = ttls
+        self.persistent = persistent
+        self.persistent_hits = 0
+        self._memory = TTLCache(max_size, default_ttl=max(ttls.values()))
+
+    @staticmethod
+    def make_key(source_api: SourceApi, query: str, page: int) -> str:
+        needle = normalize_title_query(query or "")
+        return f"search:{SourceApi(source_api).value}:{page}:{needle}"
+
+    async def get(
+        self, source_api: SourceApi, query: str, page: int
+    ) -> tuple[list, int] | None:
+        """Возвращает (результаты, всего) или None"""
+        key = self.make_key(source_api, query, page)
+        value = self._memory.get(key)
+        if value is not None:
+            return value
+        if self.persistent is None:
+            return None
+        try:
+            value = await self.persistent.get(key)
+        except Exception as e:
+            logger.error(f"Persistent cache read failed: {e}")
+            return None
+        if value is not None:
+            self.persistent_hits += 1
+            value = tuple(value)
+            self._memory.set(key, value, self.ttls[SourceApi(source_api)])
+        return value
+
+    async def set(
+        self, source_api: SourceApi, query: str, page: int, results: list, total: int
+    ) -> None:
+        """Сохраняет страницу результатов"""
+        key = self.make_key(source_api, query, page)
+        ttl = self.ttls[SourceApi(source_api)]
+        self._memory.set(key, (results, total), ttl)
+        if self.persistent is None:
+            return
+        try:
+            await self.persistent.set(key, (results, total), ttl)
+        except Exception as e:
+            logger.error(f"Persistent cache write failed: {e}")
+
+    async def warm_up(self, limit: int) -> int:
+        """
+        Загружает в память самые используемые страницы из постоянного кэша,
+        чтобы после перезапуска популярные запросы не шли в API.
+        :return: количество загруженных страниц
+        """
+        if self.persistent is None or limit <= 0:
+            return 0
+        try:
+            await self.persistent.compact()
+            entries = await self.persistent.hottest(limit)
+        except Exception as e:
+            logger.error(f"Persistent cache warm-up failed: {e}")
+            return 0
+        for key, value, ttl in entries:
+            self._memory.set(key, tuple(value), ttl)
+        logger.info(f"Search cache warmed up with {len(entries)} pages")
+        return len(entries)
+
+    async def close(self) -> None:
+        if self.persistent is not None:
+            await self.persistent.close()
+
+    def stats(self) -> dict:
+        stats = {**self._memory.stats(), "persistent_hits": self.persistent_hits}
+        if self.persistent is not None:
+            stats.update(
+                {f"disk_{key}": value for key, value in self.persistent.stats().items()}
+            )
+        return stats
+
+
+search_cache = SearchPageCache(
+    max_size=config.cache.search_max_size,
+    ttls={
+        SourceApi.KP: config.cache.kp_search_ttl,
+        SourceApi.OMDB: config.cache.omdb_search_ttl,
+    },
+    persistent=(
+        SQLiteCache(config.cache.disk_path, config.cache.disk_max_mb * 1024 * 1024)
+        if config.cache.disk_path
+        else None
+    ),
+)
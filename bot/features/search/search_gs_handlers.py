@@ -1,5 +1,8 @@
+import asyncio
+import functools
 import logging
-from typing import Optional, Tuple, Union, Any
+from datetime import datetime, timedelta
+from typing import Optional, Tuple, Union, Any, Awaitable, Callable
 from aiogram import Router
 from aiogram.types import CallbackQuery, Message
 from bot.shared.other_keyboards import get_menu_keyboard
@@ -8,8 +11,10 @@ from bot.features.search.search_gs_keyboards import (
     get_gs_entity_detail_keyboard,
     get_gs_add_to_list_keyboard,
 )
-from database.models_db import EntityDB, UserEntityDB, UserDB
-from models.enum_classes import StatusType, SourceApi
+from database.models_db import EntityDB
+from database import repository
+from database.executor import run_db
+from models.enum_classes import StatusType, SourceApi, EntityType
 from aiogram.fsm.context import FSMContext
 from bot.states.fsm_states import SearchStates, MainMenuStates
 from bot.formater.message_formater import format_entity_details
@@ -17,12 +22,47 @@ from models.factories import build_entity_from_db
 from bot.utils.strings import get_string, get_status_string
 from bot.features.search_kp.kp_service import KpService
 from bot.features.search_omdb.omdb_service import OMDbService
-from bot.features.search_kp.kp_utils import kp_details_to_db, kp_ratings_to_db
-from bot.features.search_omdb.omdb_utils import omdb_details_to_db, omdb_ratings_to_db
-from aiogram.exceptions import TelegramBadRequest
+from bot.features.search_kp.kp_utils import kp_details_to_db
+from bot.features.search_kp.kp_batch_loader import kp_batch_loader
+from bot.features.search_omdb.omdb_utils import omdb_details_to_db
+from bot.features.search.search_cache import search_cache
+from bot.shared.single_flight import SingleFlight
+from bot.shared.rate_limiter import (
+    RateLimiter,
+    Priority,
+    current_priority,
+    request_priority,
+)
+from bot.shared.circuit_breaker import CircuitBreaker
+from bot.shared.message_view import render_text, render_entity_card
+from bot.features.search.search_prefetch import prefetcher
+from bot.features.search.federated_search import search_federated
+from config.config import load_config
 
 gs_router = Router()
 logger = logging.getLogger(__name__)
+config = load_config()
+
+# Результатов на странице поиска KP и OMDb
+SEARCH_PAGE_SIZE = 10
+
+# Максимальный возраст сохраненной entity, после которого она обновляется из API
+ENTITY_MAX_AGE = {
+    SourceApi.KP: timedelta(seconds=config.cache.kp_entity_max_age),
+    SourceApi.OMDB: timedelta(seconds=config.cache.omdb_entity_max_age),
+}
+
+# Объединение одинаковых одновременных запросов к KP/OMDb
+api_flight = SingleFlight()
+
+# Предзагрузка не тратит резерв квоты, оставленный для пользователей
+prefetcher.budget_check = lambda: all(
+    limiter.has_budget(Priority.BACKGROUND)
+    for limiter in (KpService.LIMITER, OMDbService.LIMITER)
+)
+
+# Ссылки на фоновые задачи обновления, чтобы их не собрал GC
+_refresh_tasks: dict[tuple[SourceApi, str], asyncio.Task] = {}
 
 
 # Вспомогательные функции для уменьшения дублирования
@@ -44,50 +84,16 @@ def get_message_from_callback(callback: Union[CallbackQuery, Message]) -> Messag
     return callback.message if isinstance(callback, CallbackQuery) else callback
 
 
-async def safe_edit_or_send_message(
-    message: Message, text: str, reply_markup=None, parse_mode: str = None
-) -> None:
-    """Безопасно редактирует или отправляет сообщение, обрабатывая фото"""
-    if getattr(message, "photo", None):
-        await message.delete()
-        await message.answer(text, reply_markup=reply_markup, parse_mode=parse_mode)
-    else:
-        try:
-            await message.edit_text(
-                text, reply_markup=reply_markup, parse_mode=parse_mode
-            )
-        except TelegramBadRequest:
-            await message.answer(text, reply_markup=reply_markup, parse_mode=parse_mode)
-
-
-async def safe_send_photo_or_text(
-    message: Message, photo_url: str, caption: str, reply_markup=None
-) -> None:
-    """Безопасно отправляет фото или текст, обрабатывая ошибки"""
-    if photo_url and photo_url != "N/A":
-        await message.delete()
-        try:
-            await message.answer_photo(
-                photo_url, caption=caption, reply_markup=reply_markup
-            )
-        except TelegramBadRequest:
-            await message.answer(caption, reply_markup=reply_markup)
-    else:
-        await message.edit_text(caption, reply_markup=reply_markup)
-
-
-def get_entity_safe(entity_id: int) -> Optional[EntityDB]:
+async def get_entity_safe(entity_id: int) -> Optional[EntityDB]:
     """Безопасно получает entity с обработкой ошибок"""
-    try:
-        return EntityDB.get_by_id(entity_id)
-    except EntityDB.DoesNotExist:
-        return None
+    return await repository.get_entity_by_id(entity_id)
 
 
 async def handle_error_and_return_to_menu(
     callback: CallbackQuery, state: FSMContext, error_message: str, lang: str
 ) -> None:
     """Обрабатывает ошибку и возвращает в главное меню"""
+    prefetcher.cancel(callback.from_user.id)
     await callback.message.edit_text(error_message)
     await state.clear()
     await state.set_state(MainMenuStates.waiting_for_query)
@@ -114,6 +120,88 @@ async def handle_back_to_entity(
 # API функции
 async def get_api_search_list(
     source_api: SourceApi, query: str, page: int
+) -> tuple[list, int, bool]:
+    """
+    Получает список результатов поиска из кэша или API.
+    Когда квота API почти или полностью израсходована, отдает результаты
+    поиска по сохраненным entity.
+    """
+    cached = await search_cache.get(source_api, query, page)
+    if cached is not None:
+        results, total = cached
+        return results, total, True
+
+    limiter = get_api_limiter(source_api)
+    provider_down = not get_api_breaker(source_api).is_available()
+    if provider_down or not limiter.has_budget(Priority.BACKGROUND):
+        # Провайдер недоступен или остался резерв квоты: сначала пробуем
+        # обойтись локальными данными, к недоступному провайдеру не ходим
+        results, total = await get_local_search_list(source_api, query, page)
+        if results or provider_down:
+            return results, total, bool(results)
+
+    results, total, success = await api_flight.do(
+        search_cache.make_key(source_api, query, page),
+        fetch_and_cache_search_list,
+        source_api,
+        query,
+        page,
+    )
+    if not success and not limiter.has_budget():
+        results, total = await get_local_search_list(source_api, query, page)
+        success = bool(results)
+    return results, total, success
+
+
+def get_api_limiter(source_api: SourceApi) -> RateLimiter:
+    """Возвращает ограничитель запросов API источника"""
+    if source_api == SourceApi.KP:
+        return KpService.LIMITER
+    return OMDbService.LIMITER
+
+
+def get_api_breaker(source_api: SourceApi) -> CircuitBreaker:
+    """Возвращает circuit breaker API источника"""
+    if source_api == SourceApi.KP:
+        return KpService.BREAKER
+    return OMDbService.BREAKER
+
+
+def entity_to_search_item(source_api: SourceApi, entity: EntityDB) -> dict:
+    """Представляет entity в формате результата поиска API"""
+    year = entity.year_start or (
+        entity.release_date.year if entity.release_date else None
+    )
+    is_series = entity.type == EntityType.SERIES.value
+    if source_api == SourceApi.KP:
+        return {
+            "id": entity.kp_id,
+            "name": entity.title,
+            "year": year,
+            "isSeries": is_series,
+        }
+    return {
+        "imdbID": entity.src_id,
+        "Title": entity.title,
+        "Year": str(year) if year else "?",
+        "Type": entity.type,
+    }
+
+
+async def get_local_search_list(
+    source_api: SourceApi, query: str, page: int
+) -> tuple[list, int]:
+    """Ищет по сохраненным entity, когда API недоступен по квоте"""
+    try:
+        entities, total = await repository.search_entities(source_api, query, page)
+    except Exception as e:
+        logger.error(f"Error searching local entities: {e}")
+        return [], 0
+    return [entity_to_search_item(source_api, entity) for entity in entities], total
+
+
+async def fetch_api_search_list(
+    source_api: SourceApi, query: str, page: int
 ) -> tuple[list, int, bool]:
     """Получает список результатов поиска из API"""
     if source_api == SourceApi.KP:
@@ -140,11 +228,40 @@ async def get_api_search_list(
             return [], 0, False
 
 
+async def fetch_and_cache_search_list(
+    source_api: SourceApi, query: str, page: int
+) -> tuple[list, int, bool]:
+    """
+    Получает список результатов поиска из API и кладет его в кэш.
+    Выполняется внутри single-flight задачи, поэтому страница попадает
+    в кэш, даже если вызывающий (федеративный поиск по дедлайну) отменен.
+    """
+    results, total, success = await fetch_api_search_list(source_api, query, page)
+    # Ошибки не кэшируем, чтобы следующий запрос снова пошел в API
+    if success:
+        await search_cache.set(source_api, query, page, results, total)
+    return results, total, success
+
+
 async def get_api_entity(source_api: SourceApi, api_id: str) -> tuple[dict, bool]:
+    """Получает детали entity из API, одновременные запросы объединяются"""
+    return await api_flight.do(
+        ("entity", SourceApi(source_api), api_id),
+        fetch_api_entity,
+        source_api,
+        api_id,
+    )
+
+
+async def fetch_api_entity(source_api: SourceApi, api_id: str) -> tuple[dict, bool]:
     """Получает детали entity из API"""
     if source_api == SourceApi.KP:
         try:
-            response = await KpService.get_item_details(api_id)
+            if current_priority() == Priority.BACKGROUND:
+                # Фоновые запросы деталей KP объединяются в пакетные запросы
+                response = await kp_batch_loader.load(api_id)
+            else:
+                response = await KpService.get_item_details(api_id)
             if response.get("Response") == "False":
                 return {}, False
             return response, True
@@ -162,41 +279,130 @@ async def get_api_entity(source_api: SourceApi, api_id: str) -> tuple[dict, bool
             return {}, False
 
 
-def get_entity_from_db(source_api: SourceApi, api_id: str) -> EntityDB:
+async def get_entity_from_db(
+    source_api: SourceApi, api_id: str, with_ratings: bool = False
+) -> EntityDB:
     """Получает entity из базы данных по API ID"""
-    if source_api == SourceApi.KP:
-        return EntityDB.get_or_none(kp_id=api_id)
-    elif source_api == SourceApi.OMDB:
-        return EntityDB.get_or_none(src_id=api_id)
+    return await repository.get_entity_by_api_id(source_api, api_id, with_ratings)
+
+
+def is_entity_fresh(source_api: SourceApi, entity: EntityDB) -> bool:
+    """Проверяет, что entity обновлялась из API не раньше ENTITY_MAX_AGE"""
+    if not entity.updated_db:
+        return False
+    return datetime.now() - entity.updated_db < ENTITY_MAX_AGE[SourceApi(source_api)]
 
 
 def add_entity_to_db(source_api: SourceApi, data: dict) -> EntityDB | None:
-    """Добавляет entity в базу данных"""
-    if source_api == SourceApi.KP:
-        try:
-            entity, created = kp_details_to_db(data)
-        except Exception as e:
-            logger.error(f"Error adding entity to database: {e}")
-            return None
-        try:
-            ratings = kp_ratings_to_db(entity, data)
-        except Exception as e:
-            logger.error(f"Error adding ratings to database: {e}")
-            return None
-        return entity
-    elif source_api == SourceApi.OMDB:
-        try:
-            entity, created = omdb_details_to_db(data)
-        except Exception as e:
-            logger.error(f"Error adding entity to database: {e}")
-            return None
+    """Добавляет или обновляет entity вместе с рейтингами в базе данных"""
+    try:
+        if source_api == SourceApi.KP:
+            return kp_details_to_db(data)
+        elif source_api == SourceApi.OMDB:
+            return omdb_details_to_db(data)
+    except Exception as e:
+        logger.error(f"Error adding entity to database: {e}")
+    return None
+
+
+async def refresh_entity(source_api: SourceApi, api_id: str) -> EntityDB | None:
+    """
+    Загружает детали entity из API и сохраняет их в базе данных.
+    Одновременные вызовы для одной entity делают один запрос и одну запись.
+    """
+    return await api_flight.do(
+        ("store", SourceApi(source_api), api_id), _refresh_entity, source_api, api_id
+    )
+
+
+async def _refresh_entity(source_api: SourceApi, api_id: str) -> EntityDB | None:
+    data, success = await get_api_entity(source_api, api_id)
+    if not success:
+        return None
+    return await run_db(add_entity_to_db, source_api, data)
+
+
+def schedule_entity_refresh(source_api: SourceApi, api_id: str) -> None:
+    """Обновляет устаревшую entity в фоне, не более одной задачи на entity"""
+    key = (SourceApi(source_api), api_id)
+    if key in _refresh_tasks:
+        return
+
+    async def run():
+        request_priority.set(Priority.BACKGROUND)
         try:
-            ratings = omdb_ratings_to_db(entity, data)
+            if await refresh_entity(source_api, api_id) is None:
+                logger.warning(f"Background refresh failed for {source_api}:{api_id}")
         except Exception as e:
-            logger.error(f"Error adding ratings to database: {e}")
-            return None
+            logger.error(f"Error refreshing entity {source_api}:{api_id}: {e}")
+        finally:
+            _refresh_tasks.pop(key, None)
+
+    _refresh_tasks[key] = asyncio.create_task(run())
+
+
+async def get_or_fetch_entity(
+    source_api: SourceApi, api_id: str
+) -> EntityDB | None:
+    """
+    Возвращает entity из базы, если она там есть, иначе загружает из API.
+    Свежая entity отдается без запроса к API, устаревшая отдается сразу
+    и обновляется в фоне.
+    """
+    entity = await get_entity_from_db(source_api, api_id, with_ratings=True)
+    if entity is not None:
+        if not is_entity_fresh(source_api, entity):
+            schedule_entity_refresh(source_api, api_id)
         return entity
-    return None
+    return await refresh_entity(source_api, api_id)
+
+
+def get_result_api_id(source_api: SourceApi, item: dict) -> str | None:
+    """Возвращает ID результата поиска, как в callback gs_select"""
+    if source_api == SourceApi.KP:
+        api_id = item.get("id")
+    else:
+        api_id = item.get("imdbID")
+    return str(api_id) if api_id else None
+
+
+async def prefetch_entity(source_api: SourceApi, api_id: str) -> None:
+    """Загружает entity в базу заранее, если её там нет или она устарела"""
+    entity = await get_entity_from_db(source_api, api_id)
+    if entity is not None and is_entity_fresh(source_api, entity):
+        return
+    await refresh_entity(source_api, api_id)
+
+
+def schedule_search_prefetch(
+    chat_id: int,
+    hits: list[tuple[SourceApi, str]],
+    next_page: Callable[[], Awaitable] | None = None,
+) -> None:
+    """Ставит в фон предзагрузку первых результатов и следующей страницы"""
+    jobs = [
+        functools.partial(prefetch_entity, source_api, api_id)
+        for source_api, api_id in hits[: config.prefetch.top_n]
+        if api_id
+    ]
+    if config.prefetch.next_page and next_page:
+        jobs.append(next_page)
+    prefetcher.schedule(chat_id, jobs)
+
+
+async def get_search_page(
+    source_api: SourceApi, query: str, page: int, federated: bool
+) -> tuple[list, int, bool]:
+    """Получает страницу глобального поиска из одного или всех источников"""
+    if federated:
+        return await search_federated(
+            get_api_search_list,
+            query,
+            page,
+            primary=SourceApi(source_api),
+            deadline=config.search.federated_deadline,
+        )
+    return await get_api_search_list(source_api, query, page)
 
 
 # Основные функции отображения
@@ -210,8 +416,15 @@ async def show_gs_list(
     query = state_data.get("query")
     lang = state_data.get("lang")
     page = state_data.get("page", 1)
-
-    results, total_results, success = await get_api_search_list(source_api, query, page)
+    federated = state_data.get("federated", False)
+    if not federated and not get_api_breaker(source_api).is_available():
+        # Провайдер недоступен: отдаем другой источник и локальные данные
+        logger.info(f"{source_api} circuit is open, failing over to federated search")
+        federated = True
+
+    results, total_results, success = await get_search_page(
+        source_api, query, page, federated
+    )
     if not success:
         await handle_error_and_return_to_menu(
             callback, state, get_string("error_getting_results", lang), lang
@@ -232,16 +445,26 @@ async def show_gs_list(
         page=page,
         total_results=total_results,
         lang=lang,
+        federated=federated,
     )
 
     title_text = get_string("found_results", lang).format(
         total_results=total_results, query=query
     )
 
-    await safe_edit_or_send_message(
-        callback.message, title_text, keyboard, parse_mode="HTML"
-    )
+    await render_text(callback.message, title_text, keyboard, parse_mode="HTML")
     await state.set_state(SearchStates.waiting_for_gs_select_entity)
+
+    if federated:
+        hits = [(hit["source"], hit["api_id"]) for hit in results]
+    else:
+        hits = [(source_api, get_result_api_id(source_api, item)) for item in results]
+    next_page = None
+    if page * SEARCH_PAGE_SIZE < total_results:
+        next_page = functools.partial(
+            get_search_page, source_api, query, page + 1, federated
+        )
+    schedule_search_prefetch(callback.from_user.id, hits, next_page)
     return True
 
 
@@ -250,26 +473,24 @@ async def show_gs_entity(
     state: FSMContext,
     entity_id: int = None,
     api_id: str = None,
+    source_api: SourceApi = None,
 ) -> bool:
-    """Показывает детали entity"""
+    """
+    Показывает детали entity.
+    :param source_api: источник api_id, по умолчанию - источник поиска из state
+    """
     state_data = await state.get_data()
-    source_api = state_data.get("source_api")
+    source_api = source_api or state_data.get("source_api")
     lang = state_data.get("lang")
-    user = UserDB.get_or_none(tg_id=callback.from_user.id)
+    user = await repository.get_user_by_tg_id(callback.from_user.id)
     entity = None
 
     if entity_id:
-        entity = get_entity_safe(entity_id)
+        entity = await repository.get_entity_by_id(entity_id, with_ratings=True)
         # Сохраняем entity_id в state для возможности возврата
         await state.update_data(current_entity_id=entity_id)
     elif api_id:
-        data, success = await get_api_entity(source_api, api_id)
-        if not success:
-            await handle_error_and_return_to_menu(
-                callback, state, get_string("error_getting_entity", lang), lang
-            )
-            return False
-        entity = add_entity_to_db(source_api, data)
+        entity = await get_or_fetch_entity(source_api, api_id)
         if not entity:
             await handle_error_and_return_to_menu(
                 callback, state, get_string("error_getting_entity", lang), lang
@@ -289,21 +510,7 @@ async def show_gs_entity(
 
     already_added = False
     if user:
-        already_added = (
-            UserEntityDB.select()
-            .join(EntityDB)
-            .where(
-                (UserEntityDB.user_id == user)
-                & (
-                    (UserEntityDB.entity == entity)
-                    | (
-                        (EntityDB.src_id == entity.src_id)
-                        & (EntityDB.src_id.is_null(False))
-                    )
-                )
-            )
-            .exists()
-        )
+        already_added = await repository.is_entity_in_user_list(user, entity)
 
     keyboard = get_gs_entity_detail_keyboard(
         entity_id=entity_full.id,
@@ -311,9 +518,7 @@ async def show_gs_entity(
         already_added=already_added,
     )
 
-    await safe_send_photo_or_text(
-        callback.message, entity_full.poster_url, message, keyboard
-    )
+    await render_entity_card(callback.message, entity, message, keyboard)
     await state.set_state(SearchStates.waiting_for_gs_action_entity)
     await callback.answer()
     return True
@@ -338,16 +543,23 @@ async def handle_gs_select_entity(callback: CallbackQuery, state: FSMContext):
         await handle_back_to_list(callback, state)
 
     elif data.startswith("gs_select:"):
-        parsed = parse_callback_data(data, 1)
-        if not parsed:
+        # gs_select:<api_id> или gs_select:<api_id>:<source> в федеративном поиске
+        parts = data.split(":")
+        if len(parts) not in (2, 3) or not parts[1]:
+            await callback.answer("Invalid callback data")
+            return
+        api_id = parts[1]
+        try:
+            source_api = SourceApi(parts[2]) if len(parts) == 3 else None
+        except ValueError:
             await callback.answer("Invalid callback data")
             return
-        api_id = parsed[0]
 
         success = await show_gs_entity(
             callback=callback,
             state=state,
             api_id=api_id,
+            source_api=source_api,
         )
         if success:
             await callback.answer()
@@ -356,6 +568,7 @@ async def handle_gs_select_entity(callback: CallbackQuery, state: FSMContext):
         await callback.answer(get_string("feature_developing", lang), show_alert=False)
 
     elif data == "gs_cancel":
+        prefetcher.cancel(callback.from_user.id)
         await callback.message.delete()
         await callback.message.answer(
             get_string("start_message", lang),
@@ -386,7 +599,7 @@ async def handle_gs_action_entity(callback: CallbackQuery, state: FSMContext):
         entity_id = int(parsed[0])
 
         # Получаем название сущности для отображения
-        entity = get_entity_safe(entity_id)
+        entity = await get_entity_safe(entity_id)
         entity_name = entity.title if entity else "Entity Name"
 
         title_text = get_string("select_status_type_for", lang).format(
@@ -394,8 +607,8 @@ async def handle_gs_action_entity(callback: CallbackQuery, state: FSMContext):
         )
         keyboard = get_gs_add_to_list_keyboard(entity_id=entity_id, lang=lang)
 
-        await safe_edit_or_send_message(
-            callback.message, title_text, keyboard, parse_mode="HTML"
+        await render_text(
+            callback.message, title_text, keyboard, parse_mode="HTML", as_caption=True
         )
 
         # Переходим в состояние ожидания выбора статуса
@@ -408,7 +621,7 @@ async def handle_gs_add_to_list(callback: CallbackQuery, state: FSMContext):
     state_data = await state.get_data()
     lang = state_data.get("lang")
     data = callback.data
-    user = UserDB.get_or_none(tg_id=callback.from_user.id)
+    user = await repository.get_user_by_tg_id(callback.from_user.id)
 
     if data == "gs_back":
         # Возвращаемся к деталям entity
@@ -439,19 +652,15 @@ async def handle_gs_add_to_list(callback: CallbackQuery, state: FSMContext):
             return
 
         try:
-            entity = get_entity_safe(entity_id)
+            entity = await get_entity_safe(entity_id)
             if not entity:
                 await callback.answer("Entity not found")
                 return
 
-            user_entity, created = UserEntityDB.get_or_create(
-                user=user, entity=entity, defaults={"status": status}
+            user_entity, created = await repository.add_entity_to_user_list(
+                user, entity, status
             )
 
-            if not created:
-                user_entity.status = status
-                user_entity.save()
-
             # Показываем сообщение об успехе
             success_message = (
                 get_string("entity_added_to_list", lang).format(
@@ -461,6 +670,7 @@ async def handle_gs_add_to_list(callback: CallbackQuery, state: FSMContext):
                 + "\n\n"
                 + get_string("start_message", lang)
             )
+            prefetcher.cancel(callback.from_user.id)
             await callback.message.delete()
             await callback.message.answer(
                 success_message,
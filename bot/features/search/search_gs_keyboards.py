@@ -49,16 +49,43 @@ def get_gs_omdb_list_keyboard(
     return builder
 
 
+def get_gs_federated_list_keyboard(
+    results: List[Dict],
+    lang: str = "en",
+) -> InlineKeyboardBuilder:
+    builder = InlineKeyboardBuilder()
+    for hit in results:
+        year = hit.get("year") or "?"
+        source_label = "KP" if hit["source"] == SourceApi.KP else "IMDb"
+        btn_text = (
+            f"{hit['title']} ({year}) - {get_string(hit['type'].lower(), lang)}"
+            f" · {source_label}"
+        )
+        builder.row(
+            InlineKeyboardButton(
+                text=btn_text,
+                callback_data=f"gs_select:{hit['api_id']}:{hit['source'].value}",
+            )
+        )
+    return builder
+
+
 def get_gs_results_keyboard(
     results: List[Dict],
     source_api: SourceApi,
     page: int,
     total_results: int,
     lang: str = "en",
+    federated: bool = False,
 ) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     # Кнопки с результатами
-    if source_api == SourceApi.KP:
+    if federated:
+        builder = get_gs_federated_list_keyboard(
+            results=results,
+            lang=lang,
+        )
+    elif source_api == SourceApi.KP:
         builder = get_gs_kp_list_keyboard(
             results=results,
             lang=lang,
@@ -4,6 +4,7 @@ from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
 from models.enum_classes import SourceApi, EntityType, StatusType
 from bot.features.search.search_gs_handlers import show_gs_list
+from bot.features.search.search_prefetch import prefetcher
 from bot.states.fsm_states import MainMenuStates, SearchStates, UserListStates
 from aiogram import Router, types
 from bot.shared.other_keyboards import (
@@ -11,12 +12,14 @@ from bot.shared.other_keyboards import (
     get_menu_keyboard,
 )
 from bot.utils.strings import get_string, get_all_commands
-from database.models_db import UserDB
+from database import repository
 import re
 from bot.features.user_list.user_list_handlers import show_ls_list
 from bot.shared.user_service import ensure_user_exists
+from config.config import load_config
 
 logger = logging.getLogger(__name__)
+config = load_config()
 
 search_router = Router()
 
@@ -27,9 +30,9 @@ def is_cyrillic(text: str) -> bool:
     return bool(re.search("[а-яА-ЯёЁ]", text))
 
 
-def get_user_language(user_id: int) -> str:
+async def get_user_language(user_id: int) -> str:
     """Получает язык пользователя"""
-    user = UserDB.get_or_none(tg_id=user_id)
+    user = await repository.get_user_by_tg_id(user_id)
     return user.language if user else "en"
 
 
@@ -62,8 +65,13 @@ async def perform_global_search(
     page = 1
 
     # Определяем API на основе языка запроса
+    # В федеративном режиме источник по языку идет первым в списке результатов
     source_api = SourceApi.KP if is_cyrillic(query) else SourceApi.OMDB
-    await state.update_data(source_api=source_api)
+    await state.update_data(
+        source_api=source_api, federated=config.search.mode == "federated"
+    )
+    # Предзагрузка для предыдущего запроса больше не нужна
+    prefetcher.cancel(callback.from_user.id)
 
     await callback.message.edit_text(get_string("searching_please_wait", lang))
 
@@ -115,7 +123,7 @@ async def handle_search_text(
         return
 
     current_state = await state.get_state()
-    lang = get_user_language(message.from_user.id)
+    lang = await get_user_language(message.from_user.id)
 
     if current_state != MainMenuStates.waiting_for_query.state:
         await message.answer(
@@ -0,0 +1,91 @@
+"""
+Фоновая предзагрузка карточек для показанной страницы глобального поиска.
+
+Пользователь почти всегда открывает один из результатов, поэтому детали
+первых N результатов (и, при желании, следующая страница поиска) загружаются
+заранее. Задачи привязаны к чату и отменяются, когда пользователь уходит
+из поиска.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from bot.shared.rate_limiter import Priority, request_priority
+from config.config import load_config
+
+logger = logging.getLogger(__name__)
+
+config = load_config()
+
+PrefetchJob = Callable[[], Awaitable]
+
+
+class Prefetcher:
+    """Выполняет задания предзагрузки с ограничением параллельности"""
+
+    def __init__(self, enabled: bool, concurrency: int):
+        self.enabled = enabled
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks: dict[int, asyncio.Task] = {}
+        # Проверка квоты API: False - фоновые запросы сейчас не допускаются
+        self.budget_check: Callable[[], bool] = lambda: True
+        self.jobs_done = 0
+        self.jobs_skipped = 0
+        self.jobs_failed = 0
+        self.cancelled = 0
+
+    def schedule(self, chat_id: int, jobs: list[PrefetchJob]) -> None:
+        """Заменяет предзагрузку чата новым набором заданий"""
+        if not self.enabled or not jobs:
+            return
+        self.cancel(chat_id)
+        task = asyncio.create_task(self._run(jobs))
+        self._tasks[chat_id] = task
+        task.add_done_callback(lambda done: self._forget(chat_id, done))
+
+    def cancel(self, chat_id: int) -> None:
+        """Отменяет незавершенную предзагрузку чата"""
+        task = self._tasks.pop(chat_id, None)
+        if task and not task.done():
+            task.cancel()
+            self.cancelled += 1
+
+    def _forget(self, chat_id: int, task: asyncio.Task) -> None:
+        if self._tasks.get(chat_id) is task:
+            del self._tasks[chat_id]
+
+    async def _run(self, jobs: list[PrefetchJob]) -> None:
+        # Запросы предзагрузки уступают очередь запросам пользователей
+        request_priority.set(Priority.BACKGROUND)
+        await asyncio.gather(*(self._run_job(job) for job in jobs))
+
+    async def _run_job(self, job: PrefetchJob) -> None:
+        async with self._semaphore:
+            if not self.budget_check():
+                self.jobs_skipped += 1
+                return
+            try:
+                await job()
+                self.jobs_done += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.jobs_failed += 1
+                logger.warning(f"Prefetch job failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "active_chats": len(self._tasks),
+            "done": self.jobs_done,
+            "skipped": self.jobs_skipped,
+            "failed": self.jobs_failed,
+            "cancelled": self.cancelled,
+        }
+
+
+prefetcher = Prefetcher(
+    enabled=config.prefetch.enabled,
+    concurrency=config.prefetch.concurrency,
+)
@@ -0,0 +1,107 @@
+"""
+Пакетная загрузка деталей KP.
+
+Запросы деталей, пришедшие в течение короткого окна, собираются в один
+запрос movie?id=..&id=.., а результат раздается ожидающим по ID. Так
+предзагрузка страницы или обновление сотен записей тратят десятки
+запросов к API, а не по одному на каждый тайтл. Пакет запрашивается с
+интерактивным приоритетом, если повышен приоритет работы любого из
+ожидающих (см. PriorityBoost).
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict
+
+from bot.features.search_kp.kp_service import KpService
+from bot.shared.rate_limiter import PriorityBoost, boosted_context, current_boost
+
+logger = logging.getLogger(__name__)
+
+
+class KpBatchLoader:
+    def __init__(self, window: float = 0.02, max_batch: int = KpService.BATCH_SIZE):
+        """
+        :param window: сколько секунд ждать остальные ID перед запросом
+        :param max_batch: при таком количестве ID запрос уходит сразу
+        """
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: dict[str, asyncio.Future] = {}
+        # Работы ожидающих текущего пакета, от которых зависит его приоритет
+        self._boosts: list[PriorityBoost] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self.batches = 0
+        self.ids_loaded = 0
+
+    async def load(self, kp_id: str) -> Dict[str, Any]:
+        """Возвращает детали kp_id в формате get_item_details"""
+        # shield: отмена одного вызывающего не отменяет общий future
+        return await asyncio.shield(self._enqueue(str(kp_id)))
+
+    def _enqueue(self, kp_id: str) -> asyncio.Future:
+        boost = current_boost()
+        if boost is not None and boost not in self._boosts:
+            self._boosts.append(boost)
+        future = self._pending.get(kp_id)
+        if future is not None:
+            return future
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending[kp_id] = future
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+        return future
+
+    async def load_many(self, kp_ids: list[str]) -> list[Dict[str, Any]]:
+        """Загружает детали нескольких ID, порядок ответа совпадает с kp_ids"""
+        return list(await asyncio.gather(*(self.load(kp_id) for kp_id in kp_ids)))
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, {}
+        boost, self._boosts = PriorityBoost(self._boosts), []
+        if batch:
+            asyncio.get_running_loop().create_task(
+                self._dispatch(batch), context=boosted_context(boost)
+            )
+
+    async def _dispatch(self, batch: dict[str, asyncio.Future]) -> None:
+        self.batches += 1
+        try:
+            response = await KpService.get_items_details(list(batch))
+        except Exception as e:
+            logger.error(f"KP batch request failed: {e}")
+            response = {"Response": "False", "Error": str(e)}
+
+        failed = response.get("Response") == "False"
+        for kp_id, future in batch.items():
+            if future.done():
+                continue
+            if failed:
+                future.set_result(response)
+            elif kp_id in response:
+                self.ids_loaded += 1
+                future.set_result(response[kp_id])
+            else:
+                future.set_result(
+                    {
+                        "Response": "False",
+                        "Error": f"Movie {kp_id} not found",
+                        "NotFound": True,
+                    }
+                )
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "ids_loaded": self.ids_loaded,
+        }
+
+
+kp_batch_loader = KpBatchLoader()
@@ -1,6 +1,8 @@
-import aiohttp
 from typing import Dict, Any
 from config.config import load_config
+from bot.shared.api_client import get_provider_json
+from bot.shared.rate_limiter import RateLimiter
+from bot.shared.circuit_breaker import CircuitBreaker
 
 config = load_config()
 
@@ -9,7 +11,45 @@ class KpService:
     """Сервис для работы с Kinopoisk.dev API"""
 
     API_KEY = config.kp.api_key
-    BASE_URL = "https://api.kinopoisk.dev/v1.4/"
+    BASE_URL = config.kp.base_url
+    LIMITER = RateLimiter(
+        "KP",
+        per_second=config.kp.rate_per_second,
+        burst=config.kp.rate_burst,
+        per_day=config.kp.daily_limit,
+        background_reserve=config.kp.background_reserve,
+    )
+    BREAKER = CircuitBreaker(
+        "KP",
+        window=config.circuit.window,
+        min_requests=config.circuit.min_requests,
+        failure_rate=config.circuit.failure_rate,
+        slow_call_seconds=config.circuit.slow_call_seconds,
+        open_seconds=config.circuit.open_seconds,
+    )
+    # Поля документа, которые читают parse_kp_details и parse_kp_ratings
+    DETAILS_FIELDS = (
+        "id",
+        "name",
+        "isSeries",
+        "year",
+        "description",
+        "movieLength",
+        "seriesLength",
+        "externalId",
+        "poster",
+        "genres",
+        "countries",
+        "persons",
+        "releaseYears",
+        "seasonsInfo",
+        "rating",
+    )
+    PROJECTED_DETAILS = config.kp.projected_details
+    # Максимум ID в одном запросе movie?id=..&id=.. (limit списка KP - 250)
+    BATCH_SIZE = 250
+    # Статусы, которыми API сообщает об исчерпанной квоте
+    QUOTA_STATUSES = (403, 429)
 
     @staticmethod
     def get_safe_value(details: dict, key: str, default=None) -> Any:
@@ -22,6 +62,22 @@ class KpService:
                 return default
         return value if value not in (None, "N/A") else default
 
+    @classmethod
+    async def _get_json(
+        cls, url: str, params: dict | list = None, metric: str = "kp"
+    ) -> Dict[str, Any]:
+        """Выполняет GET запрос через общую сессию и возвращает JSON"""
+        return await get_provider_json(
+            "KP",
+            cls.LIMITER,
+            cls.BREAKER,
+            url,
+            params,
+            headers={"X-API-KEY": cls.API_KEY},
+            quota_statuses=cls.QUOTA_STATUSES,
+            metric=metric,
+        )
+
     @classmethod
     async def search_movies_series(cls, query: str, page: int = 1) -> Dict[str, Any]:
         """
@@ -33,42 +89,59 @@ class KpService:
             "page": page,
             "limit": 10,  # Можно изменить лимит по необходимости
         }
-        headers = {"X-API-KEY": cls.API_KEY}
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get(url, params=params, headers=headers) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        return {
-                            "Response": "False",
-                            "Error": f"API request failed with status {response.status}",
-                        }
-            except Exception as e:
-                return {
-                    "Response": "False",
-                    "Error": f"Error during API request: {str(e)}",
-                }
+        return await cls._get_json(url, params, metric="kp.search")
 
     @classmethod
     async def get_item_details(cls, kp_id: str) -> Dict[str, Any]:
         """
         Получение детальной информации о фильме/сериале по Kinopoisk ID
         """
+        if cls.PROJECTED_DETAILS:
+            return await cls._get_projected_details(kp_id)
         url = cls.BASE_URL + f"movie/{kp_id}"
-        headers = {"X-API-KEY": cls.API_KEY}
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get(url, headers=headers) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        return {
-                            "Response": "False",
-                            "Error": f"API request failed with status {response.status}",
-                        }
-            except Exception as e:
-                return {
-                    "Response": "False",
-                    "Error": f"Error during API request: {str(e)}",
-                }
+        return await cls._get_json(url, metric="kp.details")
+
+    @classmethod
+    async def get_items_details(cls, kp_ids: list[str]) -> Dict[str, Any]:
+        """
+        Получение деталей нескольких фильмов/сериалов через movie?id=..&id=..,
+        не более BATCH_SIZE ID за запрос
+        :return: словарь kp_id -> документ; ненайденных ID и ID из упавших
+            запросов в нем нет. Если упали все запросы - ответ с ошибкой
+        """
+        url = cls.BASE_URL + "movie"
+        unique_ids = list(dict.fromkeys(str(kp_id) for kp_id in kp_ids))
+        found = {}
+        error = None
+        for start in range(0, len(unique_ids), cls.BATCH_SIZE):
+            chunk = unique_ids[start : start + cls.BATCH_SIZE]
+            params = [("id", kp_id) for kp_id in chunk]
+            params += [("limit", len(chunk))]
+            if cls.PROJECTED_DETAILS:
+                params += [("selectFields", field) for field in cls.DETAILS_FIELDS]
+            response = await cls._get_json(url, params, metric="kp.details_batch")
+            if response.get("Response") == "False":
+                error = response
+                continue
+            for doc in response.get("docs") or []:
+                found[str(doc.get("id"))] = doc
+        if error and not found:
+            return error
+        return found
+
+    @classmethod
+    async def _get_projected_details(cls, kp_id: str) -> Dict[str, Any]:
+        """
+        Запрашивает через movie?id= только поля из DETAILS_FIELDS, без фактов,
+        похожих фильмов и прочих крупных частей документа
+        """
+        url = cls.BASE_URL + "movie"
+        params = [("id", kp_id), ("limit", 1)]
+        params += [("selectFields", field) for field in cls.DETAILS_FIELDS]
+        response = await cls._get_json(url, params, metric="kp.details")
+        if response.get("Response") == "False":
+            return response
+        docs = response.get("docs") or []
+        if not docs:
+            return {"Response": "False", "Error": f"Movie {kp_id} not found"}
+        return docs[0]
@@ -1,6 +1,7 @@
-from database.models_db import EntityDB, RatingDB
-from models.enum_classes import EntityType
-from datetime import datetime
+from database.models_db import EntityDB
+from database.ingestion import upsert_entity_with_ratings
+from models.enum_classes import EntityType, SourceApi
+from datetime import date
 from bot.features.search_kp.kp_service import KpService
 
 
@@ -23,6 +24,14 @@ def parse_seasons_count(seasons_info: list[dict]) -> int | None:
     return max(numbers) if numbers else None
 
 
+def parse_release_year_end(release_years: list[dict]) -> int | None:
+    """Год окончания из releaseYears: [{"start": 2011, "end": 2019}]"""
+    if not release_years or not isinstance(release_years[0], dict):
+        return None
+    end = release_years[0].get("end")
+    return end if isinstance(end, int) else None
+
+
 def parse_person_names_by_profession(
     persons: list[dict], profession: str, name_key: str = "name"
 ) -> list[str]:
@@ -37,8 +46,8 @@ def parse_person_names_by_profession(
     return result
 
 
-def kp_details_to_db(details: dict) -> tuple[EntityDB, bool]:
-    """Создает или обновляет запись в базе данных для сущности из Kp"""
+def parse_kp_details(details: dict) -> dict:
+    """Преобразует ответ Kp в значения полей EntityDB"""
     type = "series" if KpService.get_safe_value(details, "isSeries") else "movie"
     duration = None
     if KpService.get_safe_value(details, "movieLength"):
@@ -46,42 +55,36 @@ def kp_details_to_db(details: dict) -> tuple[EntityDB, bool]:
     elif KpService.get_safe_value(details, "seriesLength"):
         duration = KpService.get_safe_value(details, "seriesLength")
 
-    entity, created = EntityDB.get_or_create(
-        src_id=KpService.get_safe_value(details, "externalId.imdb"),
-        kp_id=KpService.get_safe_value(details, "id"),
-        defaults={
-            "title": KpService.get_safe_value(details, "name") or "No title",
-            "type": type or EntityType.UNDEFINED,
-            "description": KpService.get_safe_value(details, "description"),
-            "poster_url": KpService.get_safe_value(details, "poster.url"),
-            "duration": duration,
-            "genres": parse_dict(
-                KpService.get_safe_value(details, "genres", []), "name"
-            ),
-            "authors": parse_person_names_by_profession(
-                KpService.get_safe_value(details, "persons", []), "director"
-            ),
-            "actors": parse_person_names_by_profession(
-                KpService.get_safe_value(details, "persons", []), "actor"
-            ),
-            "countries": parse_dict(
-                KpService.get_safe_value(details, "countries", []), "name"
-            ),
-            "release_date": datetime.strptime(
-                f"01.01.{KpService.get_safe_value(details, 'year')}", "%d.%m.%Y"
-            ).date(),
-            "year_start": KpService.get_safe_value(details, "year"),
-            "year_end": KpService.get_safe_value(details, "releaseYears.end"),
-            "total_season": parse_seasons_count(
-                KpService.get_safe_value(details, "seasonsInfo", [])
-            ),
-        },
-    )
-    return entity, created
+    year = KpService.get_safe_value(details, "year")
+    kp_id = KpService.get_safe_value(details, "id")
+    persons = KpService.get_safe_value(details, "persons", [])
+    return {
+        "src_id": KpService.get_safe_value(details, "externalId.imdb"),
+        "kp_id": str(kp_id) if kp_id is not None else None,
+        "title": KpService.get_safe_value(details, "name") or "No title",
+        "type": type or EntityType.UNDEFINED,
+        "description": KpService.get_safe_value(details, "description"),
+        "poster_url": KpService.get_safe_value(details, "poster.url"),
+        "duration": duration,
+        "genres": parse_dict(KpService.get_safe_value(details, "genres", []), "name"),
+        "authors": parse_person_names_by_profession(persons, "director"),
+        "actors": parse_person_names_by_profession(persons, "actor"),
+        "countries": parse_dict(
+            KpService.get_safe_value(details, "countries", []), "name"
+        ),
+        "release_date": date(year, 1, 1) if isinstance(year, int) else None,
+        "year_start": year,
+        "year_end": parse_release_year_end(
+            KpService.get_safe_value(details, "releaseYears", [])
+        ),
+        "total_season": parse_seasons_count(
+            KpService.get_safe_value(details, "seasonsInfo", [])
+        ),
+    }
 
 
-def kp_ratings_to_db(entity: EntityDB, details: dict) -> list[RatingDB]:
-    """Создает или обновляет рейтинги в базе данных только для 'kp' и 'imdb'"""
+def parse_kp_ratings(details: dict) -> list[dict]:
+    """Извлекает рейтинги только для 'kp' и 'imdb'"""
     ratings = []
     ratings_data = details.get("rating")
 
@@ -91,11 +94,20 @@ def kp_ratings_to_db(entity: EntityDB, details: dict) -> list[RatingDB]:
     for source in ("kp", "imdb"):
         value = ratings_data.get(source)
         if value is not None:
-            rating, _ = RatingDB.get_or_create(
-                entity=entity,
-                source=source.upper(),  # 'KP' или 'IMDB'
-                defaults={"value": value, "max_value": 10, "percent": False},
+            ratings.append(
+                {
+                    "source": source.upper(),  # 'KP' или 'IMDB'
+                    "value": value,
+                    "max_value": 10,
+                    "percent": False,
+                }
             )
-            ratings.append(rating)
 
     return ratings
+
+
+def kp_details_to_db(details: dict) -> EntityDB:
+    """Создает или обновляет сущность из Kp вместе с рейтингами одним запросом"""
+    return upsert_entity_with_ratings(
+        SourceApi.KP, parse_kp_details(details), parse_kp_ratings(details)
+    )
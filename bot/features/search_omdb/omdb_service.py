@@ -1,6 +1,8 @@
-import aiohttp
 from typing import Dict, Any
 from config.config import load_config
+from bot.shared.api_client import get_provider_json
+from bot.shared.rate_limiter import RateLimiter
+from bot.shared.circuit_breaker import CircuitBreaker
 
 config = load_config()
 
@@ -9,7 +11,33 @@ class OMDbService:
     """Сервис для работы с OMDb API"""
 
     API_KEY = config.omdb.api_key
-    BASE_URL = "https://www.omdbapi.com/"
+    BASE_URL = config.omdb.base_url
+    LIMITER = RateLimiter(
+        "OMDb",
+        per_second=config.omdb.rate_per_second,
+        burst=config.omdb.rate_burst,
+        per_day=config.omdb.daily_limit,
+        background_reserve=config.omdb.background_reserve,
+    )
+    BREAKER = CircuitBreaker(
+        "OMDb",
+        window=config.circuit.window,
+        min_requests=config.circuit.min_requests,
+        failure_rate=config.circuit.failure_rate,
+        slow_call_seconds=config.circuit.slow_call_seconds,
+        open_seconds=config.circuit.open_seconds,
+    )
+    # Статусы, которыми API сообщает об исчерпанной квоте. 401 OMDb отвечает
+    # и на неверный ключ, поэтому квоту при нем определяем по тексту ошибки
+    QUOTA_STATUSES = (429,)
+    QUOTA_ERROR = "Request limit reached!"
+    # Ошибки, которыми API отвечает на неизвестный или неверный IMDb ID
+    NOT_FOUND_ERRORS = (
+        "Incorrect IMDb ID.",
+        "Movie not found!",
+        "Series not found!",
+        "Error getting data.",
+    )
 
     @staticmethod
     def get_safe_value(details: Dict[str, Any], key: str) -> Any:
@@ -29,6 +57,20 @@ class OMDbService:
         value = details[key]
         return value if value != "N/A" else None
 
+    @classmethod
+    async def _get_json(cls, params: dict, metric: str = "omdb") -> Dict[str, Any]:
+        """Выполняет GET запрос через общую сессию и возвращает JSON"""
+        return await get_provider_json(
+            "OMDb",
+            cls.LIMITER,
+            cls.BREAKER,
+            cls.BASE_URL,
+            {**params, "apikey": cls.API_KEY},
+            quota_statuses=cls.QUOTA_STATUSES,
+            quota_error=cls.QUOTA_ERROR,
+            metric=metric,
+        )
+
     @classmethod
     async def search_movies_series(cls, query: str, page: int = 1) -> Dict[str, Any]:
         """
@@ -37,23 +79,8 @@ class OMDbService:
         params = {
             "s": query,
             "page": page,
-            "apikey": cls.API_KEY,
         }
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get(cls.BASE_URL, params=params) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        return {
-                            "Response": "False",
-                            "Error": f"API request failed with status {response.status}",
-                        }
-            except Exception as e:
-                return {
-                    "Response": "False",
-                    "Error": f"Error during API request: {str(e)}",
-                }
+        return await cls._get_json(params, metric="omdb.search")
 
     @classmethod
     async def get_item_details(cls, imdb_id: str) -> Dict[str, Any]:
@@ -62,20 +89,9 @@ class OMDbService:
         """
         params = {
             "i": imdb_id,
-            "apikey": cls.API_KEY,
         }
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.get(cls.BASE_URL, params=params) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        return {
-                            "Response": "False",
-                            "Error": f"API request failed with status {response.status}",
-                        }
-            except Exception as e:
-                return {
-                    "Response": "False",
-                    "Error": f"Error during API request: {str(e)}",
-                }
+        response = await cls._get_json(params, metric="omdb.details")
+        if response.get("Error") in cls.NOT_FOUND_ERRORS:
+            # Как у kp_batch_loader: ошибка относится к самому ID, а не к API
+            response["NotFound"] = True
+        return response
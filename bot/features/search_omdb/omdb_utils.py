@@ -1,5 +1,6 @@
-from database.models_db import EntityDB, RatingDB
-from models.enum_classes import EntityType
+from database.models_db import EntityDB
+from database.ingestion import upsert_entity_with_ratings
+from models.enum_classes import EntityType, SourceApi
 from datetime import datetime, date
 
 
@@ -67,7 +68,8 @@ def parse_rating_value(value_str: str) -> tuple[float, int, bool] | None:
         return None
 
 
-def omdb_details_to_db(details: dict) -> tuple[EntityDB, bool]:
+def parse_omdb_details(details: dict) -> dict:
+    """Преобразует ответ OMDb в значения полей EntityDB"""
     year_start, year_end = parse_year_range(details.get("Year"))
 
     total_season = None
@@ -78,30 +80,27 @@ def omdb_details_to_db(details: dict) -> tuple[EntityDB, bool]:
         except ValueError:
             pass
 
-    entity, created = EntityDB.get_or_create(
-        src_id=details.get("imdbID"),
-        kp_id=None,
-        defaults={
-            "title": details.get("Title") or "No title",
-            "type": details.get("Type") or EntityType.UNDEFINED,
-            "description": details.get("Plot"),
-            "poster_url": details.get("Poster"),
-            "duration": parse_duration(details.get("Runtime")),
-            "genres": parse_list(details.get("Genre")),
-            "authors": parse_list(details.get("Director")),
-            "actors": parse_list(details.get("Actors")),
-            "countries": parse_list(details.get("Country")),
-            "release_date": parse_date(details.get("Released")),
-            "year_start": year_start,
-            "year_end": year_end,
-            "total_season": total_season,
-        },
-    )
-    return entity, created
-
-
-def omdb_ratings_to_db(entity: EntityDB, details: dict) -> list[RatingDB]:
-    """Создает или обновляет рейтинги в базе данных из данных OMDB"""
+    return {
+        "src_id": details.get("imdbID"),
+        "kp_id": None,
+        "title": details.get("Title") or "No title",
+        "type": details.get("Type") or EntityType.UNDEFINED,
+        "description": details.get("Plot"),
+        "poster_url": details.get("Poster"),
+        "duration": parse_duration(details.get("Runtime")),
+        "genres": parse_list(details.get("Genre")),
+        "authors": parse_list(details.get("Director")),
+        "actors": parse_list(details.get("Actors")),
+        "countries": parse_list(details.get("Country")),
+        "release_date": parse_date(details.get("Released")),
+        "year_start": year_start,
+        "year_end": year_end,
+        "total_season": total_season,
+    }
+
+
+def parse_omdb_ratings(details: dict) -> list[dict]:
+    """Извлекает рейтинги из данных OMDB"""
     ratings = []
     ratings_data = details.get("Ratings")
 
@@ -115,13 +114,25 @@ def omdb_ratings_to_db(entity: EntityDB, details: dict) -> list[RatingDB]:
         if not source or not value_str:
             continue
 
-        value, max_value, percent = parse_rating_value(value_str)
-
-        rating, _ = RatingDB.get_or_create(
-            entity=entity,
-            source=source,
-            defaults={"value": value, "max_value": max_value, "percent": percent},
+        parsed = parse_rating_value(value_str)
+        if parsed is None:
+            continue
+        value, max_value, percent = parsed
+
+        ratings.append(
+            {
+                "source": source,
+                "value": value,
+                "max_value": max_value,
+                "percent": percent,
+            }
         )
-        ratings.append(rating)
 
     return ratings
+
+
+def omdb_details_to_db(details: dict) -> EntityDB:
+    """Создает или обновляет сущность из OMDb вместе с рейтингами одним запросом"""
+    return upsert_entity_with_ratings(
+        SourceApi.OMDB, parse_omdb_details(details), parse_omdb_ratings(details)
+    )
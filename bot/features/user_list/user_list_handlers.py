@@ -10,17 +10,16 @@ from bot.features.user_list.user_list_keyboards import (
     get_delete_confirm_keyboard,
     get_season_number_keyboard,
 )
-from database.models_db import UserEntityDB, UserDB
+from database.models_db import UserEntityDB
+from database import repository
 from models.enum_classes import StatusType
 from bot.states.fsm_states import MainMenuStates, UserListStates
 from bot.shared.other_keyboards import get_menu_keyboard
 from bot.formater.message_formater import format_entity_details
-from database.models_db import UserEntityDB, EntityDB
 from aiogram import Router
 from models.factories import build_entity_from_db
 from bot.utils.strings import get_string, get_status_string
-from peewee import fn
-from aiogram.exceptions import TelegramBadRequest
+from bot.shared.message_view import render_text, render_entity_card
 
 logger = logging.getLogger(__name__)
 
@@ -46,28 +45,9 @@ def get_message_from_callback(callback: Union[CallbackQuery, Message]) -> Messag
     return callback.message if isinstance(callback, CallbackQuery) else callback
 
 
-async def safe_edit_or_send_message(
-    message: Message, text: str, reply_markup=None, parse_mode: str = None
-) -> None:
-    """Безопасно редактирует или отправляет сообщение, обрабатывая фото"""
-    if getattr(message, "photo", None):
-        await message.delete()
-        await message.answer(text, reply_markup=reply_markup, parse_mode=parse_mode)
-    else:
-        try:
-            await message.edit_text(
-                text, reply_markup=reply_markup, parse_mode=parse_mode
-            )
-        except TelegramBadRequest:
-            await message.answer(text, reply_markup=reply_markup, parse_mode=parse_mode)
-
-
-def get_user_entity_safe(user_entity_id: int) -> Optional[UserEntityDB]:
+async def get_user_entity_safe(user_entity_id: int) -> Optional[UserEntityDB]:
     """Безопасно получает user_entity с обработкой ошибок"""
-    try:
-        return UserEntityDB.get_by_id(user_entity_id)
-    except UserEntityDB.DoesNotExist:
-        return None
+    return await repository.get_user_entity(user_entity_id)
 
 
 async def handle_back_to_entity(
@@ -85,13 +65,16 @@ async def handle_back_to_entity(
 
 
 async def handle_back_to_list(
-    callback: CallbackQuery, state: FSMContext, page: int = None
+    callback: CallbackQuery,
+    state: FSMContext,
+    page: int = None,
+    use_cached_totals: bool = False,
 ) -> bool:
     """Обрабатывает возврат к списку"""
     if page is not None:
-        await state.update_data(page=page)
+        await state.update_data(page=page, ls_cursor=None, ls_backward=False)
 
-    success = await show_ls_list(callback, state)
+    success = await show_ls_list(callback, state, use_cached_totals)
     if success:
         await callback.answer()
     return success
@@ -100,30 +83,33 @@ async def handle_back_to_list(
 async def show_ls_list(
     callback: CallbackQuery | Message,
     state: FSMContext = None,
+    use_cached_totals: bool = False,
 ) -> bool:
-    user = UserDB.get_or_none(tg_id=callback.from_user.id)
     state_data = await state.get_data()
     query_text = state_data.get("query")
     entity_type_search = state_data.get("entity_type_search")
     status_type = state_data.get("status_type")
     lang = state_data.get("lang")
     page = state_data.get("page", 1)
+    cursor = repository.decode_list_cursor(state_data.get("ls_cursor"))
+    backward = state_data.get("ls_backward", False)
+    # Итоги считаются один раз при открытии списка, листание их переиспользует
+    totals = state_data.get("ls_totals") if use_cached_totals else None
 
     msg = get_message_from_callback(callback)
 
-    query = (
-        UserEntityDB.select()
-        .join(EntityDB)
-        .where(UserEntityDB.user_id == user)
-        .order_by(UserEntityDB.updated_db.desc())
+    user_entities, total_all, total_results = await repository.get_user_list_page(
+        callback.from_user.id,
+        query_text,
+        status_type,
+        page,
+        cursor=cursor if page > 1 else None,
+        backward=backward,
+        totals=tuple(totals) if totals else None,
     )
+    await state.update_data(ls_totals=[total_all, total_results])
 
-    if query_text and query_text != "":
-        query = query.where(fn.LOWER(EntityDB.title).contains(query_text.lower()))
-
-    total_results = query.count()
-
-    if total_results == 0 or total_results is None:
+    if total_all == 0 or total_all is None:
         await state.clear()
         await state.set_state(MainMenuStates.waiting_for_query)
         await msg.answer(
@@ -132,16 +118,12 @@ async def show_ls_list(
         )
         return False
 
-    if status_type != StatusType.ALL:
-        query = query.where(UserEntityDB.status == status_type)
-        total_results = query.count()
-
-    user_entities = list(query.paginate(page, 10))
     keyboard = get_ls_results_keyboard(
         user_entities=user_entities,
         page=page,
         total_results=total_results,
         lang=lang,
+        keyset=not repository.normalize_title_query(query_text or ""),
     )
 
     title_text = (
@@ -155,7 +137,7 @@ async def show_ls_list(
         )
     )
 
-    await safe_edit_or_send_message(msg, title_text, keyboard, parse_mode="HTML")
+    await render_text(msg, title_text, keyboard, parse_mode="HTML")
 
     await state.set_state(UserListStates.waiting_for_ls_select_entity)
     return True
@@ -169,7 +151,7 @@ async def show_ls_entity(
     state_data = await state.get_data()
     lang = state_data.get("lang")
     page = state_data.get("page", 1)
-    user_entity = UserEntityDB.get_or_none(id=user_entity_id)
+    user_entity = await repository.get_user_entity(user_entity_id, with_ratings=True)
     if not user_entity:
         await callback.answer("Not found")
         return False
@@ -184,16 +166,7 @@ async def show_ls_entity(
 
     msg = get_message_from_callback(callback)
 
-    if entity.poster_url and entity.poster_url != "N/A":
-        await msg.delete()
-        try:
-            await msg.answer_photo(
-                entity.poster_url, caption=text, reply_markup=keyboard
-            )
-        except TelegramBadRequest:
-            await msg.edit_text(text, reply_markup=keyboard)
-    else:
-        await msg.edit_text(text, reply_markup=keyboard)
+    await render_entity_card(msg, entity, text, keyboard)
 
     await state.set_state(UserListStates.waiting_for_ls_action_entity)
     await callback.answer()
@@ -207,12 +180,18 @@ async def handle_ls_select_entity(callback: CallbackQuery, state: FSMContext):
     data = callback.data
 
     if data.startswith("ls_page:"):
-        parsed = parse_callback_data(data, 1)
-        if not parsed:
+        # ls_page:<страница> или ls_page:<страница>:<n|p>:<курсор>
+        parts = data.split(":")
+        try:
+            page = int(parts[1])
+        except (ValueError, IndexError):
             await callback.answer("Invalid callback data")
             return
-        page = int(parsed[0])
-        await handle_back_to_list(callback, state, page)
+        cursor, backward = None, False
+        if len(parts) == 4:
+            cursor, backward = parts[3], parts[2] == "p"
+        await state.update_data(page=page, ls_cursor=cursor, ls_backward=backward)
+        await handle_back_to_list(callback, state, use_cached_totals=True)
 
     elif data.startswith("ls_status:"):
         parsed = parse_callback_data(data, 1)
@@ -277,7 +256,7 @@ async def handle_ls_action_entity(callback: CallbackQuery, state: FSMContext):
             return
 
         user_entity_id = int(parsed[0])
-        user_entity = get_user_entity_safe(user_entity_id)
+        user_entity = await get_user_entity_safe(user_entity_id)
         if not user_entity:
             await callback.answer("Entity not found")
             return
@@ -296,7 +275,7 @@ async def handle_ls_action_entity(callback: CallbackQuery, state: FSMContext):
             return
 
         user_entity_id = int(parsed[0])
-        user_entity = get_user_entity_safe(user_entity_id)
+        user_entity = await get_user_entity_safe(user_entity_id)
         if not user_entity:
             await callback.answer("Entity not found")
             return
@@ -315,7 +294,7 @@ async def handle_ls_action_entity(callback: CallbackQuery, state: FSMContext):
             return
 
         user_entity_id = int(parsed[0])
-        user_entity = get_user_entity_safe(user_entity_id)
+        user_entity = await get_user_entity_safe(user_entity_id)
         if not user_entity:
             await callback.answer("Entity not found")
             return
@@ -338,7 +317,7 @@ async def handle_ls_action_entity(callback: CallbackQuery, state: FSMContext):
             return
 
         user_entity_id = int(parsed[0])
-        user_entity = get_user_entity_safe(user_entity_id)
+        user_entity = await get_user_entity_safe(user_entity_id)
         if not user_entity:
             await callback.answer("Entity not found")
             return
@@ -355,8 +334,8 @@ async def handle_ls_action_entity(callback: CallbackQuery, state: FSMContext):
         return
 
     if title_text and keyboard:
-        await safe_edit_or_send_message(
-            callback.message, title_text, keyboard, parse_mode="HTML"
+        await render_text(
+            callback.message, title_text, keyboard, parse_mode="HTML", as_caption=True
         )
     await callback.answer()
 
@@ -372,10 +351,9 @@ async def handle_ls_set_rating(callback: CallbackQuery, state: FSMContext):
             return
 
         user_entity_id, rating = int(parsed[0]), int(parsed[1])
-        user_entity = get_user_entity_safe(user_entity_id)
+        user_entity = await get_user_entity_safe(user_entity_id)
         if user_entity:
-            user_entity.user_rating = rating
-            user_entity.save()
+            await repository.update_user_entity(user_entity, user_rating=rating)
 
     elif callback.data.startswith("ls_back:"):
         parsed = parse_callback_data(callback.data, 1)
@@ -408,10 +386,9 @@ async def handle_ls_set_status(callback: CallbackQuery, state: FSMContext):
             await callback.answer("Invalid status")
             return
 
-        user_entity = get_user_entity_safe(user_entity_id)
+        user_entity = await get_user_entity_safe(user_entity_id)
         if user_entity:
-            user_entity.status = status
-            user_entity.save()
+            await repository.update_user_entity(user_entity, status=status)
 
     elif callback.data.startswith("ls_back:"):
         parsed = parse_callback_data(callback.data, 1)
@@ -441,10 +418,9 @@ async def handle_ls_set_season(callback: CallbackQuery, state: FSMContext):
             return
 
         user_entity_id = int(parsed[0])
-        user_entity = get_user_entity_safe(user_entity_id)
+        user_entity = await get_user_entity_safe(user_entity_id)
         if user_entity:
-            user_entity.current_season = None
-            user_entity.save()
+            await repository.update_user_entity(user_entity, current_season=None)
 
     elif callback.data.startswith("ls_set_season_confirm:"):
         parsed = parse_callback_data(callback.data, 2)
@@ -453,10 +429,9 @@ async def handle_ls_set_season(callback: CallbackQuery, state: FSMContext):
             return
 
         user_entity_id, season = int(parsed[0]), int(parsed[1])
-        user_entity = get_user_entity_safe(user_entity_id)
+        user_entity = await get_user_entity_safe(user_entity_id)
         if user_entity:
-            user_entity.current_season = season
-            user_entity.save()
+            await repository.update_user_entity(user_entity, current_season=season)
 
     elif callback.data.startswith("ls_set_season:"):
         parsed = parse_callback_data(callback.data, 2)
@@ -490,9 +465,9 @@ async def handle_ls_entity_delete(callback: CallbackQuery, state: FSMContext):
 
         user_entity_id, del_confirm = int(parsed[0]), bool(parsed[1])
         if del_confirm:
-            user_entity = get_user_entity_safe(user_entity_id)
+            user_entity = await get_user_entity_safe(user_entity_id)
             if user_entity:
-                user_entity.delete_instance()
+                await repository.delete_user_entity(user_entity)
 
             await handle_back_to_list(callback, state, page=1)
             return
@@ -2,6 +2,7 @@ from typing import List
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from database.models_db import UserEntityDB
+from database.repository import encode_list_cursor
 from models.enum_classes import StatusType, EntityType
 from bot.utils.strings import get_string, get_status_string
 
@@ -11,6 +12,7 @@ def get_ls_results_keyboard(
     page: int,
     total_results: int,
     lang: str = "en",
+    keyset: bool = True,
 ) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
 
@@ -26,14 +28,20 @@ def get_ls_results_keyboard(
             )
         )
 
-    # Пагинация
+    # Пагинация: ls_page:<страница>[:<направление>:<курсор>]
+    prev_data = f"ls_page:{page-1}"
+    next_data = f"ls_page:{page+1}"
+    if keyset and user_entities:
+        prev_data += f":p:{encode_list_cursor(user_entities[0])}"
+        next_data += f":n:{encode_list_cursor(user_entities[-1])}"
+
     total_pages = (total_results + 9) // 10
     pagination_row = []
     if page > 1:
         pagination_row.append(
             InlineKeyboardButton(
                 text="◀️",
-                callback_data=f"ls_page:{page-1}",
+                callback_data=prev_data,
             )
         )
     pagination_row.append(
@@ -48,7 +56,7 @@ def get_ls_results_keyboard(
         pagination_row.append(
             InlineKeyboardButton(
                 text="▶️",
-                callback_data=f"ls_page:{page+1}",
+                callback_data=next_data,
             )
         )
     builder.row(*pagination_row)
@@ -0,0 +1,202 @@
+"""
+Фоновое обновление устаревших entity из списков пользователей.
+
+Раз в interval секунд задача выбирает устаревшие entity (популярные
+первыми), загружает их детали из KP пакетными запросами через общий
+kp_batch_loader (вместе с фоновой предзагрузкой), а из OMDb -
+по одной с ограничением параллельности, и сохраняет пачку двумя
+многострочными upsert. Запросы идут с фоновым приоритетом и не тратят
+резерв квоты, оставленный для пользователей. Entity, которую API не нашел
+или не смог разобрать, откладывается на interval * 2^(n-1) после n-й
+неудачи подряд (не дольше максимального возраста данных), чтобы
+популярные, но неисправные записи не занимали каждую пачку. Ошибки сети,
+5xx, исчерпанная квота и открытый breaker к самой entity не относятся
+и ее не откладывают. Счетчики неудач хранятся в памяти процесса.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from bot.features.search_kp.kp_batch_loader import kp_batch_loader
+from bot.features.search_kp.kp_service import KpService
+from bot.features.search_kp.kp_utils import parse_kp_details, parse_kp_ratings
+from bot.features.search_omdb.omdb_service import OMDbService
+from bot.features.search_omdb.omdb_utils import parse_omdb_details, parse_omdb_ratings
+from bot.shared.rate_limiter import Priority, request_priority
+from config.config import Config
+from database import repository
+from database.executor import run_db
+from database.ingestion import bulk_upsert_entities_with_ratings
+from models.enum_classes import SourceApi
+
+logger = logging.getLogger(__name__)
+
+
+class EntityRefreshJob:
+    def __init__(self, config: Config):
+        self.refresh = config.refresh
+        self.max_age = {
+            SourceApi.KP: timedelta(seconds=config.cache.kp_entity_max_age),
+            SourceApi.OMDB: timedelta(seconds=config.cache.omdb_entity_max_age),
+        }
+        self.series_max_age = timedelta(seconds=config.refresh.series_max_age)
+        self._task: asyncio.Task | None = None
+        # (источник, ID внешнего API) -> (неудач подряд, не обновлять до)
+        self._backoff: dict[tuple[SourceApi, str], tuple[int, datetime]] = {}
+        self.runs = 0
+        self.refreshed = 0
+        self.failed = 0
+        self.last_run: datetime | None = None
+
+    def start(self) -> None:
+        if not self.refresh.enabled or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"Entity refresh job started (every {self.refresh.interval}s)")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _loop(self) -> None:
+        request_priority.set(Priority.BACKGROUND)
+        await asyncio.sleep(self.refresh.initial_delay)
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Entity refresh run failed: {e}")
+            await asyncio.sleep(self.refresh.interval)
+
+    async def run_once(self) -> dict[str, int]:
+        """Обновляет по одной пачке устаревших entity каждого источника"""
+        self.runs += 1
+        self.last_run = datetime.now()
+        result = {
+            SourceApi.KP.value: await self._refresh_kp(),
+            SourceApi.OMDB.value: await self._refresh_omdb(),
+        }
+        logger.info(f"Entity refresh run finished: {result}")
+        return result
+
+    async def _get_stale_ids(self, source_api: SourceApi, limit: int) -> list[str]:
+        now = datetime.now()
+        # Истекшая запись нужна, пока entity не попробуют снова: тогда неудача
+        # удвоит задержку. Entity, которую так и не выбрали за max_age после
+        # истечения (обновилась при поиске или ушла из списков), забываем
+        grace = self.max_age[source_api]
+        for key, (_, until) in list(self._backoff.items()):
+            if key[0] == source_api and until + grace <= now:
+                del self._backoff[key]
+        rows = await repository.get_stale_entities(
+            source_api,
+            updated_before=now - self.max_age[source_api],
+            running_series_updated_before=now - self.series_max_age,
+            limit=limit,
+            exclude_ids=[
+                api_id
+                for (source, api_id), (_, until) in self._backoff.items()
+                if source == source_api and until > now
+            ],
+        )
+        return [api_id for api_id, _ in rows]
+
+    def _record_failure(self, source_api: SourceApi, api_id: str) -> None:
+        self.failed += 1
+        failures = self._backoff.get((source_api, api_id), (0, None))[0] + 1
+        delay = min(
+            self.refresh.interval * 2 ** (failures - 1),
+            self.max_age[source_api].total_seconds(),
+        )
+        until = datetime.now() + timedelta(seconds=delay)
+        self._backoff[(source_api, api_id)] = (failures, until)
+
+    def _handle_error(self, source_api: SourceApi, api_id: str, response: dict) -> None:
+        if response.get("NotFound"):
+            self._record_failure(source_api, api_id)
+        else:
+            # API недоступен - это не повод откладывать саму entity
+            self.failed += 1
+
+    async def _store(
+        self,
+        source_api: SourceApi,
+        docs: dict[str, dict],
+        parse_details,
+        parse_ratings,
+    ) -> int:
+        items = []
+        for api_id, doc in docs.items():
+            try:
+                items.append((parse_details(doc), parse_ratings(doc)))
+            except Exception as e:
+                self._record_failure(source_api, api_id)
+                logger.error(f"Error parsing {source_api.value} details: {e}")
+                continue
+            self._backoff.pop((source_api, api_id), None)
+        if not items:
+            return 0
+        saved = await run_db(bulk_upsert_entities_with_ratings, source_api, items)
+        self.refreshed += saved
+        return saved
+
+    async def _refresh_kp(self) -> int:
+        if not KpService.LIMITER.has_budget(Priority.BACKGROUND):
+            return 0
+        kp_ids = await self._get_stale_ids(SourceApi.KP, self.refresh.kp_batch)
+        if not kp_ids:
+            return 0
+        responses = await kp_batch_loader.load_many(kp_ids)
+        docs = {}
+        for kp_id, response in zip(kp_ids, responses):
+            if response.get("Response") != "False":
+                docs[kp_id] = response
+            else:
+                self._handle_error(SourceApi.KP, kp_id, response)
+        if len(docs) < len(kp_ids):
+            logger.warning(f"KP refresh loaded {len(docs)} of {len(kp_ids)} entities")
+        return await self._store(SourceApi.KP, docs, parse_kp_details, parse_kp_ratings)
+
+    async def _refresh_omdb(self) -> int:
+        imdb_ids = await self._get_stale_ids(SourceApi.OMDB, self.refresh.omdb_batch)
+        semaphore = asyncio.Semaphore(self.refresh.omdb_concurrency)
+
+        async def fetch(imdb_id: str) -> dict | None:
+            async with semaphore:
+                if not OMDbService.LIMITER.has_budget(Priority.BACKGROUND):
+                    return None
+                response = await OMDbService.get_item_details(imdb_id)
+                if response.get("Response") == "False":
+                    self._handle_error(SourceApi.OMDB, imdb_id, response)
+                    return None
+                return response
+
+        docs = await asyncio.gather(*(fetch(imdb_id) for imdb_id in imdb_ids))
+        return await self._store(
+            SourceApi.OMDB,
+            {imdb_id: doc for imdb_id, doc in zip(imdb_ids, docs) if doc},
+            parse_omdb_details,
+            parse_omdb_ratings,
+        )
+
+    def stats(self) -> dict:
+        last_run = None
+        if self.last_run:
+            last_run = self.last_run.strftime("%Y-%m-%d %H:%M:%S")
+        return {
+            "enabled": self.refresh.enabled,
+            "runs": self.runs,
+            "refreshed": self.refreshed,
+            "failed": self.failed,
+            "backed_off": len(self._backoff),
+            "last_run": last_run,
+        }
@@ -0,0 +1,94 @@
+"""
+Общие суточные квоты API для всех реплик бота.
+
+Ограничители считают выданные запросы в памяти процесса. Раз в
+sync_interval секунд задача прибавляет накопленные запросы к счетчику дня
+в таблице api_quota и принимает получившееся значение, в котором учтены
+и запросы других реплик. При запуске счетчик загружается из базы, поэтому
+перезапуск не обнуляет израсходованную квоту. Между синхронизациями
+реплики могут вместе превысить квоту не больше чем на запросы за один
+интервал.
+"""
+
+import asyncio
+import logging
+from datetime import date, datetime
+
+from bot.shared.rate_limiter import RateLimiter
+from config.config import QuotaConfig
+from database import repository
+
+logger = logging.getLogger(__name__)
+
+
+class QuotaSyncJob:
+    def __init__(self, config: QuotaConfig, limiters: list[RateLimiter]):
+        self.interval = config.sync_interval
+        # Без суточной квоты синхронизировать нечего
+        self.limiters = [limiter for limiter in limiters if limiter.per_day]
+        self._task: asyncio.Task | None = None
+        self._cleaned_day: date | None = None
+        self.syncs = 0
+        self.errors = 0
+        self.last_sync: datetime | None = None
+
+    def start(self) -> None:
+        if self.interval <= 0 or not self.limiters or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"API quota sync started (every {self.interval}s)")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # Запросы последнего интервала не должны потеряться при остановке
+        await self.sync_once()
+
+    async def _loop(self) -> None:
+        while True:
+            await self.sync_once()
+            await asyncio.sleep(self.interval)
+
+    async def sync_once(self) -> None:
+        """Складывает счетчики всех ограничителей с общими в базе"""
+        for limiter in self.limiters:
+            day, delta, at_least = limiter.take_unsynced()
+            try:
+                used = await repository.add_api_quota_usage(
+                    limiter.name, day, delta, at_least
+                )
+            except Exception as e:
+                # Вернем запросы, чтобы прибавить их в следующий раз
+                limiter.return_unsynced(day, delta)
+                self.errors += 1
+                logger.error(f"Failed to sync {limiter.name} API quota: {e}")
+                continue
+            limiter.apply_shared_usage(day, used)
+            if self._cleaned_day != day:
+                await self._cleanup(day)
+        self.syncs += 1
+        self.last_sync = datetime.now()
+
+    async def _cleanup(self, today: date) -> None:
+        try:
+            await repository.delete_api_quota_before(today)
+            self._cleaned_day = today
+        except Exception as e:
+            logger.error(f"Failed to delete old API quota counters: {e}")
+
+    def stats(self) -> dict:
+        last_sync = None
+        if self.last_sync:
+            last_sync = self.last_sync.strftime("%Y-%m-%d %H:%M:%S")
+        return {
+            "enabled": self._task is not None,
+            "syncs": self.syncs,
+            "errors": self.errors,
+            "last_sync": last_sync,
+        }
@@ -0,0 +1,109 @@
+"""
+GET запрос к внешнему API через circuit breaker, ограничитель запросов
+и общую HTTP сессию. Ошибки возвращаются в формате ответа OMDb
+({"Response": "False", "Error": ...}), который понимают вызывающие.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict
+
+from bot.shared.circuit_breaker import CircuitBreaker
+from bot.shared.http_client import get_http_session
+from bot.shared.json_payload import decode_json
+from bot.shared.rate_limiter import QuotaExhausted, RateLimiter
+
+logger = logging.getLogger(__name__)
+
+
+def _error_text(body: bytes) -> str | None:
+    """Текст ошибки из JSON тела неуспешного ответа ({"Error": ...})"""
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return None
+    if isinstance(data, dict) and isinstance(data.get("Error"), str):
+        return data["Error"]
+    return None
+
+
+async def get_provider_json(
+    name: str,
+    limiter: RateLimiter,
+    breaker: CircuitBreaker,
+    url: str,
+    params: dict | list = None,
+    headers: dict = None,
+    quota_statuses: tuple[int, ...] = (429,),
+    quota_error: str | None = None,
+    metric: str = "api",
+) -> Dict[str, Any]:
+    """
+    Выполняет GET запрос к провайдеру name и возвращает JSON.
+    :param quota_statuses: статусы, которыми API сообщает об исчерпанной квоте
+    :param quota_error: текст Error в теле ответа об исчерпанной квоте,
+        если API отвечает им со статусом, который означает и другие ошибки
+    :param metric: имя для статистики размера и разбора ответов
+    """
+    permit = breaker.allow_request()
+    if permit is None:
+        # Провайдер недавно отказывал - не ждем его таймаута
+        return {
+            "Response": "False",
+            "Error": f"{name} API is temporarily unavailable",
+            "CircuitOpen": True,
+        }
+    try:
+        await limiter.acquire()
+    except QuotaExhausted as e:
+        breaker.release(permit)
+        return {"Response": "False", "Error": str(e), "QuotaExhausted": True}
+    except BaseException:
+        # Отмена в очереди ограничителя (дедлайн поиска): запрос не выполнялся,
+        # иначе half-open breaker навсегда остался бы с занятой пробой
+        breaker.release(permit)
+        raise
+
+    started = time.monotonic()
+    # Для breaker неудача - ошибка сети, таймаут или ответ 5xx
+    healthy = False
+    try:
+        session = get_http_session()
+        async with session.get(url, params=params, headers=headers) as response:
+            if response.status == 200:
+                data = await decode_json(await response.read(), metric)
+                healthy = True
+                return data
+            healthy = response.status < 500
+            error = {
+                "Response": "False",
+                "Error": f"API request failed with status {response.status}",
+            }
+            api_error = _error_text(await response.read())
+            if response.status in quota_statuses or (
+                quota_error is not None and api_error == quota_error
+            ):
+                limiter.mark_exhausted()
+                error["QuotaExhausted"] = True
+            elif response.status in (401, 403):
+                # Неверный ключ или доступ закрыт: повтор запроса не поможет
+                logger.error(
+                    f"{name} API rejected the request "
+                    f"(status {response.status}): {api_error}"
+                )
+            return error
+    except asyncio.CancelledError:
+        # Отмена ничего не говорит о состоянии провайдера
+        healthy = None
+        breaker.release(permit)
+        raise
+    except Exception as e:
+        return {
+            "Response": "False",
+            "Error": f"Error during API request: {str(e)}",
+        }
+    finally:
+        if healthy is not None:
+            breaker.record(healthy, time.monotonic() - started, permit)
@@ -0,0 +1,129 @@
+"""
+Circuit breaker для внешних API.
+
+Результаты последних запросов хранятся в скользящем окне. Ошибка или
+ответ медленнее slow_call_seconds считаются неудачей. Когда доля неудач
+в окне достигает порога, breaker открывается и запросы к провайдеру сразу
+отклоняются. Через open_seconds пропускается один пробный запрос
+(half-open): успех закрывает breaker, неудача снова открывает его.
+
+allow_request выдает пропуск, который передается в record или release.
+Состояние half-open меняет только результат запроса с пропуском пробы:
+ответ, отправленный до открытия breaker и пришедший позже, пробой не
+считается.
+"""
+
+import logging
+import time
+from collections import deque
+from enum import Enum
+
+logger = logging.getLogger(__name__)
+
+# Пропуск обычного запроса в закрытом состоянии
+REGULAR_PERMIT = object()
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        window: int = 20,
+        min_requests: int = 5,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 3.0,
+        open_seconds: float = 30.0,
+    ):
+        self.name = name
+        self.min_requests = min_requests
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        # Пропуск текущего пробного запроса half-open
+        self._probe: object | None = None
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> CircuitState:
+        if (
+            self._state == CircuitState.OPEN
+            and time.monotonic() - self._opened_at >= self.open_seconds
+        ):
+            self._state = CircuitState.HALF_OPEN
+        return self._state
+
+    def is_available(self) -> bool:
+        """Можно ли сейчас обращаться к провайдеру (без резервирования пробы)"""
+        state = self.state
+        if state == CircuitState.OPEN:
+            return False
+        if state == CircuitState.HALF_OPEN:
+            return self._probe is None
+        return True
+
+    def allow_request(self) -> object | None:
+        """
+        Возвращает пропуск запроса или None, если запрос отклонен;
+        в half-open пропускает только один пробный
+        """
+        state = self.state
+        if state == CircuitState.CLOSED:
+            return REGULAR_PERMIT
+        if state == CircuitState.HALF_OPEN and self._probe is None:
+            self._probe = object()
+            return self._probe
+        self.rejected += 1
+        return None
+
+    def record(self, success: bool, latency: float, permit: object) -> None:
+        """Учитывает результат запроса, разрешенного allow_request"""
+        ok = success and latency < self.slow_call_seconds
+        if permit is self._probe:
+            self._probe = None
+            if ok:
+                logger.info(f"{self.name} circuit closed")
+                self._state = CircuitState.CLOSED
+                self._outcomes.clear()
+            else:
+                self._open()
+            return
+        if self._state != CircuitState.CLOSED:
+            # Запрос отправлен до открытия breaker: на пробу он не влияет
+            return
+
+        self._outcomes.append(ok)
+        if len(self._outcomes) >= self.min_requests:
+            failures = self._outcomes.count(False)
+            if failures / len(self._outcomes) >= self.failure_rate:
+                self._open()
+
+    def release(self, permit: object) -> None:
+        """Запрос не выполнялся (например, нет квоты): освобождает пробу"""
+        if permit is self._probe:
+            self._probe = None
+
+    def _open(self) -> None:
+        logger.warning(f"{self.name} circuit opened for {self.open_seconds}s")
+        self._state = CircuitState.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.opened += 1
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state.value,
+            "window_failures": self._outcomes.count(False),
+            "window_size": len(self._outcomes),
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
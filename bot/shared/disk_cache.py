@@ -0,0 +1,180 @@
+"""
+Постоянный кэш на диске (SQLite), переживающий перезапуски бота.
+
+Значения хранятся как JSON со временем истечения и счетчиком попаданий.
+При превышении max_bytes сначала удаляются истекшие записи, затем самые
+редко используемые. Все операции выполняются в отдельном потоке, чтобы
+не блокировать event loop.
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at);
+CREATE INDEX IF NOT EXISTS cache_hits ON cache (hits DESC, accessed_at DESC);
+"""
+
+
+class SQLiteCache:
+    # Проверять размер кэша после каждых N записей
+    ENFORCE_EVERY = 200
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        # Один поток - одно соединение SQLite, операции выполняются по очереди
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="disk-cache"
+        )
+        self._conn: sqlite3.Connection | None = None
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            # auto_vacuum действует, только если задан до создания таблиц
+            self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+            if self._conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                # Файл создан без auto_vacuum: один раз перестраиваем его
+                logger.info(f"Enabling incremental auto_vacuum for {self.path}")
+                self._conn.execute("VACUUM")
+        return self._conn
+
+    # Синхронные операции (выполняются в потоке кэша)
+    def _get(self, key: str) -> Any:
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        with conn:
+            conn.execute(
+                "UPDATE cache SET hits = hits + 1, accessed_at = ? WHERE key = ?",
+                (now, key),
+            )
+        self.hits += 1
+        return json.loads(row[0])
+
+    def _set(self, key: str, value: Any, ttl: float) -> None:
+        conn = self._connection()
+        data = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        now = time.time()
+        with conn:
+            conn.execute(
+                "INSERT INTO cache (key, value, size, expires_at, hits, accessed_at) "
+                "VALUES (?, ?, ?, ?, 0, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value, "
+                "size = excluded.size, expires_at = excluded.expires_at, "
+                "accessed_at = excluded.accessed_at",
+                (key, data, len(data), now + ttl, now),
+            )
+        self._writes += 1
+        if self._writes % self.ENFORCE_EVERY == 0:
+            self._enforce_size()
+
+    def _enforce_size(self) -> None:
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(
+                "DELETE FROM cache WHERE expires_at <= ?", (time.time(),)
+            )
+            self.evicted += cursor.rowcount
+            total = conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM cache"
+            ).fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            # Вытесняем редко используемые записи, пока не уложимся в 90% лимита
+            excess = total - int(self.max_bytes * 0.9)
+            victims = []
+            for key, size in conn.execute(
+                "SELECT key, size FROM cache ORDER BY hits ASC, accessed_at ASC"
+            ):
+                victims.append((key,))
+                excess -= size
+                if excess <= 0:
+                    break
+            conn.executemany("DELETE FROM cache WHERE key = ?", victims)
+            self.evicted += len(victims)
+
+    def _compact(self) -> None:
+        self._enforce_size()
+        self._connection().execute("PRAGMA incremental_vacuum")
+
+    def _hottest(self, limit: int) -> list[tuple[str, Any, float]]:
+        now = time.time()
+        rows = self._connection().execute(
+            "SELECT key, value, expires_at FROM cache WHERE expires_at > ? "
+            "ORDER BY hits DESC, accessed_at DESC LIMIT ?",
+            (now, limit),
+        )
+        return [
+            (key, json.loads(value), expires_at - now)
+            for key, value, expires_at in rows
+        ]
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    # Асинхронный интерфейс
+    async def get(self, key: str) -> Any:
+        """Возвращает значение или None, если его нет или оно истекло"""
+        return await self._run(self._get, key)
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        """Сохраняет JSON-сериализуемое значение на ttl секунд"""
+        await self._run(self._set, key, value, ttl)
+
+    async def compact(self) -> None:
+        """Удаляет истекшие и лишние записи и возвращает место на диске"""
+        await self._run(self._compact)
+
+    async def hottest(self, limit: int) -> list[tuple[str, Any, float]]:
+        """Самые используемые живые записи: (ключ, значение, осталось секунд)"""
+        return await self._run(self._hottest, limit)
+
+    async def close(self) -> None:
+        await self._run(self._close)
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> dict:
+        size = self.path.stat().st_size if self.path.exists() else 0
+        return {
+            "file_kb": round(size / 1024, 1),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+        }
@@ -0,0 +1,252 @@
+"""
+Хранилище состояний FSM в Postgres.
+
+Состояние и данные одного ключа хранятся одной строкой fsm_state в виде
+компактного JSON, поэтому несколько реплик бота видят одно и то же
+состояние, а перезапуск не сбрасывает пользователей посреди сценария.
+Изменения за время обработки одного обновления копятся в памяти и
+записываются одним запросом в конце (FsmFlushMiddleware), сколько бы раз
+обработчики ни вызывали update_data. Записи, не менявшиеся дольше TTL,
+считаются пустыми и периодически удаляются.
+
+Хранилище рассчитано на SimpleEventIsolation (create_events_isolation):
+обновления одного ключа обрабатываются по очереди, и следующее читает
+строку только после того, как предыдущее ее записало.
+"""
+
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Mapping
+
+from aiogram import BaseMiddleware
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import (
+    BaseEventIsolation,
+    BaseStorage,
+    DefaultKeyBuilder,
+    KeyBuilder,
+    StateType,
+    StorageKey,
+)
+from aiogram.fsm.storage.memory import (
+    DisabledEventIsolation,
+    MemoryStorage,
+    SimpleEventIsolation,
+)
+from aiogram.types import TelegramObject
+
+from config.config import FsmConfig
+from database import repository
+
+try:
+    import orjson
+
+    def _dumps(data: dict) -> str:
+        return orjson.dumps(data).decode()
+
+    _loads = orjson.loads
+except ImportError:
+
+    def _dumps(data: dict) -> str:
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+    _loads = json.loads
+
+logger = logging.getLogger(__name__)
+
+
+class PostgresStorage(BaseStorage):
+    def __init__(
+        self,
+        ttl: float,
+        cleanup_interval: float,
+        key_builder: KeyBuilder | None = None,
+    ):
+        self.ttl = timedelta(seconds=ttl)
+        self.cleanup_interval = cleanup_interval
+        self.key_builder = key_builder or DefaultKeyBuilder(
+            with_bot_id=True, with_destiny=True
+        )
+        # Записи обновлений, которые сейчас обрабатываются: key -> (state, data)
+        self._records: dict[str, tuple[str | None, dict]] = {}
+        self._dirty: set[str] = set()
+        self._cleanup_task: asyncio.Task | None = None
+        self.loads = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.expired = 0
+        self.errors = 0
+
+    async def _load(self, key: StorageKey) -> tuple[str, tuple[str | None, dict]]:
+        record_key = self.key_builder.build(key)
+        record = self._records.get(record_key)
+        if record is None:
+            self.loads += 1
+            row = await repository.get_fsm_record(
+                record_key, datetime.now() - self.ttl
+            )
+            state, data = row if row else (None, None)
+            # Пока шло чтение, параллельное обновление того же ключа могло
+            # загрузить или изменить запись - она новее строки из базы
+            record = self._records.setdefault(
+                record_key, (state, _loads(data) if data else {})
+            )
+        return record_key, record
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record_key, (_, data) = await self._load(key)
+        state = state.state if isinstance(state, State) else state
+        self._records[record_key] = (state, data)
+        self._dirty.add(record_key)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        _, (state, _) = await self._load(key)
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            msg = f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            raise DataNotDictLikeError(msg)
+        record_key, (state, _) = await self._load(key)
+        self._records[record_key] = (state, data.copy())
+        self._dirty.add(record_key)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        _, (_, data) = await self._load(key)
+        return data.copy()
+
+    async def flush(self, *keys: StorageKey) -> None:
+        """
+        Записывает измененные записи ключей (все, если ключи не переданы)
+        и убирает их из памяти: следующее обновление прочитает их из базы.
+        Запись убирается только после сохранения, чтобы до этого момента
+        никто не прочитал из базы ее старую версию.
+        """
+        if keys:
+            record_keys = [self.key_builder.build(key) for key in keys]
+        else:
+            record_keys = list(self._records)
+        now = datetime.now()
+        rows, deleted_keys, written = [], [], {}
+        for record_key in record_keys:
+            record = self._records.get(record_key)
+            if record is None:
+                continue
+            if record_key not in self._dirty:
+                del self._records[record_key]
+                continue
+            self._dirty.discard(record_key)
+            written[record_key] = record
+            state, data = record
+            if state is None and not data:
+                deleted_keys.append(record_key)
+                continue
+            rows.append(
+                {
+                    "key": record_key,
+                    "state": state,
+                    "data": _dumps(data) if data else None,
+                    "updated_db": now,
+                }
+            )
+        if not rows and not deleted_keys:
+            return
+        try:
+            await repository.save_fsm_records(rows, deleted_keys)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Failed to save FSM state: {e}")
+            # Оставляем записи в памяти, их сохранит следующий flush
+            self._dirty.update(written)
+            return
+        for record_key, record in written.items():
+            # Запись, измененную во время сохранения, запишет следующий flush
+            if record_key in self._dirty or self._records.get(record_key) is not record:
+                continue
+            del self._records[record_key]
+        self.flushes += 1
+        self.rows_written += len(rows) + len(deleted_keys)
+
+    def start(self) -> None:
+        """Запускает периодическое удаление устаревших состояний"""
+        if self._cleanup_task is None and self.cleanup_interval > 0:
+            self._cleanup_task = asyncio.create_task(self._cleanup_loop())
+
+    async def _cleanup_loop(self) -> None:
+        while True:
+            try:
+                deleted = await repository.delete_expired_fsm_records(
+                    datetime.now() - self.ttl
+                )
+                self.expired += deleted
+                if deleted:
+                    logger.info(f"Deleted {deleted} expired FSM states")
+            except Exception as e:
+                logger.error(f"FSM state cleanup failed: {e}")
+            await asyncio.sleep(self.cleanup_interval)
+
+    async def close(self) -> None:
+        # Вызывается диспетчером при остановке (dp.fsm.close), повторный
+        # вызов ничего не делает
+        if self._cleanup_task is not None:
+            self._cleanup_task.cancel()
+            try:
+                await self._cleanup_task
+            except asyncio.CancelledError:
+                pass
+            self._cleanup_task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._records),
+            "dirty": len(self._dirty),
+            "loads": self.loads,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "expired": self.expired,
+            "errors": self.errors,
+        }
+
+
+class FsmFlushMiddleware(BaseMiddleware):
+    """Записывает состояние FSM одним запросом после обработки обновления"""
+
+    def __init__(self, storage: PostgresStorage):
+        self.storage = storage
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        try:
+            return await handler(event, data)
+        finally:
+            state = data.get("state")
+            if state is not None:
+                await self.storage.flush(state.key)
+
+
+def create_events_isolation(storage: BaseStorage) -> BaseEventIsolation:
+    """
+    Блокировка ключа FSM на время обработки обновления. PostgresStorage
+    без нее может прочитать строку, которую параллельное обновление того же
+    ключа еще не записало, и затереть его состояние.
+    """
+    if isinstance(storage, PostgresStorage):
+        return SimpleEventIsolation()
+    return DisabledEventIsolation()
+
+
+def create_fsm_storage(config: FsmConfig) -> BaseStorage:
+    """Создает хранилище FSM по FSM_STORAGE: memory или postgres"""
+    if config.storage == "memory":
+        return MemoryStorage()
+    if config.storage == "postgres":
+        return PostgresStorage(config.ttl, config.cleanup_interval)
+    raise ValueError(f"Unknown FSM storage: {config.storage}")
@@ -0,0 +1,44 @@
+import logging
+import aiohttp
+from config.config import HttpConfig
+
+logger = logging.getLogger(__name__)
+
+_session: aiohttp.ClientSession | None = None
+
+
+async def setup_http_session(config: HttpConfig) -> None:
+    """Создает общую сессию aiohttp с keep-alive для внешних API"""
+    global _session
+    if _session is not None and not _session.closed:
+        return
+    connector = aiohttp.TCPConnector(
+        limit=config.limit,
+        limit_per_host=config.limit_per_host,
+        ttl_dns_cache=config.dns_cache_ttl,
+        keepalive_timeout=config.keepalive_timeout,
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=config.total_timeout,
+        connect=config.connect_timeout,
+        sock_read=config.read_timeout,
+    )
+    _session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+    logger.info("HTTP session started")
+
+
+async def close_http_session() -> None:
+    """Закрывает общую сессию aiohttp"""
+    global _session
+    if _session is None:
+        return
+    await _session.close()
+    _session = None
+    logger.info("HTTP session closed")
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Возвращает общую сессию aiohttp"""
+    if _session is None or _session.closed:
+        raise RuntimeError("HTTP session is not initialized")
+    return _session
@@ -0,0 +1,77 @@
+"""
+Разбор JSON ответов внешних API.
+
+Используется orjson, если он установлен, иначе стандартный json. Большие
+ответы разбираются в пуле потоков, чтобы не блокировать event loop.
+По каждому типу ответа собираются размер и время разбора.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+from typing import Any
+
+try:
+    import orjson
+
+    _loads = orjson.loads
+    JSON_BACKEND = "orjson"
+except ImportError:
+    _loads = json.loads
+    JSON_BACKEND = "json"
+
+logger = logging.getLogger(__name__)
+
+# Ответы больше этого размера (байт) разбираются вне event loop
+OFFLOAD_THRESHOLD = 64 * 1024
+
+
+class _PayloadStats:
+    __slots__ = ("count", "bytes_total", "bytes_max", "decode_time_total", "offloaded")
+
+    def __init__(self):
+        self.count = 0
+        self.bytes_total = 0
+        self.bytes_max = 0
+        self.decode_time_total = 0.0
+        self.offloaded = 0
+
+
+_stats: dict[str, _PayloadStats] = defaultdict(_PayloadStats)
+
+
+async def decode_json(body: bytes, metric: str) -> Any:
+    """
+    Разбирает тело ответа и учитывает его в метриках.
+    :param metric: имя типа ответа, например kp.details
+    """
+    started = time.perf_counter()
+    offloaded = len(body) > OFFLOAD_THRESHOLD
+    if offloaded:
+        data = await asyncio.to_thread(_loads, body)
+    else:
+        data = _loads(body)
+
+    stats = _stats[metric]
+    stats.count += 1
+    stats.bytes_total += len(body)
+    stats.bytes_max = max(stats.bytes_max, len(body))
+    stats.decode_time_total += time.perf_counter() - started
+    stats.offloaded += offloaded
+    return data
+
+
+def get_payload_stats() -> dict:
+    """Возвращает метрики размера и разбора ответов по типам"""
+    result = {"backend": JSON_BACKEND}
+    for metric, stats in sorted(_stats.items()):
+        result[f"{metric}.count"] = stats.count
+        result[f"{metric}.avg_kb"] = round(stats.bytes_total / stats.count / 1024, 1)
+        result[f"{metric}.max_kb"] = round(stats.bytes_max / 1024, 1)
+        result[f"{metric}.avg_decode_ms"] = round(
+            stats.decode_time_total / stats.count * 1000, 2
+        )
+        result[f"{metric}.offloaded"] = stats.offloaded
+    return result
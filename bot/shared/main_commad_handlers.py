@@ -13,6 +13,7 @@ from bot.states.fsm_states import (
     ProfileStates,
 )
 from database.models_db import UserDB
+from database import repository
 from bot.utils.strings import (
     get_string,
     get_restart_commands,
@@ -22,16 +23,21 @@ from bot.utils.strings import (
 )
 from bot.features.search.search_handlers import search_router
 from bot.features.search.search_gs_handlers import gs_router
+from bot.features.search.search_prefetch import prefetcher
 from bot.features.user_list.user_list_handlers import user_list_router, show_ls_list
 from bot.features.profile.user_profile_handlers import profile_router
 from bot.features.profile.user_profile_keyboards import get_profile_keyboard
 from models.enum_classes import EntityType, StatusType
 from bot.features.deep_link.deep_link_entity_handler import show_dl_entity, dl_router
 from aiogram.types import FSInputFile, InputMediaPhoto
+from bot.shared.metrics import collect_stats, format_stats
+from config.config import load_config
 import logging
 
 logger = logging.getLogger(__name__)
 
+config = load_config()
+
 router = Router()
 router.include_router(search_router)
 router.include_router(gs_router)
@@ -43,7 +49,7 @@ router.include_router(dl_router)
 # Вспомогательные функции
 async def get_user_and_lang(message: types.Message) -> tuple[UserDB, str]:
     """Получить пользователя и язык"""
-    user = UserDB.get_or_none(tg_id=message.from_user.id)
+    user = await repository.get_user_by_tg_id(message.from_user.id)
     lang = user.language if user else "en"
     return user, lang
 
@@ -121,7 +127,7 @@ async def cmd_start(message: types.Message, state: FSMContext):
 async def handle_language_selection(callback: types.CallbackQuery, state: FSMContext):
     # Получение языка
     lang = callback.data.split(":")[1]
-    user, created = get_or_create_user(callback.from_user, lang)
+    user, created = await get_or_create_user(callback.from_user, lang)
     await state.update_data(lang=lang)
 
     # Проверка deep link
@@ -158,6 +164,7 @@ async def handle_cancel(message: types.Message, state: FSMContext):
     if not await ensure_user_exists(message, state):
         return
     await message.delete()  # Удаляем команду пользователя
+    prefetcher.cancel(message.from_user.id)
     await cmd_start(message, state)
 
 
@@ -180,6 +187,17 @@ async def cmd_help(message: types.Message, state: FSMContext):
     await message.answer_media_group(media)
 
 
+@router.message(Command("stats"))
+async def cmd_stats(message: types.Message, state: FSMContext):
+    """Метрики компонентов бота (только для администраторов)"""
+    if message.from_user.id not in config.tg_bot.admin_ids:
+        user, lang = await get_user_and_lang(message)
+        await message.answer(get_string("unknown_command", lang))
+        return
+
+    await message.answer(format_stats(collect_stats()))
+
+
 @router.message(lambda m: m.text and m.text in get_list_commands())
 async def handle_list(message: types.Message, state: FSMContext):
     if not await ensure_user_exists(message, state):
@@ -221,7 +239,7 @@ async def handle_profile(message: types.Message, state: FSMContext):
     await message.answer(
         text=get_string("profile_message", lang).format(
             user_name=user.name,
-            entities_count=user.user_entities.count(),
+            entities_count=await repository.count_user_entities(user),
         ),
         reply_markup=get_profile_keyboard(lang),
     )
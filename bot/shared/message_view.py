@@ -0,0 +1,138 @@
+"""
+Показ экранов бота в одном сообщении.
+
+Экран (список, карточка с постером, вопрос с клавиатурой) по возможности
+показывается правкой текущего сообщения - один вызов Bot API без
+мерцания вместо delete + answer. Карточка сменяет карточку через
+editMessageMedia, вопрос поверх карточки - через editMessageCaption.
+Превратить фото в текстовое сообщение и обратно Telegram не позволяет,
+поэтому такие переходы и настоящие ошибки правки отправляют сообщение
+заново: сначала новое, затем удаление старого.
+"""
+
+import logging
+from typing import Awaitable, Callable
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Message
+
+from bot.shared.poster_sender import (
+    answer_poster,
+    edit_poster,
+    get_cached_file_id,
+    has_poster,
+    is_not_modified,
+)
+from database.models_db import EntityDB
+
+logger = logging.getLogger(__name__)
+
+
+class _ViewStats:
+    def __init__(self):
+        self.text_edits = 0
+        self.caption_edits = 0
+        self.media_edits = 0
+        self.not_modified = 0
+        self.resends = 0
+        self.edit_failures = 0
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
+_stats = _ViewStats()
+
+
+def _edited(message: Message, result: Message | bool) -> Message:
+    # Для inline сообщений Telegram возвращает True вместо Message
+    return result if isinstance(result, Message) else message
+
+
+async def _resend(message: Message, send: Callable[[], Awaitable[Message]]) -> Message:
+    sent = await send()
+    _stats.resends += 1
+    try:
+        await message.delete()
+    except TelegramBadRequest as e:
+        # Сообщения старше 48 часов удалить нельзя, новое уже отправлено
+        logger.debug(f"Failed to delete replaced message: {e}")
+    return sent
+
+
+async def render_text(
+    message: Message,
+    text: str,
+    reply_markup=None,
+    parse_mode: str = None,
+    as_caption: bool = False,
+) -> Message:
+    """
+    Показывает текстовый экран в сообщении.
+    :param parse_mode: по умолчанию - parse_mode бота
+    :param as_caption: если сообщение с фото - заменить подпись и оставить
+        фото (для коротких вопросов поверх карточки)
+    """
+    options = {"reply_markup": reply_markup}
+    if parse_mode:
+        options["parse_mode"] = parse_mode
+    try:
+        if not message.photo:
+            result = await message.edit_text(text, **options)
+            _stats.text_edits += 1
+            return _edited(message, result)
+        if as_caption:
+            result = await message.edit_caption(caption=text, **options)
+            _stats.caption_edits += 1
+            return _edited(message, result)
+    except TelegramBadRequest as e:
+        if is_not_modified(e):
+            _stats.not_modified += 1
+            return message
+        _stats.edit_failures += 1
+        logger.debug(f"Failed to edit message, resending: {e}")
+
+    return await _resend(message, lambda: message.answer(text, **options))
+
+
+async def render_entity_card(
+    message: Message, entity: EntityDB, caption: str, reply_markup=None
+) -> Message:
+    """
+    Показывает карточку entity: постер с подписью или текст, если постера
+    нет или Telegram не может его загрузить.
+    """
+    if not has_poster(entity):
+        return await render_text(message, caption, reply_markup)
+
+    if message.photo:
+        try:
+            file_id = get_cached_file_id(entity)
+            if file_id and message.photo[-1].file_id == file_id:
+                # Постер уже в сообщении - меняется только подпись
+                result = await message.edit_caption(
+                    caption=caption, reply_markup=reply_markup
+                )
+                _stats.caption_edits += 1
+            else:
+                result = await edit_poster(message, entity, caption, reply_markup)
+                _stats.media_edits += 1
+            return _edited(message, result)
+        except TelegramBadRequest as e:
+            if is_not_modified(e):
+                _stats.not_modified += 1
+                return message
+            _stats.edit_failures += 1
+            logger.debug(f"Failed to edit entity card, resending: {e}")
+
+    try:
+        return await _resend(
+            message, lambda: answer_poster(message, entity, caption, reply_markup)
+        )
+    except TelegramBadRequest as e:
+        logger.warning(f"Failed to send poster for entity {entity.id}: {e}")
+        return await render_text(message, caption, reply_markup)
+
+
+def get_view_stats() -> dict:
+    return _stats.as_dict()
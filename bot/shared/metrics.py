@@ -0,0 +1,34 @@
+import logging
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+_stats_providers: dict[str, Callable[[], dict]] = {}
+
+
+def register_stats_provider(name: str, provider: Callable[[], dict]) -> None:
+    """Регистрирует функцию, возвращающую метрики компонента"""
+    _stats_providers[name] = provider
+
+
+def collect_stats() -> dict[str, dict]:
+    """Собирает метрики всех зарегистрированных компонентов"""
+    stats = {}
+    for name, provider in _stats_providers.items():
+        try:
+            stats[name] = provider()
+        except Exception as e:
+            logger.error(f"Error collecting stats for {name}: {e}")
+    return stats
+
+
+def format_stats(stats: dict[str, dict]) -> str:
+    """Форматирует метрики для отправки в Telegram"""
+    if not stats:
+        return "No stats"
+    blocks = []
+    for name, values in stats.items():
+        lines = [f"<b>{name}</b>"]
+        lines.extend(f"{key}: <code>{value}</code>" for key, value in values.items())
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
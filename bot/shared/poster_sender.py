@@ -0,0 +1,149 @@
+"""
+Отправка постеров entity с повторным использованием file_id Telegram.
+
+Первый раз постер отправляется по URL провайдера, Telegram скачивает его
+сам и возвращает file_id, который сохраняется в entity. Следующие отправки
+идут по file_id без обращения к CDN провайдера. file_id действителен,
+пока poster_url совпадает с poster_file_url: при обновлении постера из API
+он перестает использоваться и заменяется при следующей отправке.
+Те же правила действуют при замене фото в сообщении (edit_poster).
+"""
+
+import logging
+from typing import Awaitable, Callable
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InputMediaPhoto, Message
+
+from database import repository
+from database.models_db import EntityDB
+
+logger = logging.getLogger(__name__)
+
+
+class _PosterStats:
+    def __init__(self):
+        self.url_sends = 0
+        self.file_id_sends = 0
+        self.file_id_failures = 0
+        self.file_ids_saved = 0
+
+    def as_dict(self) -> dict:
+        total = self.url_sends + self.file_id_sends
+        return {
+            "url_sends": self.url_sends,
+            "file_id_sends": self.file_id_sends,
+            "file_id_failures": self.file_id_failures,
+            "file_ids_saved": self.file_ids_saved,
+            "file_id_ratio": round(self.file_id_sends / total, 3) if total else 0.0,
+        }
+
+
+_stats = _PosterStats()
+
+
+def has_poster(entity: EntityDB) -> bool:
+    return bool(entity.poster_url) and entity.poster_url != "N/A"
+
+
+def get_cached_file_id(entity: EntityDB) -> str | None:
+    """Возвращает file_id постера, если он получен для текущего poster_url"""
+    if entity.poster_file_id and entity.poster_file_url == entity.poster_url:
+        return entity.poster_file_id
+    return None
+
+
+async def remember_file_id(entity: EntityDB, file_id: str | None) -> None:
+    """Сохраняет (или сбрасывает) file_id постера для текущего poster_url"""
+    try:
+        updated = await repository.save_poster_file_id(
+            entity.id, entity.poster_url, file_id
+        )
+    except Exception as e:
+        logger.error(f"Failed to save poster file_id for entity {entity.id}: {e}")
+        return
+    entity.poster_file_id = file_id
+    entity.poster_file_url = entity.poster_url
+    if updated and file_id:
+        _stats.file_ids_saved += 1
+
+
+# Ответы Bot API, означающие, что отправить фото по этому file_id нельзя
+INVALID_FILE_ID_ERRORS = (
+    "wrong file identifier",
+    "wrong remote file identifier",
+    "file reference",
+    "wrong file_id",
+    "invalid file_id",
+    "failed to get http url content",
+    "wrong type of the web page content",
+)
+
+
+def is_not_modified(error: TelegramBadRequest) -> bool:
+    """Telegram отклоняет правку, которая ничего не меняет"""
+    return "message is not modified" in str(error)
+
+
+def is_invalid_file_id(error: TelegramBadRequest) -> bool:
+    """Telegram не принял сам file_id (а не подпись, клавиатуру и т.п.)"""
+    text = str(error).lower()
+    return any(marker in text for marker in INVALID_FILE_ID_ERRORS)
+
+
+async def _send_poster(
+    entity: EntityDB, send: Callable[[str], Awaitable[Message | bool]]
+) -> Message | bool:
+    file_id = get_cached_file_id(entity)
+    if file_id:
+        try:
+            result = await send(file_id)
+            _stats.file_id_sends += 1
+            return result
+        except TelegramBadRequest as e:
+            if not is_invalid_file_id(e):
+                # Ошибка не связана с file_id: по URL она повторилась бы
+                raise
+            # file_id мог стать недействительным, например после смены токена бота
+            _stats.file_id_failures += 1
+            logger.warning(f"Poster file_id rejected for entity {entity.id}: {e}")
+            await remember_file_id(entity, None)
+
+    result = await send(entity.poster_url)
+    _stats.url_sends += 1
+    if isinstance(result, Message) and result.photo:
+        await remember_file_id(entity, result.photo[-1].file_id)
+    return result
+
+
+async def answer_poster(
+    message: Message, entity: EntityDB, caption: str, reply_markup=None
+) -> Message:
+    """
+    Отправляет постер entity с подписью в чат сообщения: по file_id,
+    если он есть, иначе по URL с сохранением полученного file_id.
+    TelegramBadRequest, не связанный с file_id, и ошибки отправки по URL
+    пробрасываются вызывающему.
+    """
+    return await _send_poster(
+        entity,
+        lambda media: message.answer_photo(
+            media, caption=caption, reply_markup=reply_markup
+        ),
+    )
+
+
+async def edit_poster(
+    message: Message, entity: EntityDB, caption: str, reply_markup=None
+) -> Message | bool:
+    """Заменяет фото и подпись сообщения на постер entity (editMessageMedia)"""
+    return await _send_poster(
+        entity,
+        lambda media: message.edit_media(
+            InputMediaPhoto(media=media, caption=caption), reply_markup=reply_markup
+        ),
+    )
+
+
+def get_poster_stats() -> dict:
+    return _stats.as_dict()
@@ -0,0 +1,260 @@
+"""
+Ограничение запросов к внешним API с учетом суточной квоты.
+
+Запросы проходят через token bucket (N запросов в секунду) и суточный
+счетчик. Ожидающие запросы обслуживаются по приоритету: интерактивные
+раньше фоновых (предзагрузка, обновление). Фоновые запросы останавливаются,
+когда от суточной квоты остается резерв, интерактивные - когда квота
+закончилась. В обоих случаях поднимается QuotaExhausted, чтобы вызывающий
+код мог отдать кэшированные или локальные данные.
+
+Если к общей фоновой работе (single-flight, пакетный запрос) присоединился
+интерактивный вызывающий, PriorityBoost поднимает приоритет ее запросов,
+включая уже ждущие в очереди.
+
+Суточный счетчик ведется в памяти процесса. QuotaSyncJob периодически
+складывает его с общим счетчиком в базе, поэтому перезапуск и несколько
+реплик не получают каждый свою полную квоту.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextvars import Context, ContextVar, copy_context
+from datetime import datetime, timezone, date
+from enum import IntEnum
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+# Приоритет запросов текущей задачи; фоновые задачи выставляют BACKGROUND
+request_priority: ContextVar[Priority] = ContextVar(
+    "request_priority", default=Priority.INTERACTIVE
+)
+
+
+class PriorityBoost:
+    """
+    Приоритет общей работы нескольких вызывающих. Работа интерактивная,
+    если повышена она сама или любая работа, внутри которой она запущена.
+    """
+
+    # Меняется при каждом повышении: очереди ограничителей пересортировываются
+    generation = 0
+
+    def __init__(self, parents: list["PriorityBoost | None"] = ()):
+        self.parents = [parent for parent in parents if parent is not None]
+        self._interactive = False
+
+    @property
+    def interactive(self) -> bool:
+        return self._interactive or any(parent.interactive for parent in self.parents)
+
+    def upgrade(self) -> None:
+        if not self._interactive:
+            self._interactive = True
+            PriorityBoost.generation += 1
+
+
+_priority_boost: ContextVar[PriorityBoost | None] = ContextVar(
+    "priority_boost", default=None
+)
+
+
+def current_priority() -> Priority:
+    """Приоритет запросов текущей задачи с учетом повышения общей работы"""
+    boost = _priority_boost.get()
+    if boost is not None and boost.interactive:
+        return Priority.INTERACTIVE
+    return request_priority.get()
+
+
+def boosted_context(boost: PriorityBoost) -> Context:
+    """Копия текущего контекста для задачи общей работы с приоритетом boost"""
+    context = copy_context()
+    context.run(_priority_boost.set, boost)
+    return context
+
+
+def current_boost() -> PriorityBoost | None:
+    return _priority_boost.get()
+
+
+class QuotaExhausted(Exception):
+    """Квота API на сегодня исчерпана для запросов этого приоритета"""
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        name: str,
+        per_second: float,
+        burst: int,
+        per_day: int = 0,
+        background_reserve: int = 0,
+    ):
+        """
+        :param per_day: суточная квота, 0 - без ограничения
+        :param background_reserve: сколько запросов квоты оставлять только
+            для интерактивных запросов
+        """
+        self.name = name
+        self.per_second = per_second
+        self.burst = max(burst, 1)
+        self.per_day = per_day
+        self.background_reserve = background_reserve
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+        self._day = self._today()
+        self._used_today = 0
+        # Выданные, но еще не сложенные с общим счетчиком запросы
+        self._unsynced = 0
+        self._exhausted = False
+        self._waiters: list[tuple[int, int, asyncio.Future, PriorityBoost]] = []
+        self._boost_generation = PriorityBoost.generation
+        self._seq = itertools.count()
+        self._dispatcher: asyncio.Task | None = None
+        self.granted = 0
+        self.rejected = 0
+        self.wait_time_max = 0.0
+
+    @staticmethod
+    def _today() -> date:
+        return datetime.now(timezone.utc).date()
+
+    def _roll_day(self) -> None:
+        today = self._today()
+        if today != self._day:
+            self._day = today
+            self._used_today = 0
+            self._unsynced = 0
+            self._exhausted = False
+
+    def remaining_today(self) -> int | None:
+        """Остаток суточной квоты или None, если квота не ограничена"""
+        if not self.per_day:
+            return None
+        self._roll_day()
+        return max(self.per_day - self._used_today, 0)
+
+    def has_budget(self, priority: Priority = Priority.INTERACTIVE) -> bool:
+        """Можно ли сегодня выполнить запрос с таким приоритетом"""
+        remaining = self.remaining_today()
+        if remaining is None:
+            return True
+        if priority == Priority.BACKGROUND:
+            return remaining > self.background_reserve
+        return remaining > 0
+
+    def mark_exhausted(self) -> None:
+        """API ответил, что лимит исчерпан: не тратим запросы до конца суток"""
+        if self.per_day:
+            self._roll_day()
+            self._used_today = self.per_day
+            self._exhausted = True
+        logger.warning(f"{self.name} API quota exhausted for today")
+
+    async def acquire(self, priority: Priority | None = None) -> None:
+        """Ждет разрешения на один запрос или поднимает QuotaExhausted"""
+        boost = None
+        if priority is None:
+            priority = current_priority()
+            boost = _priority_boost.get()
+        if not self.has_budget(priority):
+            self.rejected += 1
+            raise QuotaExhausted(f"{self.name} API quota exhausted")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future, boost))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+        started = time.monotonic()
+        await future
+        self.wait_time_max = max(self.wait_time_max, time.monotonic() - started)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._refilled_at) * self.per_second
+        )
+        self._refilled_at = now
+
+    def _apply_boosts(self) -> None:
+        # Фоновые ожидающие, чью общую работу повысили, встают в очередь
+        # интерактивных на свое место по порядку прихода
+        if self._boost_generation == PriorityBoost.generation:
+            return
+        self._boost_generation = PriorityBoost.generation
+        self._waiters = [
+            (
+                Priority.INTERACTIVE if boost and boost.interactive else priority,
+                seq,
+                future,
+                boost,
+            )
+            for priority, seq, future, boost in self._waiters
+        ]
+        heapq.heapify(self._waiters)
+
+    async def _dispatch(self) -> None:
+        # Выдает токены ожидающим в порядке (приоритет, очередь)
+        while self._waiters:
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.per_second)
+                continue
+            self._apply_boosts()
+            priority, _, future, _ = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            if not self.has_budget(priority):
+                self.rejected += 1
+                future.set_exception(
+                    QuotaExhausted(f"{self.name} API quota exhausted")
+                )
+                continue
+            self._tokens -= 1
+            self._used_today += 1
+            self._unsynced += 1
+            self.granted += 1
+            future.set_result(None)
+
+    def take_unsynced(self) -> tuple[date, int, int]:
+        """
+        Забирает запросы, еще не сложенные с общим счетчиком.
+        :return: (день, сколько прибавить, минимум счетчика после сложения -
+            per_day, если API сообщил об исчерпании квоты, иначе 0)
+        """
+        self._roll_day()
+        delta, self._unsynced = self._unsynced, 0
+        return self._day, delta, self.per_day if self._exhausted else 0
+
+    def return_unsynced(self, day: date, delta: int) -> None:
+        """Возвращает запросы, которые не удалось сложить с общим счетчиком"""
+        if day == self._day:
+            self._unsynced += delta
+
+    def apply_shared_usage(self, day: date, used: int) -> None:
+        """Принимает общий счетчик дня day после сложения"""
+        self._roll_day()
+        if day == self._day:
+            # Запросы, выданные пока шло сложение, в used еще не вошли
+            self._used_today = used + self._unsynced
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self._waiters),
+            "granted": self.granted,
+            "rejected": self.rejected,
+            "used_today": self._used_today,
+            "remaining_today": self.remaining_today(),
+            "wait_time_max_ms": round(self.wait_time_max * 1000, 2),
+        }
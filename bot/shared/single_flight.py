@@ -0,0 +1,56 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+from bot.shared.rate_limiter import (
+    Priority,
+    PriorityBoost,
+    boosted_context,
+    current_boost,
+    current_priority,
+)
+
+
+class SingleFlight:
+    """
+    Объединяет одновременные одинаковые вызовы: пока вызов с ключом key
+    выполняется, остальные вызывающие ждут его результат (или исключение),
+    а не запускают свой. Если к фоновому вызову присоединяется интерактивный,
+    запросы общего вызова к API дальше идут с интерактивным приоритетом.
+    """
+
+    def __init__(self):
+        self._in_flight: dict[Hashable, tuple[asyncio.Task, PriorityBoost]] = {}
+        self.calls = 0
+        self.saved = 0
+
+    async def do(
+        self, key: Hashable, func: Callable[..., Awaitable], *args, **kwargs
+    ) -> Any:
+        flight = self._in_flight.get(key)
+        if flight is None:
+            boost = PriorityBoost([current_boost()])
+            task = asyncio.get_running_loop().create_task(
+                func(*args, **kwargs), context=boosted_context(boost)
+            )
+            self._in_flight[key] = (task, boost)
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.calls += 1
+        else:
+            task, boost = flight
+            if current_priority() == Priority.INTERACTIVE:
+                boost.upgrade()
+            self.saved += 1
+        # shield: отмена одного вызывающего не отменяет общий вызов
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        flight = self._in_flight.get(key)
+        if flight is not None and flight[0] is task:
+            del self._in_flight[key]
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._in_flight),
+            "calls": self.calls,
+            "saved": self.saved,
+        }
@@ -0,0 +1,240 @@
+"""
+Планировщик исходящих запросов к Bot API.
+
+Подключается middleware сессии бота, поэтому через него проходят все
+message.answer, answer_photo, edit_text, delete и т.д. без изменений в
+обработчиках. Запросы в чат ждут токен своего чата (в личном чате около
+1 сообщения в секунду, в группе - 20 в минуту) и общий токен бота
+(около 30 в секунду). На TelegramRetryAfter чат блокируется на retry_after
+секунд и запрос повторяется. Если правка сообщения еще ждет очереди, а для
+того же сообщения пришла новая правка того же типа, отправляется только
+последняя, а ожидавший вызов получает её результат.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import (
+    EditMessageCaption,
+    EditMessageMedia,
+    EditMessageReplyMarkup,
+    EditMessageText,
+    TelegramMethod,
+)
+
+from bot.shared.rate_limiter import RateLimiter
+from config.config import TelegramOutboundConfig
+
+logger = logging.getLogger(__name__)
+
+EDIT_METHODS = (
+    EditMessageText,
+    EditMessageCaption,
+    EditMessageMedia,
+    EditMessageReplyMarkup,
+)
+
+
+class _ChatBucket:
+    __slots__ = ("tokens", "refilled_at", "blocked_until", "lock")
+
+    def __init__(self, burst: int):
+        self.tokens = float(burst)
+        self.refilled_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, rate: float, burst: int) -> None:
+        # Lock выдает токены ожидающим по очереди
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self.tokens = min(burst, self.tokens + (now - self.refilled_at) * rate)
+                self.refilled_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / rate)
+
+    def refund(self) -> None:
+        self.tokens += 1
+
+    def block(self, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def is_idle(self, burst: int, rate: float) -> bool:
+        return not self.lock.locked() and (
+            self.tokens + (time.monotonic() - self.refilled_at) * rate >= burst
+        )
+
+
+class _PendingEdit:
+    __slots__ = ("future", "superseded_by")
+
+    def __init__(self):
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.superseded_by: "_PendingEdit | None" = None
+
+
+class OutboundScheduler(BaseRequestMiddleware):
+    def __init__(self, config: TelegramOutboundConfig):
+        self.config = config
+        self.global_limiter = RateLimiter(
+            "telegram", config.global_per_second, config.global_burst
+        )
+        self._chats: dict[Any, _ChatBucket] = {}
+        self._pending_edits: dict[tuple, _PendingEdit] = {}
+        self.queued = 0
+        self.queued_max = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def _chat_limits(self, chat_id: Any) -> tuple[float, int]:
+        # Отрицательные ID - группы и каналы
+        if isinstance(chat_id, int) and chat_id > 0:
+            return self.config.chat_per_second, self.config.chat_burst
+        return self.config.group_per_minute / 60, self.config.chat_burst
+
+    def _bucket(self, chat_id: Any) -> _ChatBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.config.max_tracked_chats:
+                self._prune()
+            bucket = self._chats[chat_id] = _ChatBucket(self.config.chat_burst)
+        return bucket
+
+    def _prune(self) -> None:
+        # Полный бакет без ожидающих ничем не отличается от нового
+        for chat_id, bucket in list(self._chats.items()):
+            rate, burst = self._chat_limits(chat_id)
+            if bucket.is_idle(burst, rate):
+                del self._chats[chat_id]
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod,
+    ) -> Any:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            # getUpdates, answerCallbackQuery, правки inline сообщений
+            return await make_request(bot, method)
+
+        if isinstance(method, EDIT_METHODS) and method.message_id:
+            edit_key = (chat_id, method.message_id, type(method))
+            return await self._coalesced_edit(make_request, bot, method, edit_key)
+        return await self._send(make_request, bot, method, chat_id)
+
+    async def _coalesced_edit(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod,
+        edit_key: tuple,
+    ) -> Any:
+        entry = _PendingEdit()
+        previous = self._pending_edits.get(edit_key)
+        if previous is not None:
+            previous.superseded_by = entry
+        self._pending_edits[edit_key] = entry
+        try:
+            result = await self._send(make_request, bot, method, edit_key[0], entry)
+            if not entry.future.done():
+                entry.future.set_result(result)
+            return result
+        except Exception as e:
+            if not entry.future.done():
+                entry.future.set_exception(e)
+                # Ошибку получит вызов этой правки, future ее только передает
+                entry.future.exception()
+            raise
+        finally:
+            if self._pending_edits.get(edit_key) is entry:
+                del self._pending_edits[edit_key]
+            if not entry.future.done():
+                # Вызов отменен: ожидающие его старые правки отправятся сами
+                entry.future.cancel()
+
+    async def _send(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod,
+        chat_id: Any,
+        edit: _PendingEdit | None = None,
+    ) -> Any:
+        bucket = self._bucket(chat_id)
+        rate, burst = self._chat_limits(chat_id)
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            self.queued += 1
+            self.queued_max = max(self.queued_max, self.queued)
+            try:
+                await bucket.acquire(rate, burst)
+                if edit is not None and edit.superseded_by is not None:
+                    # Пока правка ждала, пришла более новая правка сообщения
+                    bucket.refund()
+                    self.coalesced += 1
+                    latest = edit.superseded_by
+                    while latest.superseded_by is not None:
+                        latest = latest.superseded_by
+                    try:
+                        return await asyncio.shield(latest.future)
+                    except asyncio.CancelledError:
+                        if not latest.future.cancelled():
+                            raise
+                    edit.superseded_by = None
+                    continue
+                await self.global_limiter.acquire()
+            finally:
+                self.queued -= 1
+                waited = time.monotonic() - started
+                self.wait_time_total += waited
+                self.wait_time_max = max(self.wait_time_max, waited)
+
+            try:
+                result = await make_request(bot, method)
+                self.sent += 1
+                return result
+            except TelegramRetryAfter as e:
+                if attempt >= self.config.max_retries:
+                    raise
+                attempt += 1
+                self.retries += 1
+                bucket.block(e.retry_after)
+                logger.warning(
+                    f"Telegram flood control in chat {chat_id}, "
+                    f"retrying {type(method).__name__} in {e.retry_after}s"
+                )
+
+    def stats(self) -> dict:
+        requests = self.sent + self.coalesced
+        return {
+            "queued": self.queued,
+            "queued_max": self.queued_max,
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "retries": self.retries,
+            "wait_time_avg_ms": round(
+                self.wait_time_total / requests * 1000 if requests else 0.0, 2
+            ),
+            "wait_time_max_ms": round(self.wait_time_max * 1000, 2),
+            "tracked_chats": len(self._chats),
+            "global_queued": self.global_limiter.stats()["queued"],
+        }
@@ -1,4 +1,5 @@
 from database.models_db import UserDB
+from database import repository
 from aiogram.types import Message, CallbackQuery
 from typing import Union, Tuple, Optional
 from bot.utils.strings import get_string
@@ -10,7 +11,7 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-def get_or_create_user(tg_user, lang) -> tuple[UserDB, bool]:
+async def get_or_create_user(tg_user, lang) -> tuple[UserDB, bool]:
     """
     Получить или создать пользователя по данным Telegram.
     :param tg_user: объект message.from_user
@@ -24,13 +25,11 @@ def get_or_create_user(tg_user, lang) -> tuple[UserDB, bool]:
     if full_name == "":
         full_name = None
 
-    user, created = UserDB.get_or_create(
+    user, created = await repository.get_or_create_user(
         tg_id=tg_user.id,
-        defaults={
-            "username": tg_user.username,
-            "name": full_name,
-            "language": lang,
-        },
+        username=tg_user.username,
+        name=full_name,
+        language=lang,
     )
     return user, created
 
@@ -48,7 +47,7 @@ async def ensure_user_exists(
     :return: True если пользователь существует, False если показан выбор языка
     """
 
-    user = UserDB.get_or_none(tg_id=update.from_user.id)
+    user = await repository.get_user_by_tg_id(update.from_user.id)
     if not user:
         await state.set_state(MainMenuStates.waiting_for_language)
         if isinstance(update, CallbackQuery):
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import signal
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from config.config import WebhookConfig
+
+logger = logging.getLogger(__name__)
+
+HEALTH_PATH = "/health"
+
+
+async def _health(request: web.Request) -> web.Response:
+    return web.Response(text="ok")
+
+
+def build_webhook_app(
+    bot: Bot, dp: Dispatcher, config: WebhookConfig
+) -> web.Application:
+    """
+    Создает aiohttp приложение с обработчиком webhook aiogram.
+    Запросы без верного X-Telegram-Bot-Api-Secret-Token получают 401.
+    """
+    app = web.Application()
+    # Сначала startup/shutdown диспетчера, затем обработчик: при остановке
+    # webhook удаляется до закрытия сессии бота
+    setup_application(app, dp, bot=bot)
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=config.secret or None,
+    ).register(app, path=config.path)
+    app.router.add_get(HEALTH_PATH, _health)
+    return app
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher, config: WebhookConfig) -> None:
+    """Запускает прием обновлений через webhook до SIGINT/SIGTERM"""
+    if not config.base_url:
+        raise RuntimeError("WEBHOOK_BASE_URL is required in webhook mode")
+    if not config.secret:
+        logger.warning("WEBHOOK_SECRET is empty, webhook requests are not verified")
+    url = config.base_url.rstrip("/") + config.path
+
+    async def set_webhook():
+        await bot.set_webhook(
+            url,
+            secret_token=config.secret or None,
+            allowed_updates=dp.resolve_used_update_types(),
+            drop_pending_updates=config.drop_pending_updates,
+        )
+        logger.info(f"Webhook set to {url}")
+
+    async def delete_webhook():
+        if config.delete_on_shutdown:
+            await bot.delete_webhook()
+            logger.info("Webhook deleted")
+
+    dp.startup.register(set_webhook)
+    dp.shutdown.register(delete_webhook)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    runner = web.AppRunner(build_webhook_app(bot, dp, config))
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, config.host, config.port).start()
+        logger.info(f"Webhook server listening on {config.host}:{config.port}")
+        await stop.wait()
+    finally:
+        await runner.cleanup()
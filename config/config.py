@@ -11,6 +11,14 @@ class DbConfig:
     user: str
     database: str
     port: int = 5432
+    executor_workers: int = 10
+    max_connections: int = 20
+    stale_timeout: int = 300
+    pool_timeout: int = 10
+    pre_ping: bool = True
+    pre_ping_idle: float = 30
+    reconnect_attempts: int = 3
+    reconnect_backoff: float = 0.5
 
 
 @dataclass
@@ -22,11 +30,127 @@ class TgBot:
 @dataclass
 class OmdbConfig:
     api_key: str
+    base_url: str = "https://www.omdbapi.com/"
+    rate_per_second: float = 10
+    rate_burst: int = 10
+    daily_limit: int = 1000
+    background_reserve: int = 200
 
 
 @dataclass
 class KpConfig:
     api_key: str
+    base_url: str = "https://api.kinopoisk.dev/v1.4/"
+    rate_per_second: float = 5
+    rate_burst: int = 5
+    daily_limit: int = 200
+    background_reserve: int = 50
+    projected_details: bool = True
+
+
+@dataclass
+class QuotaConfig:
+    # Как часто складывать суточные счетчики запросов к API с общими в базе,
+    # 0 - счетчики только в памяти процесса
+    sync_interval: float = 30
+
+
+@dataclass
+class HttpConfig:
+    limit: int = 100
+    limit_per_host: int = 20
+    dns_cache_ttl: int = 300
+    keepalive_timeout: float = 30
+    total_timeout: float = 10
+    connect_timeout: float = 3
+    read_timeout: float = 7
+
+
+@dataclass
+class CircuitConfig:
+    window: int = 20
+    min_requests: int = 5
+    failure_rate: float = 0.5
+    slow_call_seconds: float = 3.0
+    open_seconds: float = 30.0
+
+
+@dataclass
+class CacheConfig:
+    search_max_size: int = 2000
+    kp_search_ttl: float = 6 * 3600
+    omdb_search_ttl: float = 24 * 3600
+    kp_entity_max_age: float = 3 * 24 * 3600
+    omdb_entity_max_age: float = 7 * 24 * 3600
+    # Постоянный кэш страниц поиска; пустой путь - только память
+    disk_path: str = ""
+    disk_max_mb: int = 100
+    warm_up_keys: int = 500
+
+
+@dataclass
+class PrefetchConfig:
+    enabled: bool = False
+    top_n: int = 3
+    next_page: bool = False
+    concurrency: int = 2
+
+
+@dataclass
+class SearchConfig:
+    # single - один источник по языку запроса, federated - KP и OMDb вместе
+    mode: str = "single"
+    federated_deadline: float = 3.0
+
+
+@dataclass
+class RefreshConfig:
+    enabled: bool = True
+    interval: float = 3600
+    initial_delay: float = 60
+    kp_batch: int = 250
+    omdb_batch: int = 50
+    omdb_concurrency: int = 3
+    # Максимальный возраст данных сериала, который еще выходит
+    series_max_age: float = 24 * 3600
+
+
+@dataclass
+class WebhookConfig:
+    # polling - long polling, webhook - aiohttp сервер за балансировщиком
+    mode: str = "polling"
+    # Публичный адрес, на который Telegram будет слать обновления
+    base_url: str = ""
+    path: str = "/webhook"
+    secret: str = ""
+    host: str = "0.0.0.0"
+    port: int = 8000
+    # Удалять webhook при остановке. При нескольких репликах включать нельзя:
+    # остановка одной реплики отключит webhook для всех
+    delete_on_shutdown: bool = False
+    drop_pending_updates: bool = False
+
+
+@dataclass
+class FsmConfig:
+    # memory - в процессе, postgres - общее для реплик и переживает перезапуск
+    storage: str = "postgres"
+    ttl: float = 7 * 24 * 3600
+    cleanup_interval: float = 3600
+
+
+@dataclass
+class TelegramOutboundConfig:
+    enabled: bool = True
+    # Общий лимит бота и лимиты одного чата (личного и группы)
+    global_per_second: float = 30
+    global_burst: int = 30
+    chat_per_second: float = 1
+    chat_burst: int = 3
+    group_per_minute: float = 20
+    # Сколько раз повторять запрос после TelegramRetryAfter
+    max_retries: int = 3
+    max_tracked_chats: int = 10000
 
 
 @dataclass
@@ -35,6 +159,16 @@ class Config:
     db: DbConfig
     omdb: OmdbConfig
     kp: KpConfig
+    quota: QuotaConfig
+    http: HttpConfig
+    circuit: CircuitConfig
+    cache: CacheConfig
+    prefetch: PrefetchConfig
+    search: SearchConfig
+    refresh: RefreshConfig
+    webhook: WebhookConfig
+    fsm: FsmConfig
+    outbound: TelegramOutboundConfig
 
 
 def load_config(path: str = None) -> Config:
@@ -51,7 +185,105 @@ def load_config(path: str = None) -> Config:
             user=env.str("DB_USER"),
             database=env.str("DB_NAME"),
             port=env.int("DB_PORT", 5432),
+            executor_workers=env.int("DB_EXECUTOR_WORKERS", 10),
+            max_connections=env.int("DB_POOL_MAX_CONNECTIONS", 20),
+            stale_timeout=env.int("DB_POOL_STALE_TIMEOUT", 300),
+            pool_timeout=env.int("DB_POOL_TIMEOUT", 10),
+            pre_ping=env.bool("DB_POOL_PRE_PING", True),
+            pre_ping_idle=env.float("DB_POOL_PRE_PING_IDLE", 30),
+            reconnect_attempts=env.int("DB_RECONNECT_ATTEMPTS", 3),
+            reconnect_backoff=env.float("DB_RECONNECT_BACKOFF", 0.5),
+        ),
+        omdb=OmdbConfig(
+            api_key=env.str("OMDB_API_KEY"),
+            base_url=env.str("OMDB_BASE_URL", "https://www.omdbapi.com/"),
+            rate_per_second=env.float("OMDB_RATE_PER_SECOND", 10),
+            rate_burst=env.int("OMDB_RATE_BURST", 10),
+            daily_limit=env.int("OMDB_DAILY_LIMIT", 1000),
+            background_reserve=env.int("OMDB_BACKGROUND_RESERVE", 200),
+        ),
+        kp=KpConfig(
+            api_key=env.str("KP_API_KEY"),
+            base_url=env.str("KP_BASE_URL", "https://api.kinopoisk.dev/v1.4/"),
+            rate_per_second=env.float("KP_RATE_PER_SECOND", 5),
+            rate_burst=env.int("KP_RATE_BURST", 5),
+            daily_limit=env.int("KP_DAILY_LIMIT", 200),
+            background_reserve=env.int("KP_BACKGROUND_RESERVE", 50),
+            projected_details=env.bool("KP_PROJECTED_DETAILS", True),
+        ),
+        quota=QuotaConfig(
+            sync_interval=env.float("API_QUOTA_SYNC_INTERVAL", 30),
+        ),
+        http=HttpConfig(
+            limit=env.int("HTTP_LIMIT", 100),
+            limit_per_host=env.int("HTTP_LIMIT_PER_HOST", 20),
+            dns_cache_ttl=env.int("HTTP_DNS_CACHE_TTL", 300),
+            keepalive_timeout=env.float("HTTP_KEEPALIVE_TIMEOUT", 30),
+            total_timeout=env.float("HTTP_TOTAL_TIMEOUT", 10),
+            connect_timeout=env.float("HTTP_CONNECT_TIMEOUT", 3),
+            read_timeout=env.float("HTTP_READ_TIMEOUT", 7),
+        ),
+        circuit=CircuitConfig(
+            window=env.int("CIRCUIT_WINDOW", 20),
+            min_requests=env.int("CIRCUIT_MIN_REQUESTS", 5),
+            failure_rate=env.float("CIRCUIT_FAILURE_RATE", 0.5),
+            slow_call_seconds=env.float("CIRCUIT_SLOW_CALL_SECONDS", 3.0),
+            open_seconds=env.float("CIRCUIT_OPEN_SECONDS", 30.0),
+        ),
+        cache=CacheConfig(
+            search_max_size=env.int("CACHE_SEARCH_MAX_SIZE", 2000),
+            kp_search_ttl=env.float("CACHE_KP_SEARCH_TTL", 6 * 3600),
+            omdb_search_ttl=env.float("CACHE_OMDB_SEARCH_TTL", 24 * 3600),
+            kp_entity_max_age=env.float("CACHE_KP_ENTITY_MAX_AGE", 3 * 24 * 3600),
+            omdb_entity_max_age=env.float(
+                "CACHE_OMDB_ENTITY_MAX_AGE", 7 * 24 * 3600
+            ),
+            disk_path=env.str("CACHE_DISK_PATH", ""),
+            disk_max_mb=env.int("CACHE_DISK_MAX_MB", 100),
+            warm_up_keys=env.int("CACHE_WARM_UP_KEYS", 500),
+        ),
+        prefetch=PrefetchConfig(
+            enabled=env.bool("PREFETCH_ENABLED", False),
+            top_n=env.int("PREFETCH_TOP_N", 3),
+            next_page=env.bool("PREFETCH_NEXT_PAGE", False),
+            concurrency=env.int("PREFETCH_CONCURRENCY", 2),
+        ),
+        search=SearchConfig(
+            mode=env.str("SEARCH_MODE", "single"),
+            federated_deadline=env.float("SEARCH_FEDERATED_DEADLINE", 3.0),
+        ),
+        refresh=RefreshConfig(
+            enabled=env.bool("REFRESH_ENABLED", True),
+            interval=env.float("REFRESH_INTERVAL", 3600),
+            initial_delay=env.float("REFRESH_INITIAL_DELAY", 60),
+            kp_batch=env.int("REFRESH_KP_BATCH", 250),
+            omdb_batch=env.int("REFRESH_OMDB_BATCH", 50),
+            omdb_concurrency=env.int("REFRESH_OMDB_CONCURRENCY", 3),
+            series_max_age=env.float("REFRESH_SERIES_MAX_AGE", 24 * 3600),
+        ),
+        webhook=WebhookConfig(
+            mode=env.str("BOT_MODE", "polling"),
+            base_url=env.str("WEBHOOK_BASE_URL", ""),
+            path=env.str("WEBHOOK_PATH", "/webhook"),
+            secret=env.str("WEBHOOK_SECRET", ""),
+            host=env.str("WEBHOOK_HOST", "0.0.0.0"),
+            port=env.int("WEBHOOK_PORT", 8000),
+            delete_on_shutdown=env.bool("WEBHOOK_DELETE_ON_SHUTDOWN", False),
+            drop_pending_updates=env.bool("WEBHOOK_DROP_PENDING_UPDATES", False),
+        ),
+        fsm=FsmConfig(
+            storage=env.str("FSM_STORAGE", "postgres"),
+            ttl=env.float("FSM_TTL", 7 * 24 * 3600),
+            cleanup_interval=env.float("FSM_CLEANUP_INTERVAL", 3600),
+        ),
+        outbound=TelegramOutboundConfig(
+            enabled=env.bool("TG_OUTBOUND_ENABLED", True),
+            global_per_second=env.float("TG_GLOBAL_PER_SECOND", 30),
+            global_burst=env.int("TG_GLOBAL_BURST", 30),
+            chat_per_second=env.float("TG_CHAT_PER_SECOND", 1),
+            chat_burst=env.int("TG_CHAT_BURST", 3),
+            group_per_minute=env.float("TG_GROUP_PER_MINUTE", 20),
+            max_retries=env.int("TG_MAX_RETRIES", 3),
+            max_tracked_chats=env.int("TG_MAX_TRACKED_CHATS", 10000),
         ),
-        omdb=OmdbConfig(api_key=env.str("OMDB_API_KEY")),
-        kp=KpConfig(api_key=env.str("KP_API_KEY")),
     )
@@ -1,2 +1,11 @@
 from .connection import setup_database
-from .models_db import UserDB, EntityDB, RatingDB, UserEntityDB
+from .executor import setup_db_executor, shutdown_db_executor, run_db
+from .models_db import (
+    UserDB,
+    EntityDB,
+    RatingDB,
+    UserEntityDB,
+    SchemaVersionDB,
+    FsmStateDB,
+    ApiQuotaDB,
+)
@@ -1,27 +1,209 @@
 from config.config import Config
 import logging
-from peewee import PostgresqlDatabase
-from database.models_db import UserDB, EntityDB, RatingDB, UserEntityDB
+import threading
+import time
+from peewee import PostgresqlDatabase, OperationalError, InterfaceError
+from playhouse.pool import PooledPostgresqlDatabase
+from database.models_db import (
+    UserDB,
+    EntityDB,
+    RatingDB,
+    UserEntityDB,
+    FsmStateDB,
+    ApiQuotaDB,
+)
+from database.migrations import apply_migrations
 
 logger = logging.getLogger(__name__)
 
 db = None
 
 
+class ReconnectingPooledDatabase(PooledPostgresqlDatabase):
+    """
+    Пул соединений с проверкой при выдаче (pre-ping) соединений, которые
+    простояли без дела дольше pre_ping_idle секунд, и счетчиками для
+    подбора размера пула.
+    """
+
+    def __init__(
+        self, database, pre_ping: bool = True, pre_ping_idle: float = 30, **kwargs
+    ):
+        self._pre_ping = pre_ping
+        self._pre_ping_idle = pre_ping_idle
+        # conn_key -> время возврата соединения в пул
+        self._returned_at: dict[int, float] = {}
+        self._statements = threading.local()
+        self._stats_lock = threading.Lock()
+        self._checkouts = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._pings = 0
+        self._discarded = 0
+        self._reconnects = 0
+        super().__init__(database, **kwargs)
+
+    def connect(self, reuse_if_open=False):
+        started = time.monotonic()
+        result = super().connect(reuse_if_open)
+        waited = time.monotonic() - started
+        with self._stats_lock:
+            self._checkouts += 1
+            self._wait_time_total += waited
+            self._wait_time_max = max(self._wait_time_max, waited)
+        return result
+
+    def execute_sql(self, sql, params=None):
+        cursor = super().execute_sql(sql, params)
+        self._statements.count = self.statements_executed() + 1
+        return cursor
+
+    def statements_executed(self) -> int:
+        """Число выполненных запросов в текущем потоке с reset_statements"""
+        return getattr(self._statements, "count", 0)
+
+    def reset_statements(self) -> None:
+        self._statements.count = 0
+
+    def _close(self, conn, close_conn=False):
+        self._returned_at[self.conn_key(conn)] = time.monotonic()
+        super()._close(conn, close_conn)
+
+    def _close_raw(self, conn):
+        self._returned_at.pop(self.conn_key(conn), None)
+        super()._close_raw(conn)
+
+    def _is_closed(self, conn):
+        if super()._is_closed(conn):
+            return True
+        if not self._pre_ping:
+            return False
+        returned_at = self._returned_at.get(self.conn_key(conn), 0.0)
+        if time.monotonic() - returned_at < self._pre_ping_idle:
+            # Недавно работавшее соединение почти наверняка живо: проверка
+            # на каждой выдаче стоила бы лишнего запроса под блокировкой пула
+            return False
+        with self._stats_lock:
+            self._pings += 1
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        except Exception as e:
+            logger.warning(f"Pooled connection failed pre-ping, discarding: {e}")
+            with self._stats_lock:
+                self._discarded += 1
+            self._close_raw(conn)
+            return True
+        return False
+
+    def record_reconnect(self) -> None:
+        with self._stats_lock:
+            self._reconnects += 1
+
+    def get_stats(self) -> dict:
+        with self._pool_lock:
+            in_use = len(self._in_use)
+            idle = len(self._connections)
+        with self._stats_lock:
+            checkouts = self._checkouts
+            return {
+                "max_connections": self._max_connections,
+                "size": in_use + idle,
+                "in_use": in_use,
+                "idle": idle,
+                "checkouts": checkouts,
+                "wait_time_avg_ms": round(
+                    self._wait_time_total / checkouts * 1000 if checkouts else 0.0, 2
+                ),
+                "wait_time_max_ms": round(self._wait_time_max * 1000, 2),
+                "pings": self._pings,
+                "discarded": self._discarded,
+                "reconnects": self._reconnects,
+            }
+
+
+_reconnect_attempts = 3
+_reconnect_backoff = 0.5
+
+
+def call_with_connection(func, *args, **kwargs):
+    """
+    Выполняет функцию с соединением из пула и возвращает его обратно.
+    Повторяет вызов с экспоненциальной задержкой, только если запрос точно
+    не выполнялся: не удалось подключиться или соединение оказалось
+    закрытым (InterfaceError) до первого запроса. Обрыв во время запроса
+    или после него не повторяется - запись могла уже примениться.
+    """
+    attempt = 0
+    while True:
+        try:
+            db.connect(reuse_if_open=True)
+        except OperationalError as e:
+            if attempt >= _reconnect_attempts:
+                raise
+            attempt = _wait_reconnect(attempt, e)
+            continue
+        db.reset_statements()
+        try:
+            return func(*args, **kwargs)
+        except (OperationalError, InterfaceError) as e:
+            not_sent = isinstance(e, InterfaceError) and not db.statements_executed()
+            if not db.is_connection_usable():
+                # Соединение сломано - не возвращаем его в пул
+                db.manual_close()
+            if not not_sent or attempt >= _reconnect_attempts:
+                raise
+            attempt = _wait_reconnect(attempt, e)
+        finally:
+            if not db.is_closed():
+                db.close()
+
+
+def _wait_reconnect(attempt: int, error: Exception) -> int:
+    delay = _reconnect_backoff * (2**attempt)
+    attempt += 1
+    db.record_reconnect()
+    logger.warning(
+        f"Database connection lost, reconnecting in {delay:.1f}s "
+        f"(attempt {attempt}/{_reconnect_attempts}): {error}"
+    )
+    time.sleep(delay)
+    return attempt
+
+
+def get_pool_stats() -> dict:
+    """Возвращает метрики пула соединений"""
+    if db is None:
+        return {}
+    return db.get_stats()
+
+
+def setup_pool(config: Config) -> None:
+    """Создает пул соединений, которым пользуется call_with_connection"""
+    global db, _reconnect_attempts, _reconnect_backoff
+    db = ReconnectingPooledDatabase(
+        config.db.database,
+        user=config.db.user,
+        password=config.db.password,
+        host=config.db.host,
+        port=config.db.port,
+        max_connections=config.db.max_connections,
+        stale_timeout=config.db.stale_timeout,
+        timeout=config.db.pool_timeout,
+        pre_ping=config.db.pre_ping,
+        pre_ping_idle=config.db.pre_ping_idle,
+    )
+    _reconnect_attempts = config.db.reconnect_attempts
+    _reconnect_backoff = config.db.reconnect_backoff
+
+
 def setup_database(config: Config) -> None:
     try:
         # Сначала пытаемся подключиться к целевой базе данных
-        global db
-        db = PostgresqlDatabase(
-            config.db.database,
-            user=config.db.user,
-            password=config.db.password,
-            host=config.db.host,
-            port=config.db.port,
-        )
+        setup_pool(config)
 
         # Устанавливаем базу данных для моделей
-        models = [UserDB, EntityDB, RatingDB, UserEntityDB]
+        models = [UserDB, EntityDB, RatingDB, UserEntityDB, FsmStateDB, ApiQuotaDB]
         for model in models:
             model._meta.database = db
 
@@ -58,10 +240,17 @@ def setup_database(config: Config) -> None:
                 admin_db.close()
                 raise create_error
 
-        # Создаем таблицы
+        # Создаем таблицы и применяем миграции схемы
         db.create_tables(models)
         logger.info("Database tables created successfully")
-        logger.info("Database connection established")
+        apply_migrations(db)
+
+        # Возвращаем стартовое соединение в пул
+        db.close()
+        logger.info(
+            f"Database connection pool established "
+            f"(max_connections={config.db.max_connections})"
+        )
 
     except Exception as e:
         logger.error(f"Database connection failed: {e}")
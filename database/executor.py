@@ -0,0 +1,47 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from database.connection import call_with_connection
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_executor: ThreadPoolExecutor | None = None
+
+
+def setup_db_executor(max_workers: int) -> None:
+    """Создает ограниченный пул потоков для синхронных запросов peewee"""
+    global _executor
+    if _executor is not None:
+        return
+    _executor = ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="db-worker"
+    )
+    logger.info(f"Database executor started with {max_workers} workers")
+
+
+def shutdown_db_executor() -> None:
+    """Останавливает пул потоков базы данных"""
+    global _executor
+    if _executor is None:
+        return
+    _executor.shutdown(wait=True)
+    _executor = None
+    logger.info("Database executor stopped")
+
+
+async def run_db(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Выполняет синхронную функцию работы с БД в пуле потоков,
+    не блокируя event loop. Соединение берется из пула на время вызова.
+    """
+    if _executor is None:
+        raise RuntimeError("Database executor is not initialized")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _executor, functools.partial(call_with_connection, func, *args, **kwargs)
+    )
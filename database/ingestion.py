@@ -0,0 +1,177 @@
+"""
+Запись данных из внешних API одним запросом.
+
+Entity и её рейтинги сохраняются одним оператором
+INSERT ... ON CONFLICT DO UPDATE с data-modifying CTE. Оператор атомарен
+сам по себе, не требует отдельной транзакции и обновляет устаревшие
+значения при повторной загрузке. Рейтинги источников, которых больше нет
+в ответе API, удаляются тем же оператором. Для фонового обновления пачка entity
+пишется двумя многострочными операторами. Функции синхронные и вызываются
+из пула run_db.
+"""
+
+import logging
+from datetime import datetime
+
+from peewee import Select, Tuple, ValuesList
+
+from database.models_db import EntityDB, RatingDB
+from models.enum_classes import SourceApi
+
+logger = logging.getLogger(__name__)
+
+RATING_FIELDS = ("source", "value", "max_value", "percent")
+
+
+def _entity_conflict(source_api: SourceApi) -> dict:
+    # Должно совпадать с уникальными частичными индексами из миграции 1
+    if source_api == SourceApi.KP:
+        return {
+            "conflict_target": [EntityDB.kp_id],
+            "conflict_where": EntityDB.kp_id.is_null(False),
+        }
+    return {
+        "conflict_target": [EntityDB.src_id],
+        "conflict_where": EntityDB.kp_id.is_null(True),
+    }
+
+
+def _entity_preserve(entity_row: dict) -> list:
+    return [
+        EntityDB._meta.fields[name]
+        for name in entity_row
+        if name not in ("id", "added_db", "updated_db")
+    ]
+
+
+def _unique_ratings(rating_rows: list[dict]) -> list[dict]:
+    # Один источник рейтинга может встретиться в ответе дважды
+    return list({row["source"]: row for row in rating_rows}.values())
+
+
+def _build_upsert_query(
+    source_api: SourceApi, entity_row: dict, rating_rows: list[dict], now: datetime
+):
+    entity_cte = (
+        EntityDB.insert(**entity_row, added_db=now, updated_db=now)
+        .on_conflict(
+            preserve=_entity_preserve(entity_row),
+            update={EntityDB.updated_db: now},
+            **_entity_conflict(source_api),
+        )
+        .returning(EntityDB)
+        .cte("upserted_entity")
+    )
+    # Entity принадлежит одному source_api, поэтому все ее рейтинги пришли
+    # из этого API: источник, которого нет в ответе, API больше не отдает
+    deleted_cte = (
+        RatingDB.delete()
+        .where(
+            RatingDB.entity.in_(Select((entity_cte,), [entity_cte.c.id]))
+            & RatingDB.source.not_in([row["source"] for row in rating_rows])
+        )
+        .cte("deleted_ratings")
+    )
+    ctes = [entity_cte, deleted_cte]
+
+    if rating_rows:
+        values = ValuesList(
+            [tuple(row[name] for name in RATING_FIELDS) for row in rating_rows],
+            columns=RATING_FIELDS,
+            alias="v",
+        )
+        ratings_cte = (
+            RatingDB.insert_from(
+                Select(
+                    (entity_cte, values),
+                    [entity_cte.c.id] + [getattr(values.c, n) for n in RATING_FIELDS],
+                ),
+                fields=[RatingDB.entity]
+                + [RatingDB._meta.fields[n] for n in RATING_FIELDS],
+            )
+            .on_conflict(
+                conflict_target=[RatingDB.entity, RatingDB.source],
+                preserve=[RatingDB.value, RatingDB.max_value, RatingDB.percent],
+            )
+            .cte("upserted_ratings")
+        )
+        ctes.append(ratings_cte)
+
+    columns = [
+        getattr(entity_cte.c, field.column_name)
+        for field in EntityDB._meta.sorted_fields
+    ]
+    return EntityDB.select(*columns).from_(entity_cte).with_cte(*ctes).dicts()
+
+
+def upsert_entity_with_ratings(
+    source_api: SourceApi, entity_row: dict, rating_rows: list[dict]
+) -> EntityDB:
+    """
+    Создает или обновляет entity и все её рейтинги одним запросом.
+    :param entity_row: значения полей EntityDB
+    :param rating_rows: словари с ключами source, value, max_value, percent
+    :return: сохраненная entity с заполненным entity.ratings
+    """
+    rating_rows = _unique_ratings(rating_rows)
+
+    query = _build_upsert_query(source_api, entity_row, rating_rows, datetime.now())
+    row = query.get()
+    entity = EntityDB(**row)
+    entity._dirty.clear()
+    entity.ratings = [RatingDB(entity=entity.id, **rating) for rating in rating_rows]
+    return entity
+
+
+def bulk_upsert_entities_with_ratings(
+    source_api: SourceApi, items: list[tuple[dict, list[dict]]]
+) -> int:
+    """
+    Создает или обновляет пачку entity одного источника и их рейтинги:
+    один INSERT ... ON CONFLICT для entity и один для всех рейтингов.
+    :param items: пары (значения полей EntityDB, рейтинги)
+    :return: количество сохраненных entity
+    """
+    key_name = "kp_id" if source_api == SourceApi.KP else "src_id"
+    # Последний ответ для одного внешнего ID побеждает
+    by_key = {row[key_name]: (row, ratings) for row, ratings in items if row[key_name]}
+    if not by_key:
+        return 0
+
+    now = datetime.now()
+    entity_rows = [
+        {**row, "added_db": now, "updated_db": now} for row, _ in by_key.values()
+    ]
+    key_field = EntityDB._meta.fields[key_name]
+    with EntityDB._meta.database.atomic():
+        returned = (
+            EntityDB.insert_many(entity_rows)
+            .on_conflict(
+                preserve=_entity_preserve(entity_rows[0]),
+                update={EntityDB.updated_db: now},
+                **_entity_conflict(source_api),
+            )
+            .returning(EntityDB.id, key_field)
+            .tuples()
+            .execute()
+        )
+        entity_ids = {key: entity_id for entity_id, key in returned}
+
+        rating_rows = [
+            {"entity": entity_ids[key], **rating}
+            for key, (_, ratings) in by_key.items()
+            if key in entity_ids
+            for rating in _unique_ratings(ratings)
+        ]
+        RatingDB.delete().where(
+            RatingDB.entity.in_(list(entity_ids.values()))
+            & Tuple(RatingDB.entity, RatingDB.source).not_in(
+                [(row["entity"], row["source"]) for row in rating_rows]
+            )
+        ).execute()
+        if rating_rows:
+            RatingDB.insert_many(rating_rows).on_conflict(
+                conflict_target=[RatingDB.entity, RatingDB.source],
+                preserve=[RatingDB.value, RatingDB.max_value, RatingDB.percent],
+            ).execute()
+    return len(entity_ids)
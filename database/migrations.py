@@ -0,0 +1,213 @@
+"""
+Версионные миграции схемы.
+
+Базовые таблицы создаются через create_tables, всё остальное (индексы,
+ограничения, расширения) добавляется миграциями ниже. Примененные версии
+хранятся в таблице schema_version, поэтому каждая миграция выполняется
+один раз. Новые миграции добавляются в конец списка MIGRATIONS со
+следующим номером версии.
+"""
+
+import logging
+from typing import Callable, NamedTuple
+
+from database.models_db import SchemaVersionDB
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory lock, чтобы несколько реплик не применяли миграции одновременно
+MIGRATIONS_LOCK_KEY = 7_415_001
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable
+
+
+def _merge_duplicate_entities(db, partition_column: str, condition: str) -> None:
+    """
+    Сливает дубликаты entity с одинаковым внешним ID в самую раннюю запись:
+    переносит на неё user_entity и удаляет рейтинги и сами дубликаты.
+    Если entity оказалась в списке пользователя несколько раз, остается
+    последняя измененная запись user_entity.
+    """
+    db.execute_sql(
+        f"""
+        CREATE TEMP TABLE entity_duplicates ON COMMIT DROP AS
+        SELECT id, keep_id FROM (
+            SELECT id, MIN(id) OVER (PARTITION BY {partition_column}) AS keep_id
+            FROM entity
+            WHERE {condition}
+        ) ranked
+        WHERE id <> keep_id
+        """
+    )
+    db.execute_sql(
+        """
+        DELETE FROM user_entity
+        USING (
+            SELECT ue.id, ROW_NUMBER() OVER (
+                PARTITION BY ue.user_id, COALESCE(d.keep_id, ue.entity_id)
+                ORDER BY ue.updated_db DESC, ue.id DESC
+            ) AS position
+            FROM user_entity ue
+            LEFT JOIN entity_duplicates d ON d.id = ue.entity_id
+            WHERE ue.entity_id IN (
+                SELECT id FROM entity_duplicates
+                UNION SELECT keep_id FROM entity_duplicates
+            )
+        ) ranked
+        WHERE user_entity.id = ranked.id AND ranked.position > 1
+        """
+    )
+    db.execute_sql(
+        """
+        UPDATE user_entity SET entity_id = d.keep_id
+        FROM entity_duplicates d
+        WHERE user_entity.entity_id = d.id
+        """
+    )
+    db.execute_sql(
+        "DELETE FROM rating WHERE entity_id IN (SELECT id FROM entity_duplicates)"
+    )
+    cursor = db.execute_sql(
+        "DELETE FROM entity WHERE id IN (SELECT id FROM entity_duplicates)"
+    )
+    if cursor.rowcount:
+        logger.info(f"Merged {cursor.rowcount} duplicate entities by {partition_column}")
+    db.execute_sql("DROP TABLE entity_duplicates")
+
+
+def _entity_external_ids(db) -> None:
+    # Записи из KP уникальны по kp_id, записи из OMDb (kp_id IS NULL) - по src_id
+    _merge_duplicate_entities(db, "kp_id", "kp_id IS NOT NULL")
+    _merge_duplicate_entities(db, "src_id", "kp_id IS NULL AND src_id IS NOT NULL")
+    db.execute_sql(
+        "CREATE UNIQUE INDEX IF NOT EXISTS entity_kp_id_uniq "
+        "ON entity (kp_id) WHERE kp_id IS NOT NULL"
+    )
+    db.execute_sql(
+        "CREATE UNIQUE INDEX IF NOT EXISTS entity_omdb_src_id_uniq "
+        "ON entity (src_id) WHERE kp_id IS NULL"
+    )
+    # Поиск по IMDb ID для записей из обоих источников
+    db.execute_sql("CREATE INDEX IF NOT EXISTS entity_src_id ON entity (src_id)")
+
+
+def _user_entity_list_indexes(db) -> None:
+    db.execute_sql(
+        "CREATE INDEX IF NOT EXISTS user_entity_user_updated "
+        "ON user_entity (user_id, updated_db DESC)"
+    )
+    db.execute_sql(
+        "CREATE INDEX IF NOT EXISTS user_entity_user_status_updated "
+        "ON user_entity (user_id, status, updated_db DESC)"
+    )
+    db.execute_sql(
+        "CREATE INDEX IF NOT EXISTS user_entity_entity ON user_entity (entity_id)"
+    )
+
+
+def _entity_title_trigram(db) -> None:
+    # Нечеткий поиск по названию: индекс обслуживает ILIKE '%x%' и оператор <%
+    db.execute_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    db.execute_sql(
+        "CREATE INDEX IF NOT EXISTS entity_title_trgm "
+        "ON entity USING gin (LOWER(title) gin_trgm_ops)"
+    )
+
+
+def _user_entity_keyset_indexes(db) -> None:
+    # Keyset пагинация списка идет по (updated_db, id)
+    db.execute_sql(
+        "CREATE INDEX IF NOT EXISTS user_entity_user_updated_id "
+        "ON user_entity (user_id, updated_db DESC, id DESC)"
+    )
+    db.execute_sql(
+        "CREATE INDEX IF NOT EXISTS user_entity_user_status_updated_id "
+        "ON user_entity (user_id, status, updated_db DESC, id DESC)"
+    )
+    db.execute_sql("DROP INDEX IF EXISTS user_entity_user_updated")
+    db.execute_sql("DROP INDEX IF EXISTS user_entity_user_status_updated")
+
+
+def _fsm_state_expiry_index(db) -> None:
+    # Очистка состояний FSM удаляет строки по updated_db
+    db.execute_sql(
+        "CREATE INDEX IF NOT EXISTS fsm_state_updated ON fsm_state (updated_db)"
+    )
+
+
+def _entity_poster_file_id(db) -> None:
+    db.execute_sql("ALTER TABLE entity ADD COLUMN IF NOT EXISTS poster_file_id VARCHAR")
+    db.execute_sql(
+        "ALTER TABLE entity ADD COLUMN IF NOT EXISTS poster_file_url VARCHAR"
+    )
+
+
+def _user_entity_unique(db) -> None:
+    # Одна запись на entity в списке пользователя: из повторов остается
+    # последняя измененная
+    cursor = db.execute_sql(
+        """
+        DELETE FROM user_entity
+        USING (
+            SELECT id, ROW_NUMBER() OVER (
+                PARTITION BY user_id, entity_id
+                ORDER BY updated_db DESC, id DESC
+            ) AS position
+            FROM user_entity
+        ) ranked
+        WHERE user_entity.id = ranked.id AND ranked.position > 1
+        """
+    )
+    if cursor.rowcount:
+        logger.info(f"Deleted {cursor.rowcount} duplicate user_entity rows")
+    db.execute_sql(
+        "CREATE UNIQUE INDEX IF NOT EXISTS user_entity_user_entity_uniq "
+        "ON user_entity (user_id, entity_id)"
+    )
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "entity_external_ids", _entity_external_ids),
+    Migration(2, "user_entity_list_indexes", _user_entity_list_indexes),
+    Migration(3, "entity_title_trigram", _entity_title_trigram),
+    Migration(4, "user_entity_keyset_indexes", _user_entity_keyset_indexes),
+    Migration(5, "fsm_state_expiry_index", _fsm_state_expiry_index),
+    Migration(6, "entity_poster_file_id", _entity_poster_file_id),
+    Migration(7, "user_entity_unique", _user_entity_unique),
+]
+
+
+def apply_migrations(db) -> int:
+    """
+    Применяет все еще не примененные миграции по порядку.
+    Каждая миграция выполняется в отдельной транзакции вместе с записью
+    своей версии в schema_version.
+    :return: количество примененных миграций
+    """
+    SchemaVersionDB._meta.database = db
+    db.create_tables([SchemaVersionDB])
+
+    db.execute_sql("SELECT pg_advisory_lock(%s)", (MIGRATIONS_LOCK_KEY,))
+    try:
+        applied_versions = {row.version for row in SchemaVersionDB.select()}
+        applied = 0
+        for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+            if migration.version in applied_versions:
+                continue
+            logger.info(
+                f"Applying migration {migration.version}: {migration.name}"
+            )
+            with db.atomic():
+                migration.apply(db)
+                SchemaVersionDB.create(version=migration.version, name=migration.name)
+            applied += 1
+
+        current = max(applied_versions | {m.version for m in MIGRATIONS}, default=0)
+        logger.info(f"Database schema is at version {current} ({applied} applied)")
+        return applied
+    finally:
+        db.execute_sql("SELECT pg_advisory_unlock(%s)", (MIGRATIONS_LOCK_KEY,))
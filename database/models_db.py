@@ -42,6 +42,9 @@ class EntityDB(BaseModel):
     )
     description = TextField(null=True)
     poster_url = CharField(null=True)
+    # file_id постера в Telegram и poster_url, для которого он получен
+    poster_file_id = CharField(null=True)
+    poster_file_url = CharField(null=True)
     duration = IntegerField(null=True)
     genres = ArrayField(CharField, null=True)
     authors = ArrayField(CharField, null=True)
@@ -96,3 +99,38 @@ class UserEntityDB(BaseModel):
     class Meta:
         table_name = "user_entity"
         database = None
+
+
+class SchemaVersionDB(BaseModel):
+    version = IntegerField(primary_key=True)
+    name = CharField()
+    applied_db = DateTimeField(default=datetime.now)
+
+    class Meta:
+        table_name = "schema_version"
+        database = None
+
+
+class ApiQuotaDB(BaseModel):
+    # Запросы к API за сутки (UTC), общий счетчик всех реплик
+    name = CharField()
+    day = DateField()
+    used = IntegerField(default=0)
+    updated_db = DateTimeField(default=datetime.now)
+
+    class Meta:
+        primary_key = CompositeKey("name", "day")
+        table_name = "api_quota"
+        database = None
+
+
+class FsmStateDB(BaseModel):
+    # Ключ DefaultKeyBuilder: fsm:<bot_id>:<chat_id>:<user_id>:<destiny>
+    key = CharField(primary_key=True)
+    state = CharField(null=True)
+    data = TextField(null=True)  # компактный JSON
+    updated_db = DateTimeField(default=datetime.now)
+
+    class Meta:
+        table_name = "fsm_state"
+        database = None
@@ -0,0 +1,34 @@
+"""
+Подсчет SQL-запросов peewee для проверки отсутствия N+1.
+
+Пример:
+    with assert_max_queries(2):
+        await show_ls_list(callback, state)
+"""
+
+from contextlib import contextmanager
+from typing import Iterator
+
+from playhouse.test_utils import count_queries
+
+
+class QueryCountExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def assert_max_queries(
+    limit: int, only_select: bool = False
+) -> Iterator[count_queries]:
+    """
+    Проверяет, что внутри блока выполнено не больше limit запросов.
+    Учитываются запросы из всех потоков, включая пул run_db.
+    """
+    counter = count_queries(only_select=only_select)
+    with counter:
+        yield counter
+    if counter.count > limit:
+        queries = "\n".join(str(record.msg) for record in counter.get_queries())
+        raise QueryCountExceeded(
+            f"Expected at most {limit} queries, got {counter.count}:\n{queries}"
+        )
@@ -0,0 +1,555 @@
+"""
+Асинхронный слой доступа к данным.
+
+Все запросы peewee выполняются в пуле потоков через run_db, поэтому
+обработчики aiogram никогда не блокируют event loop ожиданием Postgres.
+Возвращаемые объекты моделей уже содержат загруженные связи, которые
+используют клавиатуры и форматтеры, чтобы ленивые запросы не выполнялись
+в event loop.
+"""
+
+import logging
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from peewee import fn, Expression, Tuple
+
+from database.executor import run_db
+from database.models_db import (
+    UserDB,
+    EntityDB,
+    RatingDB,
+    UserEntityDB,
+    FsmStateDB,
+    ApiQuotaDB,
+)
+from models.enum_classes import SourceApi, StatusType, EntityType
+
+logger = logging.getLogger(__name__)
+
+LIST_PAGE_SIZE = 10
+
+_CURSOR_EPOCH = datetime(1970, 1, 1)
+
+
+# Пользователи
+def _get_user_by_tg_id(tg_id: int) -> Optional[UserDB]:
+    return UserDB.get_or_none(tg_id=tg_id)
+
+
+def _get_or_create_user(
+    tg_id: int, username: str | None, name: str | None, language: str
+) -> tuple[UserDB, bool]:
+    return UserDB.get_or_create(
+        tg_id=tg_id,
+        defaults={
+            "username": username,
+            "name": name,
+            "language": language,
+        },
+    )
+
+
+def _update_user_language(user: UserDB, language: str) -> UserDB:
+    user.language = language
+    user.save()
+    return user
+
+
+def _count_user_entities(user: UserDB) -> int:
+    return user.user_entities.count()
+
+
+async def get_user_by_tg_id(tg_id: int) -> Optional[UserDB]:
+    """Получает пользователя по Telegram ID"""
+    return await run_db(_get_user_by_tg_id, tg_id)
+
+
+async def get_or_create_user(
+    tg_id: int, username: str | None, name: str | None, language: str
+) -> tuple[UserDB, bool]:
+    """Получает или создает пользователя по Telegram ID"""
+    return await run_db(_get_or_create_user, tg_id, username, name, language)
+
+
+async def update_user_language(user: UserDB, language: str) -> UserDB:
+    """Сохраняет новый язык пользователя"""
+    return await run_db(_update_user_language, user, language)
+
+
+async def count_user_entities(user: UserDB) -> int:
+    """Возвращает количество тайтлов в списке пользователя"""
+    return await run_db(_count_user_entities, user)
+
+
+# Сущности
+def prefetch_ratings(entities: list[EntityDB]) -> list[EntityDB]:
+    """
+    Загружает рейтинги для всех entity одним запросом и кладет их в
+    entity.ratings, чтобы build_entity_from_db не делал запрос на каждую.
+    """
+    if not entities:
+        return entities
+    by_id = {entity.id: entity for entity in entities}
+    ratings_by_entity = {entity_id: [] for entity_id in by_id}
+    for rating in RatingDB.select().where(RatingDB.entity.in_(list(by_id))):
+        ratings_by_entity[rating.entity_id].append(rating)
+    for entity_id, entity in by_id.items():
+        # backref-аксессор не является data-дескриптором, список его перекрывает
+        entity.ratings = ratings_by_entity[entity_id]
+    return entities
+
+
+def _get_entity_by_id(entity_id: int, with_ratings: bool = False) -> Optional[EntityDB]:
+    entity = EntityDB.get_or_none(EntityDB.id == entity_id)
+    if entity and with_ratings:
+        prefetch_ratings([entity])
+    return entity
+
+
+def _source_condition(source_api: SourceApi):
+    # Записи, которые находятся по ID этого источника (как в _get_entity_by_api_id)
+    if source_api == SourceApi.KP:
+        return EntityDB.kp_id.is_null(False)
+    return EntityDB.kp_id.is_null(True) & EntityDB.src_id.is_null(False)
+
+
+def _get_entity_by_api_id(
+    source_api: SourceApi, api_id: str, with_ratings: bool = False
+) -> Optional[EntityDB]:
+    if source_api == SourceApi.KP:
+        entity = EntityDB.get_or_none(kp_id=api_id)
+    elif source_api == SourceApi.OMDB:
+        # Та же запись, что обновляет upsert OMDb (индекс entity_omdb_src_id_uniq)
+        entity = EntityDB.get_or_none(
+            (EntityDB.src_id == api_id) & EntityDB.kp_id.is_null(True)
+        )
+    else:
+        return None
+    if entity and with_ratings:
+        prefetch_ratings([entity])
+    return entity
+
+
+def _save_poster_file_id(
+    entity_id: int, poster_url: str, file_id: Optional[str]
+) -> int:
+    # updated_db не трогаем: file_id не делает данные entity свежее.
+    # Если poster_url уже обновился, file_id старого постера не сохраняем
+    return (
+        EntityDB.update(poster_file_id=file_id, poster_file_url=poster_url)
+        .where((EntityDB.id == entity_id) & (EntityDB.poster_url == poster_url))
+        .execute()
+    )
+
+
+def _is_entity_in_user_list(user: UserDB, entity: EntityDB) -> bool:
+    return (
+        UserEntityDB.select()
+        .join(EntityDB)
+        .where(
+            (UserEntityDB.user_id == user)
+            & (
+                (UserEntityDB.entity == entity)
+                | ((EntityDB.src_id == entity.src_id) & (EntityDB.src_id.is_null(False)))
+            )
+        )
+        .exists()
+    )
+
+
+def _get_stale_entities(
+    source_api: SourceApi,
+    updated_before: datetime,
+    running_series_updated_before: datetime,
+    limit: int,
+    exclude_ids: list[str],
+) -> list[tuple[str, int]]:
+    popularity = fn.COUNT(UserEntityDB.id)
+    api_id = EntityDB.kp_id if source_api == SourceApi.KP else EntityDB.src_id
+    # Сериалы без года окончания еще выходят и устаревают быстрее
+    running_series = (EntityDB.type == EntityType.SERIES.value) & (
+        EntityDB.year_end.is_null(True)
+    )
+    stale = (EntityDB.updated_db < updated_before) | (
+        running_series & (EntityDB.updated_db < running_series_updated_before)
+    )
+    if exclude_ids:
+        stale &= api_id.not_in(exclude_ids)
+    return list(
+        EntityDB.select(api_id, popularity)
+        .join(UserEntityDB)
+        .where(_source_condition(source_api) & stale)
+        .group_by(EntityDB.id)
+        .order_by(popularity.desc(), EntityDB.updated_db.asc())
+        .limit(limit)
+        .tuples()
+    )
+
+
+async def get_stale_entities(
+    source_api: SourceApi,
+    updated_before: datetime,
+    running_series_updated_before: datetime,
+    limit: int,
+    exclude_ids: list[str] = (),
+) -> list[tuple[str, int]]:
+    """
+    Возвращает устаревшие entity источника из списков пользователей:
+    сначала самые популярные, при равной популярности - самые старые.
+    :param exclude_ids: ID внешнего API, которые сейчас обновлять не нужно
+    :return: пары (ID внешнего API, количество user_entity)
+    """
+    return await run_db(
+        _get_stale_entities,
+        source_api,
+        updated_before,
+        running_series_updated_before,
+        limit,
+        list(exclude_ids),
+    )
+
+
+async def save_poster_file_id(
+    entity_id: int, poster_url: str, file_id: Optional[str]
+) -> int:
+    """
+    Сохраняет file_id постера, полученный от Telegram для poster_url,
+    или сбрасывает его (file_id=None).
+    """
+    return await run_db(_save_poster_file_id, entity_id, poster_url, file_id)
+
+
+async def get_entity_by_id(
+    entity_id: int, with_ratings: bool = False
+) -> Optional[EntityDB]:
+    """Получает entity по ID или None, при необходимости вместе с рейтингами"""
+    return await run_db(_get_entity_by_id, entity_id, with_ratings)
+
+
+async def get_entity_by_api_id(
+    source_api: SourceApi, api_id: str, with_ratings: bool = False
+) -> Optional[EntityDB]:
+    """Получает entity по ID внешнего API, при необходимости вместе с рейтингами"""
+    return await run_db(_get_entity_by_api_id, source_api, api_id, with_ratings)
+
+
+async def is_entity_in_user_list(user: UserDB, entity: EntityDB) -> bool:
+    """Проверяет, добавлена ли entity (или её дубликат по src_id) в список"""
+    return await run_db(_is_entity_in_user_list, user, entity)
+
+
+# Список пользователя
+def normalize_title_query(query_text: str) -> str:
+    """Приводит поисковый запрос к виду индекса entity_title_trgm"""
+    return " ".join(query_text.lower().split())
+
+
+def _title_search_condition(needle: str):
+    title = fn.LOWER(EntityDB.title)
+    # <% - word_similarity выше порога pg_trgm (терпимо к опечаткам),
+    # %% экранирует процент для psycopg2
+    return title.contains(needle) | Expression(needle, "<%%", title)
+
+
+def _title_search_rank(needle: str):
+    return fn.word_similarity(needle, fn.LOWER(EntityDB.title))
+
+
+def _search_entities(
+    source_api: SourceApi, query_text: str, page: int
+) -> tuple[list[EntityDB], int]:
+    needle = normalize_title_query(query_text)
+    if not needle:
+        return [], 0
+    query = EntityDB.select().where(
+        _source_condition(source_api) & _title_search_condition(needle)
+    )
+    total = query.count()
+    if not total:
+        return [], 0
+    entities = list(
+        query.order_by(_title_search_rank(needle).desc(), EntityDB.id.desc()).paginate(
+            page, LIST_PAGE_SIZE
+        )
+    )
+    return entities, total
+
+
+async def search_entities(
+    source_api: SourceApi, query_text: str, page: int
+) -> tuple[list[EntityDB], int]:
+    """
+    Ищет сохраненные entity источника source_api по названию.
+    :return: (entity страницы, всего найдено)
+    """
+    return await run_db(_search_entities, source_api, query_text, page)
+
+
+def _get_user_entity(
+    user_entity_id: int, with_ratings: bool = False
+) -> Optional[UserEntityDB]:
+    user_entity = (
+        UserEntityDB.select(UserEntityDB, EntityDB)
+        .join(EntityDB)
+        .where(UserEntityDB.id == user_entity_id)
+        .first()
+    )
+    if user_entity and with_ratings:
+        prefetch_ratings([user_entity.entity])
+    return user_entity
+
+
+def encode_list_cursor(user_entity: UserEntityDB) -> str:
+    """Кодирует ключ (updated_db, id) строки списка для callback данных"""
+    micros = (user_entity.updated_db - _CURSOR_EPOCH) // timedelta(microseconds=1)
+    return f"{micros}-{user_entity.id}"
+
+
+def decode_list_cursor(cursor: str) -> tuple[datetime, int] | None:
+    """Декодирует курсор из callback данных или возвращает None"""
+    try:
+        micros, user_entity_id = cursor.split("-", 1)
+        return _CURSOR_EPOCH + timedelta(microseconds=int(micros)), int(
+            user_entity_id
+        )
+    except (ValueError, AttributeError):
+        return None
+
+
+def _count_user_list(
+    tg_id: int, needle: str, status_type: StatusType
+) -> tuple[int, int]:
+    # Одним запросом считаем весь список и список с фильтром статуса
+    total_all = fn.COUNT(UserEntityDB.id)
+    total_status = (
+        fn.COUNT(UserEntityDB.id).filter(UserEntityDB.status == status_type)
+        if status_type != StatusType.ALL
+        else fn.COUNT(UserEntityDB.id)
+    )
+    query = (
+        UserEntityDB.select(total_all, total_status)
+        .join_from(UserEntityDB, UserDB)
+        .where(UserDB.tg_id == tg_id)
+    )
+    if needle:
+        query = query.join_from(UserEntityDB, EntityDB).where(
+            _title_search_condition(needle)
+        )
+    return query.tuples().get()
+
+
+def _get_user_list_page(
+    tg_id: int,
+    query_text: str | None,
+    status_type: StatusType,
+    page: int,
+    cursor: tuple[datetime, int] | None = None,
+    backward: bool = False,
+    totals: tuple[int, int] | None = None,
+) -> tuple[list[UserEntityDB], int, int]:
+    needle = normalize_title_query(query_text) if query_text else ""
+
+    if totals is None:
+        totals = _count_user_list(tg_id, needle, status_type)
+    total_all, total_results = totals
+    if not total_all or not total_results:
+        return [], total_all, total_results
+
+    # Колонки entity выбираются тем же запросом: клавиатура не делает
+    # отдельный запрос на каждую строку
+    query = (
+        UserEntityDB.select(UserEntityDB, EntityDB)
+        .join_from(UserEntityDB, EntityDB)
+        .join_from(UserEntityDB, UserDB)
+        .where(UserDB.tg_id == tg_id)
+        .limit(LIST_PAGE_SIZE)
+    )
+    if status_type != StatusType.ALL:
+        query = query.where(UserEntityDB.status == status_type)
+
+    if needle:
+        # Лучшие совпадения первыми, при равной похожести - недавние.
+        # Результаты поиска ранжируются, поэтому здесь остается OFFSET
+        query = query.where(_title_search_condition(needle)).order_by(
+            _title_search_rank(needle).desc(),
+            UserEntityDB.updated_db.desc(),
+            UserEntityDB.id.desc(),
+        )
+        user_entities = list(query.offset((page - 1) * LIST_PAGE_SIZE))
+    else:
+        # Keyset пагинация по (updated_db, id): стоимость не зависит от номера страницы
+        row_key = Tuple(UserEntityDB.updated_db, UserEntityDB.id)
+        if cursor and backward:
+            query = query.where(row_key > Tuple(*cursor)).order_by(
+                UserEntityDB.updated_db.asc(), UserEntityDB.id.asc()
+            )
+            user_entities = list(reversed(list(query)))
+        else:
+            if cursor:
+                query = query.where(row_key < Tuple(*cursor))
+            elif page > 1:
+                # Кнопки старого формата ls_page:<страница> приходят без курсора:
+                # без OFFSET под номером страницы показалась бы первая
+                query = query.offset((page - 1) * LIST_PAGE_SIZE)
+            query = query.order_by(
+                UserEntityDB.updated_db.desc(), UserEntityDB.id.desc()
+            )
+            user_entities = list(query)
+
+    return user_entities, total_all, total_results
+
+
+def _add_entity_to_user_list(
+    user: UserDB, entity: EntityDB, status: StatusType
+) -> tuple[UserEntityDB, bool]:
+    user_entity, created = UserEntityDB.get_or_create(
+        user=user, entity=entity, defaults={"status": status}
+    )
+    if not created:
+        user_entity.status = status
+        user_entity.save()
+    return user_entity, created
+
+
+def _update_user_entity(user_entity: UserEntityDB, **fields) -> UserEntityDB:
+    for name, value in fields.items():
+        setattr(user_entity, name, value)
+    user_entity.save()
+    return user_entity
+
+
+def _delete_user_entity(user_entity: UserEntityDB) -> int:
+    return user_entity.delete_instance()
+
+
+async def get_user_entity(
+    user_entity_id: int, with_ratings: bool = False
+) -> Optional[UserEntityDB]:
+    """Получает user_entity вместе с entity (и её рейтингами) или None"""
+    return await run_db(_get_user_entity, user_entity_id, with_ratings)
+
+
+async def get_user_list_page(
+    tg_id: int,
+    query_text: str | None,
+    status_type: StatusType,
+    page: int,
+    cursor: tuple[datetime, int] | None = None,
+    backward: bool = False,
+    totals: tuple[int, int] | None = None,
+) -> tuple[list[UserEntityDB], int, int]:
+    """
+    Возвращает страницу списка пользователя с Telegram ID tg_id.
+    :param cursor: ключ (updated_db, id) соседней строки предыдущей страницы
+    :param backward: страница перед курсором, а не после него
+    :param totals: ранее посчитанные итоги, чтобы не считать их повторно
+    :return: (user_entities, всего в списке, всего с учетом фильтра статуса)
+    """
+    return await run_db(
+        _get_user_list_page,
+        tg_id,
+        query_text,
+        status_type,
+        page,
+        cursor,
+        backward,
+        totals,
+    )
+
+
+async def add_entity_to_user_list(
+    user: UserDB, entity: EntityDB, status: StatusType
+) -> tuple[UserEntityDB, bool]:
+    """Добавляет entity в список пользователя или обновляет её статус"""
+    return await run_db(_add_entity_to_user_list, user, entity, status)
+
+
+async def update_user_entity(user_entity: UserEntityDB, **fields) -> UserEntityDB:
+    """Обновляет поля user_entity и сохраняет её"""
+    return await run_db(_update_user_entity, user_entity, **fields)
+
+
+async def delete_user_entity(user_entity: UserEntityDB) -> int:
+    """Удаляет user_entity из списка"""
+    return await run_db(_delete_user_entity, user_entity)
+
+
+# Состояния FSM
+def _get_fsm_record(key: str, updated_after: datetime) -> Optional[tuple]:
+    return (
+        FsmStateDB.select(FsmStateDB.state, FsmStateDB.data)
+        .where((FsmStateDB.key == key) & (FsmStateDB.updated_db > updated_after))
+        .tuples()
+        .first()
+    )
+
+
+def _save_fsm_records(rows: list[dict], deleted_keys: list[str]) -> None:
+    with FsmStateDB._meta.database.atomic():
+        if rows:
+            FsmStateDB.insert_many(rows).on_conflict(
+                conflict_target=[FsmStateDB.key],
+                preserve=[FsmStateDB.state, FsmStateDB.data, FsmStateDB.updated_db],
+            ).execute()
+        if deleted_keys:
+            FsmStateDB.delete().where(FsmStateDB.key.in_(deleted_keys)).execute()
+
+
+def _delete_expired_fsm_records(updated_before: datetime) -> int:
+    return FsmStateDB.delete().where(FsmStateDB.updated_db < updated_before).execute()
+
+
+async def get_fsm_record(key: str, updated_after: datetime) -> Optional[tuple]:
+    """Возвращает (state, data JSON) по ключу FSM или None, если запись устарела"""
+    return await run_db(_get_fsm_record, key, updated_after)
+
+
+async def save_fsm_records(rows: list[dict], deleted_keys: list[str]) -> None:
+    """
+    Сохраняет пачку состояний FSM одним INSERT ... ON CONFLICT
+    и удаляет пустые состояния.
+    :param rows: словари с ключами key, state, data, updated_db
+    """
+    await run_db(_save_fsm_records, rows, deleted_keys)
+
+
+async def delete_expired_fsm_records(updated_before: datetime) -> int:
+    """Удаляет состояния FSM, не менявшиеся с updated_before"""
+    return await run_db(_delete_expired_fsm_records, updated_before)
+
+
+# Суточные квоты API
+def _add_api_quota_usage(name: str, day: date, delta: int, at_least: int) -> int:
+    cursor = (
+        ApiQuotaDB.insert(name=name, day=day, used=max(delta, at_least))
+        .on_conflict(
+            conflict_target=[ApiQuotaDB.name, ApiQuotaDB.day],
+            update={
+                ApiQuotaDB.used: fn.GREATEST(ApiQuotaDB.used + delta, at_least),
+                ApiQuotaDB.updated_db: datetime.now(),
+            },
+        )
+        .returning(ApiQuotaDB.used)
+        .tuples()
+        .execute()
+    )
+    return next(iter(cursor))[0]
+
+
+def _delete_api_quota_before(day: date) -> int:
+    return ApiQuotaDB.delete().where(ApiQuotaDB.day < day).execute()
+
+
+async def add_api_quota_usage(name: str, day: date, delta: int, at_least: int) -> int:
+    """
+    Прибавляет delta запросов к общему счетчику API name за день day одним
+    INSERT ... ON CONFLICT и возвращает счетчик после сложения.
+    :param at_least: нижняя граница счетчика (квота исчерпана по ответу API)
+    """
+    return await run_db(_add_api_quota_usage, name, day, delta, at_least)
+
+
+async def delete_api_quota_before(day: date) -> int:
+    """Удаляет счетчики квот за дни раньше day"""
+    return await run_db(_delete_api_quota_before, day)
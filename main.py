@@ -7,7 +7,29 @@ from aiogram.client.default import DefaultBotProperties
 
 from config.config import load_config
 from bot.shared.main_commad_handlers import router
-from database.connection import setup_database
+from bot.shared.metrics import register_stats_provider
+from bot.shared.webhook import run_webhook
+from bot.shared.fsm_storage import (
+    PostgresStorage,
+    FsmFlushMiddleware,
+    create_events_isolation,
+    create_fsm_storage,
+)
+from bot.shared.http_client import setup_http_session, close_http_session
+from bot.shared.json_payload import get_payload_stats
+from bot.shared.poster_sender import get_poster_stats
+from bot.shared.message_view import get_view_stats
+from bot.shared.telegram_scheduler import OutboundScheduler
+from bot.features.search.search_cache import search_cache
+from bot.features.search.search_gs_handlers import api_flight
+from bot.features.search.search_prefetch import prefetcher
+from bot.features.search_kp.kp_service import KpService
+from bot.features.search_kp.kp_batch_loader import kp_batch_loader
+from bot.jobs.entity_refresh import EntityRefreshJob
+from bot.jobs.quota_sync import QuotaSyncJob
+from bot.features.search_omdb.omdb_service import OMDbService
+from database.connection import setup_database, get_pool_stats
+from database.executor import setup_db_executor, shutdown_db_executor
 
 logger = logging.getLogger(__name__)
 
@@ -18,15 +40,67 @@ async def main():
 
     # Инициализируем базу данных
     setup_database(config)
+    setup_db_executor(config.db.executor_workers)
+    register_stats_provider("db_pool", get_pool_stats)
+    register_stats_provider("search_cache", search_cache.stats)
+    register_stats_provider("api_single_flight", api_flight.stats)
+    register_stats_provider("prefetch", prefetcher.stats)
+    register_stats_provider("kp_rate_limit", KpService.LIMITER.stats)
+    register_stats_provider("omdb_rate_limit", OMDbService.LIMITER.stats)
+    register_stats_provider("kp_circuit", KpService.BREAKER.stats)
+    register_stats_provider("omdb_circuit", OMDbService.BREAKER.stats)
+    register_stats_provider("api_payloads", get_payload_stats)
+    register_stats_provider("kp_batch_loader", kp_batch_loader.stats)
+    register_stats_provider("posters", get_poster_stats)
+    register_stats_provider("message_view", get_view_stats)
+    refresh_job = EntityRefreshJob(config)
+    register_stats_provider("entity_refresh", refresh_job.stats)
+    quota_job = QuotaSyncJob(config.quota, [KpService.LIMITER, OMDbService.LIMITER])
+    register_stats_provider("api_quota_sync", quota_job.stats)
 
     bot = Bot(
         token=config.tg_bot.token,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
-    dp = Dispatcher()
+    if config.outbound.enabled:
+        # Все исходящие запросы бота проходят через лимиты Telegram
+        outbound = OutboundScheduler(config.outbound)
+        bot.session.middleware(outbound)
+        register_stats_provider("telegram_outbound", outbound.stats)
+    storage = create_fsm_storage(config.fsm)
+    dp = Dispatcher(
+        storage=storage, events_isolation=create_events_isolation(storage)
+    )
+    if isinstance(storage, PostgresStorage):
+        # Состояние пишется в базу один раз в конце обработки обновления
+        dp.update.outer_middleware(FsmFlushMiddleware(storage))
+        dp.startup.register(storage.start)
+        register_stats_provider("fsm_storage", storage.stats)
     dp.include_router(router)
 
-    await dp.start_polling(bot)
+    # Общая HTTP сессия для KP и OMDb и фоновые задачи живут вместе с диспетчером
+    async def on_startup():
+        await setup_http_session(config.http)
+        await search_cache.warm_up(config.cache.warm_up_keys)
+        quota_job.start()
+        refresh_job.start()
+
+    async def on_shutdown():
+        await refresh_job.stop()
+        await quota_job.stop()
+        await close_http_session()
+        await search_cache.close()
+
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+
+    try:
+        if config.webhook.mode == "webhook":
+            await run_webhook(bot, dp, config.webhook)
+        else:
+            await dp.start_polling(bot)
+    finally:
+        shutdown_db_executor()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,7 @@
+"""
+Локальный stand-in для Kinopoisk.dev и OMDb.
+
+Записывает ответы настоящих API (record) и воспроизводит их (replay)
+с заданным распределением задержек и внесением ошибок, чтобы нагрузочно
+тестировать поиск без расхода квот. Запуск: python -m standin --help
+"""
@@ -0,0 +1,62 @@
+import argparse
+import logging
+from pathlib import Path
+
+from aiohttp import web
+
+from standin.latency import LatencyModel
+from standin.server import StandinOptions, StandinServer
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m standin",
+        description="Record/replay stand-in для Kinopoisk.dev и OMDb",
+    )
+    parser.add_argument("--mode", choices=("replay", "record"), default="replay")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument(
+        "--fixtures", type=Path, default=Path(__file__).parent / "fixtures"
+    )
+    parser.add_argument("--latency", choices=LatencyModel.KINDS, default="lognormal")
+    parser.add_argument("--latency-ms", type=float, default=150)
+    parser.add_argument("--latency-jitter-ms", type=float, default=50)
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-seconds", type=float, default=30.0)
+    parser.add_argument("--quota", type=int, default=0)
+    parser.add_argument("--kp-upstream", default="https://api.kinopoisk.dev/v1.4")
+    parser.add_argument("--omdb-upstream", default="https://www.omdbapi.com")
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args()
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    options = StandinOptions(
+        mode=args.mode,
+        fixtures=args.fixtures,
+        latency=LatencyModel(
+            args.latency,
+            median_ms=args.latency_ms,
+            jitter_ms=args.latency_jitter_ms,
+            sigma=args.latency_sigma,
+            seed=args.seed,
+        ),
+        error_rate=args.error_rate,
+        timeout_rate=args.timeout_rate,
+        timeout_seconds=args.timeout_seconds,
+        quota=args.quota,
+        kp_upstream=args.kp_upstream.rstrip("/"),
+        omdb_upstream=args.omdb_upstream.rstrip("/"),
+        seed=args.seed,
+    )
+    app = StandinServer(options).build_app()
+    web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(provider: str, kind: str, params: dict[str, Any]) -> str:
+    """Ключ записи: провайдер, тип запроса и нормализованные параметры"""
+    normalized = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    digest = hashlib.sha1(normalized.encode()).hexdigest()[:16]
+    return f"{provider}/{kind}/{digest}"
+
+
+class FixtureStore:
+    """
+    Записанные ответы в виде JSON файлов:
+    <root>/<provider>/<kind>/<hash>.json
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._memory: dict[str, dict | None] = {}
+
+    def _path(self, key: str) -> Path:
+        return self.root / f"{key}.json"
+
+    def load(self, key: str) -> dict | None:
+        """Возвращает запись {status, body, latency_ms, request} или None"""
+        if key not in self._memory:
+            path = self._path(key)
+            self._memory[key] = (
+                json.loads(path.read_text(encoding="utf-8")) if path.exists() else None
+            )
+        return self._memory[key]
+
+    def save(
+        self,
+        key: str,
+        request: dict,
+        status: int,
+        body: Any,
+        latency_ms: float,
+    ) -> None:
+        record = {
+            "request": request,
+            "status": status,
+            "latency_ms": round(latency_ms, 1),
+            "body": body,
+        }
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(
+            json.dumps(record, ensure_ascii=False, indent=1), encoding="utf-8"
+        )
+        self._memory[key] = record
+        logger.info(f"Recorded {key} ({status})")
@@ -0,0 +1,45 @@
+import math
+import random
+
+
+class LatencyModel:
+    """
+    Распределение задержки ответа, мс:
+    fixed - всегда median_ms;
+    uniform - равномерно в median_ms ± jitter_ms;
+    lognormal - логнормальное с медианой median_ms и параметром sigma
+        (длинный хвост, похожий на настоящие API);
+    recorded - задержка, записанная вместе с ответом.
+    """
+
+    KINDS = ("fixed", "uniform", "lognormal", "recorded")
+
+    def __init__(
+        self,
+        kind: str = "lognormal",
+        median_ms: float = 150,
+        jitter_ms: float = 50,
+        sigma: float = 0.5,
+        seed: int | None = None,
+    ):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown latency model: {kind}")
+        self.kind = kind
+        self.median_ms = median_ms
+        self.jitter_ms = jitter_ms
+        self.sigma = sigma
+        self._random = random.Random(seed)
+
+    def sample(self, recorded_ms: float | None = None) -> float:
+        """Возвращает задержку в секундах"""
+        if self.kind == "recorded" and recorded_ms is not None:
+            delay_ms = recorded_ms
+        elif self.kind == "uniform":
+            delay_ms = self._random.uniform(
+                self.median_ms - self.jitter_ms, self.median_ms + self.jitter_ms
+            )
+        elif self.kind == "lognormal":
+            delay_ms = self._random.lognormvariate(math.log(self.median_ms), self.sigma)
+        else:
+            delay_ms = self.median_ms
+        return max(delay_ms, 0) / 1000
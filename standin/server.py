@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import aiohttp
+from aiohttp import web
+
+from standin.fixtures import FixtureStore, make_key
+from standin.latency import LatencyModel
+
+logger = logging.getLogger(__name__)
+
+KP_PREFIX = "/kp/v1.4"
+OMDB_PREFIX = "/omdb"
+
+
+@dataclass
+class StandinOptions:
+    mode: str = "replay"  # replay | record
+    fixtures: Path = Path(__file__).parent / "fixtures"
+    latency: LatencyModel = field(default_factory=LatencyModel)
+    # Доля ответов 503 и доля запросов, зависающих на timeout_seconds
+    error_rate: float = 0.0
+    timeout_rate: float = 0.0
+    timeout_seconds: float = 30.0
+    # Через сколько запросов к провайдеру отвечать "лимит исчерпан", 0 - никогда
+    quota: int = 0
+    kp_upstream: str = "https://api.kinopoisk.dev/v1.4"
+    omdb_upstream: str = "https://www.omdbapi.com"
+    seed: int | None = None
+
+
+class StandinServer:
+    def __init__(self, options: StandinOptions):
+        self.options = options
+        self.store = FixtureStore(options.fixtures)
+        self._random = random.Random(options.seed)
+        self._session: aiohttp.ClientSession | None = None
+        self.counters: dict[str, dict[str, int]] = defaultdict(
+            lambda: defaultdict(int)
+        )
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get(f"{KP_PREFIX}/movie/search", self.kp_search)
+        app.router.add_get(f"{KP_PREFIX}/movie/{{kp_id}}", self.kp_details)
+        app.router.add_get(f"{KP_PREFIX}/movie", self.kp_list)
+        app.router.add_get(f"{OMDB_PREFIX}/", self.omdb)
+        app.router.add_get("/_standin/stats", self.stats)
+        app.on_cleanup.append(self._close_session)
+        return app
+
+    async def _close_session(self, app: web.Application) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+    # Обработчики KP
+    async def kp_search(self, request: web.Request) -> web.Response:
+        query = request.query
+        params = {
+            "query": " ".join(query.get("query", "").lower().split()),
+            "page": query.get("page", "1"),
+            "limit": query.get("limit", "10"),
+        }
+        empty = {"docs": [], "total": 0, "limit": 10, "page": 1, "pages": 0}
+        return await self._serve(request, "kp", "search", params, (200, empty))
+
+    async def kp_details(self, request: web.Request) -> web.Response:
+        params = {"id": request.match_info["kp_id"]}
+        not_found = (404, {"statusCode": 404, "message": "Фильм не найден"})
+        return await self._serve(request, "kp", "details", params, not_found)
+
+    async def kp_list(self, request: web.Request) -> web.Response:
+        ids = sorted(request.query.getall("id", []))
+        fields = sorted(request.query.getall("selectFields", []))
+        params = {"id": ids, "selectFields": fields}
+        return await self._serve(
+            request, "kp", "list", params, None, compose=self._compose_kp_list
+        )
+
+    def _compose_kp_list(self, params: dict) -> tuple[int, dict]:
+        # Список без своей записи собирается из записанных деталей по ID
+        docs = []
+        for kp_id in params["id"]:
+            record = self.store.load(make_key("kp", "details", {"id": kp_id}))
+            if not record or record["status"] != 200:
+                continue
+            doc = record["body"]
+            if params["selectFields"]:
+                doc = {k: v for k, v in doc.items() if k in params["selectFields"]}
+            docs.append(doc)
+        return 200, {
+            "docs": docs,
+            "total": len(docs),
+            "limit": len(params["id"]),
+            "page": 1,
+            "pages": 1,
+        }
+
+    # Обработчик OMDb
+    async def omdb(self, request: web.Request) -> web.Response:
+        query = request.query
+        if "i" in query:
+            params = {"i": query["i"]}
+            not_found = (200, {"Response": "False", "Error": "Incorrect IMDb ID."})
+            return await self._serve(request, "omdb", "details", params, not_found)
+        params = {
+            "s": " ".join(query.get("s", "").lower().split()),
+            "page": query.get("page", "1"),
+        }
+        not_found = (200, {"Response": "False", "Error": "Movie not found!"})
+        return await self._serve(request, "omdb", "search", params, not_found)
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {provider: dict(values) for provider, values in self.counters.items()}
+        )
+
+    # Общая логика
+    async def _serve(
+        self,
+        request: web.Request,
+        provider: str,
+        kind: str,
+        params: dict,
+        miss: tuple[int, dict] | None,
+        compose=None,
+    ) -> web.Response:
+        counters = self.counters[provider]
+        counters["requests"] += 1
+
+        injected = await self._inject_failure(provider, counters)
+        if injected is not None:
+            return injected
+
+        key = make_key(provider, kind, params)
+        if self.options.mode == "record":
+            return await self._record(request, provider, key, params)
+
+        record = self.store.load(key)
+        if record is not None:
+            counters["hits"] += 1
+            status, body = record["status"], record["body"]
+            recorded_ms = record.get("latency_ms")
+        else:
+            counters["misses"] += 1
+            status, body = compose(params) if compose else miss
+            recorded_ms = None
+        await asyncio.sleep(self.options.latency.sample(recorded_ms))
+        return web.json_response(body, status=status)
+
+    async def _inject_failure(
+        self, provider: str, counters: dict[str, int]
+    ) -> web.Response | None:
+        options = self.options
+        if options.quota and counters["requests"] > options.quota:
+            counters["quota"] += 1
+            if provider == "kp":
+                return web.json_response(
+                    {"statusCode": 403, "message": "Daily request limit reached"},
+                    status=403,
+                )
+            return web.json_response(
+                {"Response": "False", "Error": "Request limit reached!"}, status=401
+            )
+        roll = self._random.random()
+        if roll < options.timeout_rate:
+            counters["timeouts"] += 1
+            await asyncio.sleep(options.timeout_seconds)
+            return web.json_response({"message": "Gateway Timeout"}, status=504)
+        if roll < options.timeout_rate + options.error_rate:
+            counters["errors"] += 1
+            await asyncio.sleep(options.latency.sample())
+            return web.json_response({"message": "Service Unavailable"}, status=503)
+        return None
+
+    async def _record(
+        self, request: web.Request, provider: str, key: str, params: dict
+    ) -> web.Response:
+        # Запрос уходит в настоящий API как есть, ключ API в запись не попадает
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        if provider == "kp":
+            upstream = self.options.kp_upstream + request.path[len(KP_PREFIX) :]
+            headers = {"X-API-KEY": request.headers.get("X-API-KEY", "")}
+        else:
+            upstream = self.options.omdb_upstream + request.path[len(OMDB_PREFIX) :]
+            headers = {}
+        started = time.monotonic()
+        async with self._session.get(
+            upstream, params=list(request.query.items()), headers=headers
+        ) as response:
+            body = await response.json(content_type=None)
+            status = response.status
+        latency_ms = (time.monotonic() - started) * 1000
+        self.counters[provider]["recorded"] += 1
+        if status in (200, 404):
+            self.store.save(key, params, status, body, latency_ms)
+        return web.json_response(body, status=status)
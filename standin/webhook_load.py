@@ -0,0 +1,225 @@
+"""
+Нагрузочная проверка webhook: отправляет синтетические обновления Telegram
+на endpoint и печатает пропускную способность и задержки ответа.
+
+    python -m standin.webhook_load --local
+    python -m standin.webhook_load --local --chats 200 --concurrency 200 --db-ms 5
+    python -m standin.webhook_load --url http://127.0.0.1:8000/webhook --secret ...
+
+В режиме --local поднимается собственный webhook сервер (build_webhook_app)
+с диспетчером, который только считает обновления, поэтому ни бот, ни база,
+ни Telegram не нужны. С --db-ms обработчик выполняет в базе бота запрос
+SELECT pg_sleep заданной длительности через run_db - тот же пул потоков
+(DB_EXECUTOR_WORKERS или --db-workers) и пул соединений, что и бот; нужны
+настройки из .env. С --db-inline запрос выполняется прямо в event loop,
+как в обработчиках до вынесения запросов в пул. Для --local печатаются и
+задержки обработчиков - от отправки обновления до конца его обработки.
+Против запущенного бота используйте тестовые chat_id: ответы бота на
+синтетические сообщения в Telegram не дойдут.
+"""
+
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+
+import aiohttp
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message
+from aiohttp import web
+
+from bot.shared.webhook import build_webhook_app
+from config.config import WebhookConfig, load_config
+from database import connection
+from database.connection import call_with_connection, setup_pool
+from database.executor import run_db, setup_db_executor, shutdown_db_executor
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def make_update(update_id: int, chat_id: int, text: str) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": "Load"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Load"},
+            "text": text,
+        },
+    }
+
+
+def sleep_query(seconds: float) -> None:
+    """Запрос, который держит соединение из пула заданное время"""
+    connection.db.execute_sql("SELECT pg_sleep(%s)", (seconds,))
+
+
+def percentile(values: list[float], share: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+async def post_updates(
+    url: str,
+    secret: str,
+    count: int,
+    concurrency: int,
+    chats: int,
+    text: str,
+    sent_at: dict[int, float] | None = None,
+) -> dict:
+    """
+    Отправляет count обновлений в concurrency потоков.
+    :param sent_at: если передан, в него пишется время отправки update_id
+    """
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+    errors = 0
+    counter = iter(range(1, count + 1))
+    headers = {SECRET_HEADER: secret} if secret else {}
+
+    async def worker(session: aiohttp.ClientSession):
+        nonlocal errors
+        for update_id in counter:
+            update = make_update(update_id, 10_000 + update_id % chats, text)
+            started = time.perf_counter()
+            if sent_at is not None:
+                sent_at[update_id] = started
+            try:
+                async with session.post(url, json=update, headers=headers) as resp:
+                    await resp.read()
+                    statuses[resp.status] = statuses.get(resp.status, 0) + 1
+            except aiohttp.ClientError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests": count,
+        "elapsed": elapsed,
+        "rps": count / elapsed if elapsed else 0.0,
+        "statuses": statuses,
+        "errors": errors,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+    }
+
+
+async def run_local(args: argparse.Namespace) -> dict:
+    """Поднимает webhook сервер в этом же процессе и нагружает его"""
+    config = WebhookConfig(
+        mode="webhook", path=args.path, secret=args.secret, host="127.0.0.1"
+    )
+    handled = 0
+    sent_at: dict[int, float] = {}
+    # От отправки обновления до конца обработчика, включая очередь event loop
+    handler_latencies: list[float] = []
+    done = asyncio.Event()
+    dp = Dispatcher()
+    if args.db_ms:
+        db_config = load_config()
+        setup_pool(db_config)
+        setup_db_executor(args.db_workers or db_config.db.executor_workers)
+
+    @dp.message()
+    async def count_update(message: Message):
+        nonlocal handled
+        if args.db_ms and args.db_inline:
+            call_with_connection(sleep_query, args.db_ms / 1000)
+        elif args.db_ms:
+            await run_db(sleep_query, args.db_ms / 1000)
+        handler_latencies.append(time.perf_counter() - sent_at[message.message_id])
+        handled += 1
+        if handled >= args.count:
+            done.set()
+
+    # Токен не используется: обработчик не обращается к Bot API
+    bot = Bot(token="42:LOCAL-WEBHOOK-LOAD")
+    runner = web.AppRunner(build_webhook_app(bot, dp, config))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", args.port)
+    await site.start()
+    try:
+        url = f"http://127.0.0.1:{args.port}{args.path}"
+        started = time.perf_counter()
+        result = await post_updates(
+            url,
+            args.secret,
+            args.count,
+            args.concurrency,
+            args.chats,
+            args.text,
+            sent_at,
+        )
+        try:
+            await asyncio.wait_for(done.wait(), timeout=30)
+        except asyncio.TimeoutError:
+            pass
+        processed = time.perf_counter() - started
+        result["handled"] = handled
+        result["handled_per_second"] = handled / processed if processed else 0.0
+        result["handler_p50_ms"] = percentile(handler_latencies, 0.5) * 1000
+        result["handler_p95_ms"] = percentile(handler_latencies, 0.95) * 1000
+        result["handler_p99_ms"] = percentile(handler_latencies, 0.99) * 1000
+        return result
+    finally:
+        await runner.cleanup()
+        if args.db_ms:
+            shutdown_db_executor()
+            connection.db.close_all()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m standin.webhook_load",
+        description="Синтетическая нагрузка на webhook бота",
+    )
+    parser.add_argument("--local", action="store_true")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/webhook")
+    parser.add_argument("--path", default="/webhook")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--secret", default="load-test-secret")
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--text", default="/help")
+    parser.add_argument("--db-ms", type=float, default=0)
+    parser.add_argument("--db-workers", type=int, default=0)
+    parser.add_argument("--db-inline", action="store_true")
+    return parser.parse_args()
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.WARNING)
+    args = parse_args()
+    if args.local:
+        result = asyncio.run(run_local(args))
+    else:
+        result = asyncio.run(
+            post_updates(
+                args.url,
+                args.secret,
+                args.count,
+                args.concurrency,
+                args.chats,
+                args.text,
+            )
+        )
+    for key, value in result.items():
+        print(f"{key}: {round(value, 2) if isinstance(value, float) else value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Запись entity и рейтингов из ответов внешних API.
+
+Нужна отдельная тестовая база PostgreSQL (таблицы в ней пересоздаются):
+
+    TEST_DB_NAME=vistly_test TEST_DB_HOST=127.0.0.1 python -m pytest tests
+
+Без TEST_DB_NAME тесты пропускаются.
+"""
+
+import os
+
+import pytest
+from peewee import PostgresqlDatabase
+
+from database.ingestion import (
+    bulk_upsert_entities_with_ratings,
+    upsert_entity_with_ratings,
+)
+from database.migrations import apply_migrations
+from database.models_db import (
+    EntityDB,
+    FsmStateDB,
+    RatingDB,
+    SchemaVersionDB,
+    UserDB,
+    UserEntityDB,
+)
+from models.enum_classes import SourceApi
+
+MODELS = [UserDB, EntityDB, RatingDB, UserEntityDB, SchemaVersionDB, FsmStateDB]
+IMDB = "Internet Movie Database"
+
+
+@pytest.fixture(scope="module")
+def db():
+    if not os.environ.get("TEST_DB_NAME"):
+        pytest.skip("TEST_DB_NAME is not set")
+    database = PostgresqlDatabase(
+        os.environ["TEST_DB_NAME"],
+        host=os.environ.get("TEST_DB_HOST", "127.0.0.1"),
+        port=int(os.environ.get("TEST_DB_PORT", 5432)),
+        user=os.environ.get("TEST_DB_USER", "postgres"),
+        password=os.environ.get("TEST_DB_PASS", ""),
+    )
+    database.bind(MODELS)
+    database.drop_tables(MODELS, safe=True)
+    database.create_tables(MODELS)
+    apply_migrations(database)
+    yield database
+    database.drop_tables(MODELS)
+    database.close()
+
+
+def rating(source: str, value: float) -> dict:
+    return {"source": source, "value": value, "max_value": 10, "percent": False}
+
+
+def stored_ratings(entity_id: int) -> dict[str, float]:
+    query = RatingDB.select().where(RatingDB.entity == entity_id)
+    return {row.source: row.value for row in query}
+
+
+def test_upsert_replaces_ratings_missing_from_response(db):
+    row = {"kp_id": "100", "title": "Title"}
+    entity = upsert_entity_with_ratings(
+        SourceApi.KP, row, [rating("KP", 7.0), rating("IMDB", 6.5)]
+    )
+    upsert_entity_with_ratings(SourceApi.KP, row, [rating("KP", 7.2)])
+    assert stored_ratings(entity.id) == {"KP": 7.2}
+
+    upsert_entity_with_ratings(SourceApi.KP, row, [])
+    assert stored_ratings(entity.id) == {}
+
+
+def test_bulk_upsert_replaces_ratings_missing_from_response(db):
+    first = {"src_id": "tt0000001", "title": "First"}
+    second = {"src_id": "tt0000002", "title": "Second"}
+    bulk_upsert_entities_with_ratings(
+        SourceApi.OMDB,
+        [
+            (first, [rating(IMDB, 8.0), rating("Metacritic", 7.0)]),
+            (second, [rating(IMDB, 5.0)]),
+        ],
+    )
+    bulk_upsert_entities_with_ratings(
+        SourceApi.OMDB,
+        [(first, [rating(IMDB, 8.1)]), (second, [])],
+    )
+    first_id = EntityDB.get(EntityDB.src_id == first["src_id"]).id
+    second_id = EntityDB.get(EntityDB.src_id == second["src_id"]).id
+    assert stored_ratings(first_id) == {IMDB: 8.1}
+    assert stored_ratings(second_id) == {}
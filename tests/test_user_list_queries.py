@@ -0,0 +1,119 @@
+"""
+Количество SQL-запросов при показе страницы списка пользователя.
+
+Нужна отдельная тестовая база PostgreSQL (таблицы в ней пересоздаются):
+
+    TEST_DB_NAME=vistly_test TEST_DB_HOST=127.0.0.1 python -m pytest tests
+
+Без TEST_DB_NAME тесты пропускаются.
+"""
+
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from peewee import PostgresqlDatabase
+
+from bot.features.user_list.user_list_keyboards import get_ls_results_keyboard
+from database.migrations import apply_migrations
+from database.models_db import (
+    EntityDB,
+    FsmStateDB,
+    RatingDB,
+    SchemaVersionDB,
+    UserDB,
+    UserEntityDB,
+)
+from database.query_count import QueryCountExceeded, assert_max_queries
+from database.repository import LIST_PAGE_SIZE, _get_user_list_page
+from models.enum_classes import StatusType
+
+MODELS = [UserDB, EntityDB, RatingDB, UserEntityDB, SchemaVersionDB, FsmStateDB]
+TG_ID = 1001
+LIST_SIZE = LIST_PAGE_SIZE * 2 + 5
+
+
+@pytest.fixture(scope="module")
+def db():
+    if not os.environ.get("TEST_DB_NAME"):
+        pytest.skip("TEST_DB_NAME is not set")
+    database = PostgresqlDatabase(
+        os.environ["TEST_DB_NAME"],
+        host=os.environ.get("TEST_DB_HOST", "127.0.0.1"),
+        port=int(os.environ.get("TEST_DB_PORT", 5432)),
+        user=os.environ.get("TEST_DB_USER", "postgres"),
+        password=os.environ.get("TEST_DB_PASS", ""),
+    )
+    database.bind(MODELS)
+    database.drop_tables(MODELS, safe=True)
+    database.create_tables(MODELS)
+    apply_migrations(database)
+
+    user = UserDB.create(tg_id=TG_ID, name="Test")
+    started = datetime(2024, 1, 1)
+    for i in range(LIST_SIZE):
+        entity = EntityDB.create(
+            kp_id=str(i), title=f"Title {i}", release_date=datetime(2000 + i, 1, 1)
+        )
+        RatingDB.create(entity=entity, source="KP", value=7.5, max_value=10)
+        UserEntityDB.insert(
+            user=user,
+            entity=entity,
+            status=StatusType.PLANNING.value,
+            updated_db=started + timedelta(minutes=i),
+        ).execute()
+    yield database
+    database.drop_tables(MODELS)
+    database.close()
+
+
+def render_page(page: int, cursor=None, totals=None, query_text=None):
+    user_entities, total_all, total_results = _get_user_list_page(
+        TG_ID, query_text, StatusType.ALL, page, cursor=cursor, totals=totals
+    )
+    keyboard = get_ls_results_keyboard(
+        user_entities=user_entities, page=page, total_results=total_results
+    )
+    return user_entities, (total_all, total_results), keyboard
+
+
+def test_first_page_counts_and_rows_in_two_queries(db):
+    with assert_max_queries(2):
+        user_entities, totals, _ = render_page(1)
+    assert len(user_entities) == LIST_PAGE_SIZE
+    assert totals == (LIST_SIZE, LIST_SIZE)
+
+
+def test_next_page_reuses_totals_in_one_query(db):
+    first, totals, _ = render_page(1)
+    last = first[-1]
+    with assert_max_queries(1):
+        user_entities, _, _ = render_page(
+            2, cursor=(last.updated_db, last.id), totals=totals
+        )
+    assert len(user_entities) == LIST_PAGE_SIZE
+    assert user_entities[0].id != last.id
+
+
+def test_page_without_cursor_falls_back_to_offset(db):
+    first, totals, _ = render_page(1)
+    last = first[-1]
+    by_cursor, _, _ = render_page(2, cursor=(last.updated_db, last.id), totals=totals)
+    by_offset, _, _ = render_page(2, totals=totals)
+    assert [row.id for row in by_offset] == [row.id for row in by_cursor]
+
+
+def test_search_page_in_two_queries(db):
+    with assert_max_queries(2):
+        user_entities, totals, _ = render_page(1, query_text="title 1")
+    assert user_entities
+    assert totals[1] < LIST_SIZE
+
+
+def test_lazy_foreign_key_access_is_reported(db):
+    user_entities, _, _ = render_page(1)
+    with pytest.raises(QueryCountExceeded):
+        with assert_max_queries(0):
+            # Без join каждая строка загружает entity отдельным запросом
+            for user_entity in UserEntityDB.select().limit(3):
+                user_entity.entity.title